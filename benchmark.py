@@ -0,0 +1,50 @@
+# benchmark.py - throughput of the vectorized ycd codec against the old per word generators, and how the segmented base conversion scales
+
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from irranalyze.convert import ycd_to_str_gen, str_to_ycd_gen, ycd_to_digits_gen, digits_to_ycd_gen, base_convert, frac_convert_gen
+from irranalyze.helper import format_size
+
+def bench(name:str, func, size:int, repeat:int=3):
+    """ prints the best throughput of func over a few runs, size is the amount of input bytes """
+    best = min(timed(func) for _ in range(repeat))
+    print(f"{name:<24} {format_size(size/best, 'B/s', capitalized=True)}")
+
+def timed(func) -> float:
+    time_start = perf_counter()
+    func()
+    return perf_counter() - time_start
+
+def main(amount_words:int = 2**20):
+    rng = np.random.default_rng(0)
+    for base, digits_per_word, limit in ((10, 19, 10**19), (16, 16, 2**64)):
+        words = rng.integers(0, limit, amount_words, dtype=np.uint64, endpoint=False).tobytes()
+        digits = b"".join(d.tobytes() for d in ycd_to_digits_gen(words, base))
+        assert digits == "".join(ycd_to_str_gen(memoryview(words + bytes(8)), base)).encode()
+        print(f"--- base {base}, {amount_words} words ---")
+        bench("ycd_to_str_gen", lambda: "".join(ycd_to_str_gen(memoryview(words), base)), len(words))
+        bench("ycd_to_digits_gen", lambda: b"".join(d.tobytes() for d in ycd_to_digits_gen(words, base)), len(words))
+        bench("str_to_ycd_gen", lambda: b"".join(str_to_ycd_gen(memoryview(digits), base)), len(digits))
+        bench("digits_to_ycd_gen", lambda: b"".join(digits_to_ycd_gen(digits, base)), len(digits))
+
+def convert_scaling(max_digits:int = 10**9, old_max_digits:int = 10**7, output_base:int = 7):
+    """ time of converting 1e6, 1e7 ... max_digits random decimal digits to output_base, base_convert only up to old_max_digits since it needs the whole string at once """
+    rng = np.random.default_rng(0)
+    amount_digits = 10**6
+    while amount_digits <= max_digits:
+        digits = (rng.integers(0, 10, amount_digits, dtype=np.uint8) + ord("0")).tobytes()
+        read = lambda start, stop: digits[start:stop]
+        print(f"--- {format_size(amount_digits)} digits to base {output_base} ---")
+        bench("frac_convert_gen", lambda: sum(map(len, frac_convert_gen(read, amount_digits, 10, output_base, amount_digits))), amount_digits, repeat=1)
+        if amount_digits <= old_max_digits:
+            bench("base_convert", lambda: base_convert(b"0." + digits, 10, output_base), amount_digits, repeat=1)
+        amount_digits *= 10
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["convert"]: # python benchmark.py convert [max digits]
+        convert_scaling(int(float(sys.argv[2])) if len(sys.argv) > 2 else 10**9)
+    else:
+        main()
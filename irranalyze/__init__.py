@@ -8,6 +8,7 @@ def sanity():
 
 sanity()
 
-from .bignum import BigNum, get_all, get_one
+from .bignum import BigNum, BlockedBigNum, get_all, get_one
+from .search import search_many
 from .convert import num_to_txt, txt_to_num, txt_to_num_all, alnum_to_num, base_convert
 from .var import Sizes, Switches, Paths
@@ -0,0 +1,109 @@
+# asearch.py - asyncio front end of the search, lookups and file scans run in threads and the same search asked for at the same time only runs once
+
+from __future__ import annotations
+
+import asyncio
+import os
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+from weakref import WeakKeyDictionary
+
+from .var import Sizes, Switches
+from .cache import Cache
+from .search import search, search_kmer, search_db_multi, _query_table, _shown
+from .const import QUERY_TYPES
+
+if TYPE_CHECKING:
+    from .bignum import BigNum
+
+"""
+A search is split in two steps, both run in the default executor of the loop so the event loop never waits on sqlite or hyperscan:
+first the quick lookup (kmer table and db), then a file scan for whatever wasnt known, only the scans are limited per file and per disk
+Every (file, query, pattern, indexing) that is being searched has a future, requests that come in meanwhile wait on that one instead of searching again
+The computation is its own task, so a request that gets cancelled doesnt cancel it for the others waiting on it
+"""
+
+@dataclass
+class _LoopState:
+    """ in-flight searches and scan limits of one event loop, asyncio primitives cant be shared between loops """
+    inflight:dict[tuple,asyncio.Future] = field(default_factory=dict)
+    file_limits:dict[str,asyncio.Semaphore] = field(default_factory=dict)
+    disk_limits:dict[int,asyncio.Semaphore] = field(default_factory=dict)
+    tasks:set[asyncio.Task] = field(default_factory=set) # running computations, asyncio only keeps weak references to tasks
+
+_states:WeakKeyDictionary[asyncio.AbstractEventLoop,_LoopState] = WeakKeyDictionary()
+
+def _state() -> _LoopState:
+    loop = asyncio.get_running_loop()
+    if loop not in _states:
+        _states[loop] = _LoopState()
+    return _states[loop]
+
+def _limits(state:_LoopState, bignum:BigNum) -> tuple[asyncio.Semaphore,asyncio.Semaphore]:
+    """ semaphores of the file and the disk its on, their size is read from Sizes when they are first needed on a loop """
+    file = str(bignum.path)
+    if file not in state.file_limits:
+        state.file_limits[file] = asyncio.Semaphore(Sizes.async_file_scans)
+    disk = os.stat(bignum.path).st_dev
+    if disk not in state.disk_limits:
+        state.disk_limits[disk] = asyncio.Semaphore(Sizes.async_disk_scans)
+    return state.file_limits[file], state.disk_limits[disk]
+
+def _lookup(bignum:BigNum, patterns:list[bytes], query:str) -> dict[bytes,int|None]:
+    """ whatever the kmer table and the db already know, None for patterns that need a file scan """
+    if query != "literal":
+        one_indexed = Switches.one_indexed
+        return {pat:_shown(pos, one_indexed) for pat,pos in Cache.lookup_many(_query_table(bignum, query), patterns).items()}
+    positions:dict[bytes,int|None] = dict(search_kmer(bignum, patterns))
+    positions.update(search_db_multi(bignum, [pat for pat in patterns if pat not in positions]))
+    return positions
+
+async def _compute(state:_LoopState, bignum:BigNum, query:str, futures:dict[bytes,asyncio.Future], keys:dict[bytes,tuple]):
+    """ looks the patterns up, scans the file for the rest and resolves their futures """
+    patterns = list(futures)
+    try:
+        positions = await asyncio.to_thread(_lookup, bignum, patterns, query) # to_thread takes the settings overrides along
+        missing = [pat for pat in patterns if positions.get(pat) is None]
+        for pat in patterns:
+            if pat not in missing:
+                futures[pat].set_result(positions[pat])
+        if missing:
+            file_limit, disk_limit = _limits(state, bignum)
+            async with file_limit, disk_limit:
+                found = await asyncio.to_thread(search, bignum, missing, None, query) # checks the db again, another scan might have just stored them
+            for pat in missing:
+                futures[pat].set_result(found[pat])
+    except BaseException as e:
+        for future in futures.values():
+            if not future.done():
+                future.cancel() if isinstance(e, asyncio.CancelledError) else future.set_exception(e)
+        if not isinstance(e, Exception):
+            raise
+    finally:
+        for pat in patterns:
+            state.inflight.pop(keys[pat], None)
+
+async def asearch(bignum:BigNum, pattern:bytes|list[bytes], query:str = "literal"):
+    """
+    search without blocking the event loop, returns what search returns
+    patterns that are already being searched for in the same file are not searched again, the result of the running search is shared
+    file scans are limited to Sizes.async_file_scans per file and Sizes.async_disk_scans per disk at once
+    """
+    if query not in QUERY_TYPES:
+        raise ValueError(f"query has to be one of {', '.join(QUERY_TYPES)}, not {query}")
+    patterns = [pattern] if isinstance(pattern, bytes) else list(dict.fromkeys(map(bytes, pattern)))
+    state = _state()
+    file, one_indexed = str(bignum.path), Switches.one_indexed
+    keys = {pat:(file, query, pat, one_indexed) for pat in patterns}
+    new = {pat:asyncio.get_running_loop().create_future() for pat,key in keys.items() if key not in state.inflight}
+    for pat, future in new.items():
+        state.inflight[keys[pat]] = future
+    futures = {pat:state.inflight[key] for pat,key in keys.items()}
+    if new:
+        task = asyncio.create_task(_compute(state, bignum, query, new, keys))
+        state.tasks.add(task)
+        task.add_done_callback(state.tasks.discard)
+    positions = await asyncio.gather(*(asyncio.shield(future) for future in futures.values())) # shielded, cancelling one request doesnt cancel the search the others wait on
+    if isinstance(pattern, bytes):
+        return positions[0]
+    return dict(zip(futures, positions))
@@ -1,26 +1,42 @@
 # bignum.py - wrapper for number files
 
+from collections import OrderedDict
+from dataclasses import replace
 from pathlib import Path
+from threading import Lock
 from functools import total_ordering
 from mmap import mmap, ACCESS_READ, MADV_SEQUENTIAL
 from math import log, ceil
-from typing import Iterable, Iterator, overload
-
-from .search import search
-from .identify import identify, check_valid
-from .convert import base_convert, resolve_notation, ycd_to_str
+from typing import Iterable, Iterator, Literal, overload
+
+import gmpy2
+import numpy as np
+
+from .search import search, search_stream, search_words, search_file_all, count_file
+from .asearch import asearch
+from .identify import BigNumInfo, block_paths
+from .catalog import Catalog
+from .streaks import find_streaks, find_streets
+from .stats import histogram
+from .fileconvert import to_ycd, to_txt
+from .convert import frac_convert_gen, make_extractor, resolve_notation, ycd_to_digits_gen
 from .helper import format_size
 from .var import Sizes, Paths, Switches
+from .const import YCD_ACCESS_BLOCK, YCD_CACHE_BLOCKS, CONVERT_SEGMENT, CONVERT_GUARD
 
 @total_ordering
 class BigNum:
-    """ wrapper for y-cruncher file to get matadata, search and iterate"""
-    def __init__(self, path:str|Path) -> None:
+    """ wrapper for y-cruncher file to get matadata, search and iterate, the file only gets opened once its contents are needed """
+    def __init__(self, path:str|Path, info:BigNumInfo|None = None) -> None:
         self.path = Path(path)
-        if not (self.path.exists() and check_valid(self.path)):
+        if info is None: # identified once and then remembered in the catalog until the file changes
+            info = Catalog.info(self.path) if self.path.exists() else None
+        if info is None:
             raise AttributeError("Provided file path is not a number file")
-        self.info = identify(self.path)
+        self.info = info
         self._first_digits = None # lazy loaded because it can be big
+        self._blocks:OrderedDict[int,bytes] = OrderedDict() # decoded blocks of ycd files, least recently used first
+        self._blocks_lock = Lock()
         self._key = (self.info.name, self.info.base, self.info.format) # static key
         self._hash = hash(self._key) # also static hash
         self._file = None
@@ -51,19 +67,35 @@ class BigNum:
 
     def __getitem__(self, i):
         """ just as the search function this is 1-indexed, ergo [0] is always '.', but slices like [:10] dont include the dot. Can also be used as a search proxy if input is str|bytes """
+        one_indexed = Switches.one_indexed # read once, they can be overridden per thread
+        first_digits_amount = Sizes.first_digits_amount
+        base = self.info.radix_pos + 1 - one_indexed # file offset of index 0
         if isinstance(i, int):
-            if -1 < i < Sizes.first_digits_amount:
-                return bytes((self.first_digits[i],))
+            if -1 < i < first_digits_amount:
+                return bytes((self._cached_digits[i+1-one_indexed],))
+            if self.info.format == "ycd": # digits instead of the packed words
+                digit = i - one_indexed if i > -1 else self.info.digit_count + i
+                if not 0 <= digit < self.info.digit_count:
+                    raise IndexError("digit index out of range")
+                return self._ycd_digits(digit, digit+1)
             if i > -1:
-                i += self.info.radix_pos+1-Switches.one_indexed
+                i += base
             return bytes((self.mmap[i],))
 
         if isinstance(i, slice):
-            if i.stop and -1 < i.stop < Sizes.first_digits_amount:
-                return self.first_digits[i]
-            base = self.info.radix_pos + 1 - Switches.one_indexed
-            virtual_len = len(self.mmap) - base
+            virtual_len = self.info.digit_count + one_indexed if self.info.format == "ycd" else len(self.mmap) - base
             start, stop, step = i.indices(virtual_len)
+            if i.stop and -1 < i.stop < first_digits_amount and step > 0:
+                shift = 1 - one_indexed # the cache starts at the radix point
+                return self._cached_digits[start+shift:stop+shift:step]
+            if self.info.format == "ycd":
+                indexes = range(start, stop, step)
+                if not indexes:
+                    return b""
+                low, high = min(indexes[0], indexes[-1]), max(indexes[0], indexes[-1]) + 1
+                dot = b"." if one_indexed and low == 0 else b""
+                digits = dot + self._ycd_digits(max(low - one_indexed, 0), high - one_indexed)
+                return digits[::step] if step > 0 else digits[::-1][::-step]
             return self.mmap[base+start:base+stop:step]
 
         if isinstance(i, str):
@@ -83,6 +115,12 @@ class BigNum:
 
     def __iter__(self) -> Iterator[bytes]:
         """ yields digits as bytes, radix is never included no matter the state of Switches.one_indexed"""
+        if self.info.format == "ycd": # decoded block by block
+            block_digits = YCD_ACCESS_BLOCK * (19 if self.info.base == 10 else 16)
+            for start in range(0, self.info.digit_count, block_digits):
+                digits = self._ycd_digits(start, start + block_digits)
+                yield from (digits[j:j+1] for j in range(len(digits)))
+            return
         i = iter(self.mmap)
         for _ in range(self.info.radix_pos+1):
             next(i)
@@ -132,14 +170,65 @@ class BigNum:
     def __buffer__(self, flags):
         return self.mmap.__buffer__(flags)
 
+    @property
+    def _cached_digits(self) -> bytes:
+        """ the radix point followed by the first Sizes.first_digits_amount digits, the same no matter the indexing """
+        if not self._first_digits:
+            if self.info.format == "ycd":
+                self._first_digits = b"." + self._ycd_digits(0, min(Sizes.first_digits_amount, self.info.digit_count))
+            else:
+                self._first_digits = self.mmap[self.info.radix_pos:self.info.radix_pos+1+Sizes.first_digits_amount]
+        return self._first_digits
+
+    def read_digits(self, amount_digits:int, start:int=0) -> np.ndarray:
+        """ amount_digits digits as an array of ascii starting at the 0 based digit index start, decoded if its a ycd file, this is what every scan reads the digits with """
+        if self.info.format == "txt":
+            return np.frombuffer(self.mmap, dtype=np.uint8, count=amount_digits, offset=self.info.radix_pos+1+start).copy()
+        digits_per_word = 19 if self.info.base == 10 else 16
+        first_word = start // digits_per_word
+        last_word = -(-(start + amount_digits) // digits_per_word)
+        offset = self.info.radix_pos + 1
+        mv = memoryview(self)[offset + first_word*8 : offset + last_word*8]
+        skip = start - first_word*digits_per_word
+        digits = np.concatenate(list(ycd_to_digits_gen(mv, self.info.base)) or [np.empty(0, dtype=np.uint8)])[skip:skip+amount_digits]
+        mv.release()
+        return digits
+
+    def _ycd_digits(self, start:int, stop:int) -> bytes:
+        """
+        digits between the 0 based digit indexes start and stop of a ycd file, only the words that hold them get decoded
+        short reads go through an lru of YCD_CACHE_BLOCKS decoded blocks of YCD_ACCESS_BLOCK words, so reading close to the last read is free
+        """
+        stop = min(stop, self.info.digit_count)
+        if start >= stop:
+            return b""
+        block_digits = YCD_ACCESS_BLOCK * (19 if self.info.base == 10 else 16)
+        first_block, last_block = start // block_digits, (stop - 1) // block_digits
+        if last_block - first_block >= YCD_CACHE_BLOCKS: # too big to be worth caching
+            return self.read_digits(stop - start, start).tobytes()
+        digits = b"".join(self._ycd_block(block, block_digits) for block in range(first_block, last_block + 1))
+        return digits[start - first_block*block_digits : stop - first_block*block_digits]
+
+    def _ycd_block(self, block:int, block_digits:int) -> bytes:
+        """ a decoded block of YCD_ACCESS_BLOCK words, from the lru if its in there """
+        with self._blocks_lock:
+            digits = self._blocks.get(block)
+            if digits is not None:
+                self._blocks.move_to_end(block)
+                return digits
+        start = block * block_digits
+        digits = self.read_digits(min(block_digits, self.info.digit_count - start), start).tobytes()
+        with self._blocks_lock:
+            self._blocks[block] = digits
+            while len(self._blocks) > YCD_CACHE_BLOCKS:
+                self._blocks.popitem(last=False)
+        return digits
+
     @property
     def first_digits(self) -> bytes:
         """ small section of the number, usually 1mio digits after radix """
-        if self._first_digits:
-            return self._first_digits
-        base = self.info.radix_pos + 1 - Switches.one_indexed
-        self._first_digits = self.mmap[base:base+Sizes.first_digits_amount]
-        return self._first_digits
+        start = 1 - Switches.one_indexed
+        return self._cached_digits[start:start+Sizes.first_digits_amount]
 
     @property
     def mmap(self):
@@ -163,6 +252,84 @@ class BigNum:
             self._file.close()
             self._file = None
 
+    @overload
+    async def asearch(self, pattern:str|bytes, query:str="literal") -> int: ...
+    @overload
+    async def asearch(self, pattern:Iterable[str|bytes], query:str="literal") -> dict[bytes,int]: ...
+    async def asearch(self, pattern, query="literal"):
+        """ like find, but awaitable, the event loop keeps running while sqlite and hyperscan work and the same search running already gets shared """
+        if isinstance(pattern, (str, bytes)):
+            return await asearch(self, pattern.encode() if isinstance(pattern, str) else pattern, query)
+        return await asearch(self, [p.encode() if isinstance(p, str) else bytes(p) for p in pattern], query)
+
+    def search_iter(self, patterns:Iterable[str|bytes]) -> Iterator[tuple[bytes,int]]:
+        """ like the multi pattern search, but yields (pattern, position) as soon as each one is known instead of waiting for all """
+        return search_stream(self, [p.encode() if isinstance(p, str) else bytes(p) for p in patterns])
+
+    def _bounds(self, start:int|None, stop:int|None) -> tuple[int|None,int|None]:
+        """ converts digit positions (same indexing as search results) to file offsets """
+        one_indexed = Switches.one_indexed
+        base = self.info.radix_pos + 1 - one_indexed
+        lower_bound = None if start is None else base + max(start, one_indexed)
+        upper_bound = None if stop is None else min(base + stop, self.info.radix_pos + 1 + self.info.digit_count)
+        return lower_bound, upper_bound
+
+    @overload
+    def find_all(self, pattern:str|bytes, start:int|None=None, stop:int|None=None, chunked:Literal[False]=False) -> Iterator[int]: ...
+    @overload
+    def find_all(self, pattern:str|bytes, start:int|None=None, stop:int|None=None, chunked:Literal[True]=True) -> Iterator[np.ndarray]: ...
+    def find_all(self, pattern:str|bytes, start:int|None=None, stop:int|None=None, chunked:bool=False):
+        """
+        streams every position of pattern between start and stop, overlapping occurrences included
+        positions are indexed like the regular search results, matches have to lie completely inside [start:stop]
+        with chunked=True it yields sorted uint64 arrays instead of single ints, which is the way to go for frequent patterns
+        """
+        if isinstance(pattern, str):
+            pattern = pattern.encode()
+        chunks = search_file_all(self, pattern, *self._bounds(start, stop))
+        if chunked:
+            return chunks
+        return (p for chunk in chunks for p in chunk.tolist())
+
+    def count(self, pattern:str|bytes, start:int|None=None, stop:int|None=None) -> int:
+        """ amount of occurrences of pattern between start and stop, overlapping ones included, without storing any positions """
+        if isinstance(pattern, str):
+            pattern = pattern.encode()
+        return count_file(self, pattern, *self._bounds(start, stop))
+
+    @overload
+    def find(self, pattern:str|bytes, query:str="literal") -> int: ...
+    @overload
+    def find(self, pattern:Iterable[str|bytes], query:str="literal") -> dict[bytes,int]: ...
+    def find(self, pattern, query="literal"):
+        """
+        first position of pattern (or pattern:position of many), like subscripting but with the query type explicit
+        query is "literal" (same as subscripting), "wildcard" where ? is any digit or "regex" for hyperscan expressions
+        """
+        if isinstance(pattern, (str, bytes)):
+            return search(self, pattern.encode() if isinstance(pattern, str) else pattern, query=query)
+        return search(self, [p.encode() if isinstance(p, str) else bytes(p) for p in pattern], query=query)
+
+    def find_words(self, words:Iterable[str|bytes]) -> dict[bytes,tuple[bytes,int]]:
+        """ earliest spelling of each word (any of txt_to_num_all), as word:(digits, position), without expanding the spellings """
+        return search_words(self, words)
+
+    def find_streaks(self) -> dict[bytes,dict[int,int]]:
+        """ first position of every digit repeated 1, 2, 3... times, up to its longest streak, stored after the first time """
+        return find_streaks(self)
+
+    def find_streets(self, descending:bool=False) -> dict[bytes,dict[int,int]]:
+        """ first position of an ascending (or descending) street of every length per starting digit, like 3456789, stored after the first time """
+        return find_streets(self, descending)
+
+    def histogram(self, n:int=1, start:int|None=None, stop:int|None=None, block:int|None=None) -> np.ndarray:
+        """
+        how often every digit (or n-gram up to 4 digits) shows up between start and stop, positions are indexed like the search results
+        entry v is the n-gram with value v, with block there is one row per block digits, chi_square from stats tells how uniform they are
+        """
+        one_indexed = Switches.one_indexed
+        return histogram(self, n, 0 if start is None else max(0, start - one_indexed), None if stop is None else stop - one_indexed, block)
+
     def to_base(self, base:int|str, digits:int=-1) -> str:
         """
         convert number to a different base, this includes intpart and radix point
@@ -174,24 +341,100 @@ class BigNum:
            - ABC -> lowercase + uppercase
            - alnum -> lowercase + uppercase + digits
            - anything else will be used directly, like list[str]
+        for big conversions to_base_iter and to_base_file dont hold the whole string
+        """
+        return "".join(self.to_base_iter(base, digits))
+
+    def to_base_iter(self, base:int|str, digits:int=-1, workers:int|None=None) -> Iterator[str]:
+        """
+        to_base in pieces of up to CONVERT_SEGMENT characters, digits counts the int part and radix point too
+        the digits get read and parsed segment by segment, the conversion is divide and conquer on a pool of threads (see frac_convert_gen)
         """
         if digits == -1:
             digits = self.info.file_size
 
-        base_notation, _ = resolve_notation(base)
-        digits_needed = ceil(digits*log(len(base_notation),self.info.base))
-
-        if self.info.format == "ycd":
-            frac_part = ycd_to_str(memoryview(self)[self.info.radix_pos+1:], self.info.base, digits_needed)
+        base_notation, trans_table = resolve_notation(base)
+        base_out = len(base_notation)
+        int_part = gmpy2.mpz(self.info.int_part) # type:ignore mpz not a known attribute, no biggie
+        if base == self.info.base:
+            int_str = int_part.digits(base_out)
+        elif base_out <= 62:
+            int_str = int_part.digits(base_out).translate(trans_table)
         else:
-            frac_part = self[:digits_needed].decode()
-
-        num_str = f"{self.info.int_part}.{frac_part}"
-
+            int_str = make_extractor(base_out, base_notation)(int_part, max(1, ceil(log(int_part + 1, base_out))))
+        head = f"{int_str}."[:digits]
+        yield head
+        frac_digits = digits - len(head)
+        if frac_digits <= 0:
+            return
+
+        read = lambda start, stop: self.read_digits(stop - start, start).tobytes()
         if base == self.info.base:
-            return num_str[:digits]
+            for start in range(0, min(frac_digits, self.info.digit_count), CONVERT_SEGMENT):
+                yield read(start, min(start + CONVERT_SEGMENT, frac_digits, self.info.digit_count)).decode()
+            return
+
+        digits_in = ceil(frac_digits * log(base_out, self.info.base)) + CONVERT_GUARD
+        if digits_in > self.info.digit_count: # not enough digits in the file, convert all there are
+            digits_in = self.info.digit_count
+            frac_digits = min(frac_digits, ceil(digits_in * log(self.info.base, base_out)))
+        yield from frac_convert_gen(read, digits_in, self.info.base, base, frac_digits, workers=workers)
+
+    def to_base_file(self, path:str|Path, base:int|str, digits:int=-1, workers:int|None=None) -> int:
+        """ writes to_base into a txt file piece by piece, returns the amount of characters written """
+        written = 0
+        with Path(path).open("w") as f:
+            for piece in self.to_base_iter(base, digits, workers):
+                written += f.write(piece)
+        return written
+
+    def to_ycd(self, path:str|Path, block_digits:int|None=None, digits:int=-1, workers:int|None=None) -> list[Path]:
+        """ writes the digits as y-cruncher ycd file, split into files of block_digits digits if given (then path is block 0, like "pi - 0.ycd"), returns the written paths """
+        return to_ycd(self, path, block_digits, None if digits == -1 else digits, workers)
+
+    def to_txt(self, path:str|Path, digits:int=-1, workers:int|None=None) -> Path:
+        """ writes the digits as y-cruncher txt file, like 3.1415... """
+        return to_txt(self, path, None if digits == -1 else digits, workers)
+
+class BlockedBigNum(BigNum):
+    """
+    a ycd computation that y-cruncher split into several files ("pi - Dec - Chudnovsky - 0.ycd", "... - 1.ycd" and so on) as one number
+    every block is a BigNum of its own that only opens its file when needed, digit indexes go over all blocks and searches cross their borders
+    the constant gets identified by block 0, the other blocks only need the same name and consecutive BlockIDs
+    """
+    def __init__(self, path:str|Path, info:BigNumInfo|None = None, paths:list[Path]|None = None) -> None:
+        super().__init__(path, info) # block 0
+        paths = paths or block_paths(self.path)
+        infos = Catalog.infos(paths[1:])
+        self.blocks = [BigNum(self.path, self.info)] + [BigNum(p, infos[p]) for p in paths[1:]]
+        self.block_starts = [0] # 0 based digit index of the first digit of each block
+        for block in self.blocks[:-1]:
+            self.block_starts.append(self.block_starts[-1] + block.info.digit_count)
+        digit_count = self.block_starts[-1] + self.blocks[-1].info.digit_count
+        self.info = replace(self.info,
+            digit_count=digit_count,
+            file_size=sum(block.info.file_size for block in self.blocks),
+            decimal_digits=digit_count if self.info.base == 10 else int(digit_count*log(self.info.base, 10)),
+        )
 
-        return base_convert(num_str,self.info.base,base)[:digits]
+    def __repr__(self) -> str:
+        """ eg pi.ycd(b10|2G)[4 blocks] """
+        return f"{super().__repr__()}[{len(self.blocks)} blocks]"
+
+    def read_digits(self, amount_digits:int, start:int=0) -> np.ndarray:
+        """ like BigNum.read_digits, the digits come from every block the range touches """
+        parts = []
+        for block, block_start in zip(self.blocks, self.block_starts):
+            low, high = max(start, block_start), min(start + amount_digits, block_start + block.info.digit_count)
+            if low < high:
+                parts.append(block.read_digits(high - low, low - block_start))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.uint8)
+
+    def close(self):
+        """ closes the files of every block """
+        super().close()
+        for block in getattr(self, "blocks", ()):
+            block.close()
 
 def get_all(
     name: str | None = None,
@@ -199,19 +442,21 @@ def get_all(
     format: str | None = None,
     size: int | None = None,
     num_dir: str | Path = Paths.num_dir,
-    recursive = True
+    recursive = True,
+    rescan = False
 ):
-    """ gets all BigNum with specified attributes """
-    num_dir = Path(num_dir)
-    if recursive:
-        files = [BigNum(p) for p in num_dir.rglob("*") if p.is_file and check_valid(p)]
-    else:
-        files = [BigNum(p) for p in num_dir.iterdir() if p.is_file and check_valid(p)]
-    if name:   files = filter(lambda file: file.info.name == name, files)
-    if base:   files = filter(lambda file: file.info.base == base, files)
-    if format: files = filter(lambda file: file.info.format == format, files)
-    if size:   files = filter(lambda file: file.info.file_size == size, files)
-    return list(files)
+    """
+    gets all BigNum with specified attributes, the blocks of a split ycd computation come as one BlockedBigNum
+    answered from the catalog, num_dir only gets scanned when files were added or removed, or with rescan (needed to see files rewritten in place)
+    """
+    nums:list[BigNum] = []
+    for info in Catalog.find(Path(num_dir), name, base, format, size, recursive, rescan):
+        paths = block_paths(info.path) if info.format == "ycd" else [info.path]
+        if len(paths) == 1:
+            nums.append(BigNum(info.path, info))
+        elif paths[0] == info.path: # the other blocks come with block 0
+            nums.append(BlockedBigNum(info.path, info, paths))
+    return nums
 
 def get_one(
     name: str | None = None,
@@ -219,8 +464,9 @@ def get_one(
     format: str | None = None,
     size: int | None = None,
     num_dir: str | Path = Paths.num_dir,
-    recursive = True
+    recursive = True,
+    rescan = False
 ):
     """ gets one BigNum with specified attributes """
-    files = get_all(name, base, format, size, num_dir, recursive)
+    files = get_all(name, base, format, size, num_dir, recursive, rescan)
     if files: return files[0]
@@ -2,364 +2,397 @@
 
 from fractions import Fraction
 from hashlib import md5
-from itertools import chain
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from functools import lru_cache
 import mpmath
 from mpmath import e, pi, ln, sqrt, inf, root, nsum, fsum, nprod, findroot
+import os
 from pathlib import Path
-from queue import Queue
 import sqlite3
 import sympy
-from threading import Thread
-from time import perf_counter, sleep
-from typing import Any
+import sys
+from time import perf_counter
+from typing import Any, Callable
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
 from .bignum import BigNum
+from .cache import _migrate
+from .catalog import Catalog
+from .kmer import digit_values
 from .helper import format_size, format_time
 from .var import Sizes, Paths
-from .const import IDENTIFY_TABLE_NAME, PAIRS_PER_INSERT
-
-@mpmath.workdps(120)
-def build_identifier(verbose:bool=False):
-    # a useful function to check if a number is interesting at all
-    tol_int = mpmath.mpf("1e-90") # used for checking if int
-    tol_rat = 10**90 # used for checking if rational
-    def is_valid(num): # returns False if a number is +/-infinity, integer or rational
-        return -mpmath.inf<num<mpmath.inf and num%1>tol_int and -num%1>tol_int and Fraction(str(num)).denominator > tol_rat
-
-    if verbose:
-        print("setting up identifier generation")
-
-    # only 100 digits are used but for big expressions evaluation can yield high error so increasing precision
-    # if you wanna add constants maybe put this to 200 and look at the md5 hash of the generated db, then lower it until it changes, thats how i did it
-    # 120 for now is the limit, altho funnily enough all my files still get identified with 105
-    primes = [mpmath.mpf(p) for p in sympy.primerange(1e5)]
-    root2 = sqrt(2)
-    root3 = sqrt(3)
-    ln2 = ln(2)
-    gamma = -mpmath.psi(mpmath.mpf("1/3"),1)
-
-    if verbose:
-        print("evaluating oneliners")
-    constants:list[tuple[Any,str]] = [
-        (pi, "pi"),
-        (pi*2, "tau"),
-        (e, "e"),
-        (+mpmath.phi, "phi"),
-        (root2+1, "silver ratio"),
-        (+mpmath.catalan, "catalan's constant"),
-        (+mpmath.apery, "apery's constant"),
-        (+mpmath.mertens, "mertens constant"),
-        (+mpmath.twinprime, "twin prime constant"),
-        (+mpmath.khinchin, "khinchin's constant"),
-        (findroot(lambda x:x**2+1-x**3,1), "supergolden ratio"),
-        (sqrt(2+root2), "connective constant"),
-        (mpmath.elliprf(0,1,2)*4, "lemniscate"),
-        (gamma, "euler mascheroni"),
-        (nprod(lambda x:mpmath.cos(pi/x), [3,inf]), "kepler-bouwkamp constant"),
-        (root((45-sqrt(1929))/18,3) + root((45+sqrt(1929))/18,3), "wallis's constant"),
-        (nsum(lambda x:1/(2**x-1), [1,inf]), "erdos-borwein constant"),
-        (mpmath.lambertw(1), "omega constant"),
-        (findroot(lambda x:(x*mpmath.exp(sqrt(1+x**2)))/(1+sqrt(1+x**2))-1,1.2), "laplace limit"),
-        (1/mpmath.agm(1,root2), "gauss's constant"),
-        (2/root3, "second hermite constant"),
-        (nsum(lambda x:1/(10**mpmath.factorial(x)), [1,inf]), "liouville's constant"),
-        (mpmath.besseli(1,2)/mpmath.besseli(0,2), "first continued fraction constant"),
-        (e**(pi*sqrt(163)), "ramanujan's constant"),
-        (+mpmath.glaisher, "glaisher-kinkelin constant"),
-        (findroot(lambda x:x-mpmath.cos(x),0.75), "dottie number"),
-        (+mpmath.mertens, "meissel-mertens constant"),
-        (ln(1+root2)+root2, "universal parabolic constant"),
-        (e**pi, "gelfond's constant"),
-        (2**root2, "gelfond-schneider constant"),
-        (pi**2/8, "second favard constant"),
-        (pi*(3-sqrt(5)), "golden angle"),
-        (pi*ln((4*pi**3*e**(2*-mpmath.diff(mpmath.gamma,1)))/mpmath.gamma(1/4)**4), "sierpinski's constant"),
-        (pi**2/12, "first nielsen-ramanujan constant"),
-        ((9-mpmath.polygamma(1,2/3)+mpmath.polygamma(1,4/3))/(4*root3), "gieseking constant"),
-        (findroot(lambda x:x**3-x**2-x-1,1.8), "tribonacci constant"),
-        (findroot(lambda x:x**3-x-1,1.3), "plastic ratio"),
-        (1/4*(2-nprod(lambda x:1-1/(2**2**x),[0,inf])), "prouhet-thue-morse constant"),
-        ("0."+"".join(str(x) for x in range(120)), "champernowne constant"),
-        (findroot(lambda x:x**10+x**9-x**7-x**6-x**5-x**4-x**3+x+1, 1.2), "salem constant"),
-        (pi**2/(12*ln2), "first levy's constant"),
-        (e**(pi**2 / (12*ln2)), "second levy's constant"),
-        ("0."+"".join(str(int(p)) for p in primes[:50]), "copeland-erdos constant"),
-        (-e*(gamma+nsum(lambda x:(-1)**x/(x*mpmath.fac(x)),[1,inf])), "gompertz constant"),
-        (pi/ln2, "van der pauw constant"),
-        (mpmath.atan(root2), "magic angle rad"),
-        (mpmath.atan(root2)*180/pi, "magic angle deg"),
-        (6*ln2*(48*ln(mpmath.glaisher)-4*ln(pi)-ln2-2)/pi**2-1/2, "porter's constant"),
-        (sum(1/2**p for p in primes), "prime constant"),
-        ((6*ln2*ln(10))/pi**2, "lochs constant"),
-        (findroot(lambda x:4*x**8-28*x**6-7*x**4+16*x**2+16, 1), "devicci's tesseract constant"),
-        (8/(root3*3), "lieb's sqiare ice constant"),
-        (1 + nsum(lambda x:1-1/mpmath.zeta(x),[2,inf]), "niven's constant"),
-        (nsum(lambda x:8**2**x/(2**2**(x+2)-1),[0,inf]), "regular paperfolding sequence"),
-        (nsum(lambda x:1/mpmath.fib(x),[1,inf]), "reciprocal fibonacci constant"),
-        (1-(1+ln(ln2))/ln2, "erdos-tenebaum-ford constant"),
-        (nsum(lambda x:(-1)**x*(x**(1/x)-1),[1,inf]), "mbr constant"),
-        (mpmath.gamma(1/4)**2/(4*pi**(3/2)), "logarithmic capacity of the unit disk")
-    ]
-
-    """ constants i couldnt find a nice oneliner for """
-    if verbose:
-        print("evaluating more complex constants")
-
-    # cahen's constant
+from .const import IDENTIFY_TABLE_NAME, IDENTIFY_EXPRESSIONS_TABLE_NAME, IDENTIFY_DPS, BULK_DENSE_LIMIT, BUILD_CHUNK, SQLITE_CACHE_SIZE
+
+"""
+The identifier table maps the md5 of the first 100 digits of a number to its name, its built from a fixed expression space:
+named constants, single argument functions of every input and two argument functions of every pair of inputs
+Every expression is known by its definition (like "pi" or "root(2,root3)") and gets evaluated on its own in a pool of processes,
+the hash of each one is stored with its definition (NULL if it isnt a valid number), so a rebuild only evaluates definitions it never saw
+Only 100 digits are used but big expressions can have a high error, so they get evaluated with IDENTIFY_DPS digits
+if you wanna add constants maybe put this to 200 and look at the md5 hash of the generated db, then lower it until it changes, thats how i did it
+120 for now is the limit, altho funnily enough all my files still get identified with 105
+Values are made in the worker and not at import, so they always have the working precision
+"""
+
+@lru_cache(maxsize=None)
+def _primes() -> list:
+    return [mpmath.mpf(p) for p in sympy.primerange(1e5)]
+
+def _root2(): return sqrt(2)
+def _root3(): return sqrt(3)
+def _ln2(): return ln(2)
+def _gamma(): return -mpmath.psi(mpmath.mpf("1/3"),1)
+
+def _cahen():
     s = [mpmath.mpf(2)]
     for _ in range(15):
         s.append(s[-1] * (s[-1] - 1) + 1)
-    num = fsum((-1)**k / (s[k] - 1) for k in range(len(s)))
-    name = "cahen's constant"
-    constants.append((num,name))
+    return fsum((-1)**k / (s[k] - 1) for k in range(len(s)))
 
-    # conway's constant
+def _conway():
     coeffs = [1,0,-1,-2,-1,2,2,1,-1,-1,-1,-1,-1,2,5,3,-2,-10,-3,-2,6,6,1,9,-3,-7,-8,-8,10,6,8,-5,-12,7,-7,7,1,-3,10,1,-6,-2,-10,-3,2,9,-3,14,-8,0,-7,9,3,-4,-10,-7,12,7,2,-12,-4,-2,5,0,1,-7,7,-4,12,-6,3,-6]
-    num = [s for s in mpmath.polyroots(coeffs) if isinstance(s,mpmath.mpf) and 1.3<s<1.305][0]
-    name = "conway's constant"
-    constants.append((num,name))
-
-    if verbose:
-        print("calculating hashes and inserting into db")
-
-    hash_name_pairs:list[tuple[bytes,str]] = []
-    hash_set:set[bytes] = set()
-
-    for num,name in constants:
-        num_hash = md5(str(num)[:100].encode()).digest()
-        if num_hash in hash_set:
-            continue
-        hash_set.add(num_hash)
-        hash_name_pairs.append((
-            num_hash,
-            name
-        ))
-
-    """ functions """
-    if verbose:
-        print("iterating single argument over functions")
-    # inputs to functions 0->10 & 1/2->1/10 & some special ones
-    inputs = [
-        (x,str(x)) for x in range(11)
-    ] + [
-        (1/mpmath.mpf(x),"1/"+str(x)) for x in range(2,11)
-    ] + [
-        (root2,"root2"),
-        (root3,"root3"),
-        (mpmath.sin(1), "sin1"),
-        (mpmath.cos(1), "cos1"),
-        (mpmath.tan(1), "tan1"),
-        (pi, "pi"),
-        (pi*2, "tau"),
-        (e, "e"),
-        (ln2, "ln2")
+    return [s for s in mpmath.polyroots(coeffs) if isinstance(s,mpmath.mpf) and 1.3<s<1.305][0]
+
+_CONSTANTS:dict[str,Callable[[],Any]] = {
+    "pi": lambda: +pi,
+    "tau": lambda: pi*2,
+    "e": lambda: +e,
+    "phi": lambda: +mpmath.phi,
+    "silver ratio": lambda: _root2()+1,
+    "catalan's constant": lambda: +mpmath.catalan,
+    "apery's constant": lambda: +mpmath.apery,
+    "mertens constant": lambda: +mpmath.mertens,
+    "twin prime constant": lambda: +mpmath.twinprime,
+    "khinchin's constant": lambda: +mpmath.khinchin,
+    "supergolden ratio": lambda: findroot(lambda x:x**2+1-x**3,1),
+    "connective constant": lambda: sqrt(2+_root2()),
+    "lemniscate": lambda: mpmath.elliprf(0,1,2)*4,
+    "euler mascheroni": _gamma,
+    "kepler-bouwkamp constant": lambda: nprod(lambda x:mpmath.cos(pi/x), [3,inf]),
+    "wallis's constant": lambda: root((45-sqrt(1929))/18,3) + root((45+sqrt(1929))/18,3),
+    "erdos-borwein constant": lambda: nsum(lambda x:1/(2**x-1), [1,inf]),
+    "omega constant": lambda: mpmath.lambertw(1),
+    "laplace limit": lambda: findroot(lambda x:(x*mpmath.exp(sqrt(1+x**2)))/(1+sqrt(1+x**2))-1,1.2),
+    "gauss's constant": lambda: 1/mpmath.agm(1,_root2()),
+    "second hermite constant": lambda: 2/_root3(),
+    "liouville's constant": lambda: nsum(lambda x:1/(10**mpmath.factorial(x)), [1,inf]),
+    "first continued fraction constant": lambda: mpmath.besseli(1,2)/mpmath.besseli(0,2),
+    "ramanujan's constant": lambda: e**(pi*sqrt(163)),
+    "glaisher-kinkelin constant": lambda: +mpmath.glaisher,
+    "dottie number": lambda: findroot(lambda x:x-mpmath.cos(x),0.75),
+    "meissel-mertens constant": lambda: +mpmath.mertens,
+    "universal parabolic constant": lambda: ln(1+_root2())+_root2(),
+    "gelfond's constant": lambda: e**pi,
+    "gelfond-schneider constant": lambda: 2**_root2(),
+    "second favard constant": lambda: pi**2/8,
+    "golden angle": lambda: pi*(3-sqrt(5)),
+    "sierpinski's constant": lambda: pi*ln((4*pi**3*e**(2*-mpmath.diff(mpmath.gamma,1)))/mpmath.gamma(1/4)**4),
+    "first nielsen-ramanujan constant": lambda: pi**2/12,
+    "gieseking constant": lambda: (9-mpmath.polygamma(1,2/3)+mpmath.polygamma(1,4/3))/(4*_root3()),
+    "tribonacci constant": lambda: findroot(lambda x:x**3-x**2-x-1,1.8),
+    "plastic ratio": lambda: findroot(lambda x:x**3-x-1,1.3),
+    "prouhet-thue-morse constant": lambda: 1/4*(2-nprod(lambda x:1-1/(2**2**x),[0,inf])),
+    "champernowne constant": lambda: "0."+"".join(str(x) for x in range(120)),
+    "salem constant": lambda: findroot(lambda x:x**10+x**9-x**7-x**6-x**5-x**4-x**3+x+1, 1.2),
+    "first levy's constant": lambda: pi**2/(12*_ln2()),
+    "second levy's constant": lambda: e**(pi**2 / (12*_ln2())),
+    "copeland-erdos constant": lambda: "0."+"".join(str(int(p)) for p in _primes()[:50]),
+    "gompertz constant": lambda: -e*(_gamma()+nsum(lambda x:(-1)**x/(x*mpmath.fac(x)),[1,inf])),
+    "van der pauw constant": lambda: pi/_ln2(),
+    "magic angle rad": lambda: mpmath.atan(_root2()),
+    "magic angle deg": lambda: mpmath.atan(_root2())*180/pi,
+    "porter's constant": lambda: 6*_ln2()*(48*ln(mpmath.glaisher)-4*ln(pi)-_ln2()-2)/pi**2-1/2,
+    "prime constant": lambda: sum(1/2**p for p in _primes()),
+    "lochs constant": lambda: (6*_ln2()*ln(10))/pi**2,
+    "devicci's tesseract constant": lambda: findroot(lambda x:4*x**8-28*x**6-7*x**4+16*x**2+16, 1),
+    "lieb's sqiare ice constant": lambda: 8/(_root3()*3),
+    "niven's constant": lambda: 1 + nsum(lambda x:1-1/mpmath.zeta(x),[2,inf]),
+    "regular paperfolding sequence": lambda: nsum(lambda x:8**2**x/(2**2**(x+2)-1),[0,inf]),
+    "reciprocal fibonacci constant": lambda: nsum(lambda x:1/mpmath.fib(x),[1,inf]),
+    "erdos-tenebaum-ford constant": lambda: 1-(1+ln(_ln2()))/_ln2(),
+    "mbr constant": lambda: nsum(lambda x:(-1)**x*(x**(1/x)-1),[1,inf]),
+    "logarithmic capacity of the unit disk": lambda: mpmath.gamma(1/4)**2/(4*pi**(3/2)),
+    "cahen's constant": _cahen, # constants i couldnt find a nice oneliner for
+    "conway's constant": _conway,
+}
+
+# inputs to functions 0->10 & 1/2->1/10 & some special ones
+_INPUTS:dict[str,Callable[[],Any]] = {
+    **{str(x):(lambda x=x: x) for x in range(11)},
+    **{f"1/{x}":(lambda x=x: 1/mpmath.mpf(x)) for x in range(2,11)},
+    "root2": _root2,
+    "root3": _root3,
+    "sin1": lambda: mpmath.sin(1),
+    "cos1": lambda: mpmath.cos(1),
+    "tan1": lambda: mpmath.tan(1),
+    "pi": lambda: +pi,
+    "tau": lambda: pi*2,
+    "e": lambda: +e,
+    "ln2": _ln2,
+}
+
+_FUNCTIONS:dict[str,Callable] = { # single argument
+    "sqrt": mpmath.sqrt,
+    "cbrt": mpmath.cbrt,
+    "sin": mpmath.sin,
+    "cos": mpmath.cos,
+    "tan": mpmath.tan,
+    "ln": ln,
+    "W": mpmath.lambertw,
+    "zeta": mpmath.zeta,
+    "gamma": mpmath.gamma,
+}
+
+_FUNCTIONS2:dict[str,Callable] = { # two arguments
+    "root": root,
+    "beta": mpmath.beta,
+    "agm": mpmath.agm,
+    "pow": mpmath.power,
+}
+
+def _expressions() -> list[tuple[str,...]]:
+    """ every expression as (constant,) (function, input) or (function, input, input), in the order that decides which name a hash gets if several expressions share it """
+    return [
+        *((name,) for name in _CONSTANTS),
+        *((fname, iname) for fname in _FUNCTIONS for iname in _INPUTS),
+        *((fname, i1name, i2name) for fname in _FUNCTIONS2 for i1name in _INPUTS for i2name in _INPUTS),
     ]
 
-    # single argument
-    functions = [
-        (mpmath.sqrt, "sqrt"),
-        (mpmath.cbrt, "cbrt"),
-        (mpmath.sin, "sin"),
-        (mpmath.cos, "cos"),
-        (mpmath.tan, "tan"),
-        (ln, "ln"),
-        (mpmath.lambertw, "W"),
-        (mpmath.zeta, "zeta"),
-        (mpmath.gamma, "gamma")
-    ]
+def _definition(expression:tuple[str,...]) -> str:
+    """ name of an expression, like pi, sqrt(root2) or root(2,root3) """
+    return expression[0] if len(expression) == 1 else f"{expression[0]}({','.join(expression[1:])})"
 
-    for fval,fname in functions:
-        for ival,iname in inputs:
-            name = f"{fname}({iname})"
-            try:
-                num = fval(ival)
-            except:
-                continue
-            if not is_valid(num):
-                continue
-            blob = md5(str(num)[:100].encode()).digest()
-            if blob in hash_set:
-                continue
-            hash_set.add(blob)
-            hash_name_pairs.append((blob,name))
-            if verbose:
-                print(f"{name}:{blob}", end=" "*20+"\r")
-
-    # two argument
+def _is_valid(num) -> bool:
+    """ False if a number is +/-infinity, integer or rational, those are not interesting at all """
+    tol_int = mpmath.mpf("1e-90") # used for checking if int
+    tol_rat = 10**90 # used for checking if rational
+    return -mpmath.inf<num<mpmath.inf and num%1>tol_int and -num%1>tol_int and Fraction(str(num)).denominator > tol_rat
+
+def _evaluate(expression:tuple[str,...]) -> bytes|None:
+    """ md5 of the first 100 characters of an expression, None if it cant be evaluated or isnt valid, runs in the worker processes """
+    with mpmath.workdps(IDENTIFY_DPS):
+        if len(expression) == 1: # constants dont get checked
+            return md5(str(_CONSTANTS[expression[0]]())[:100].encode()).digest()
+        function = _FUNCTIONS[expression[0]] if len(expression) == 2 else _FUNCTIONS2[expression[0]]
+        try:
+            num = function(*(_INPUTS[i]() for i in expression[1:]))
+            if not _is_valid(num):
+                return None
+        except Exception:
+            return None
+        return md5(str(num)[:100].encode()).digest()
+
+def build_identifier(verbose:bool=False, workers:int|None=None, rebuild:bool=False):
+    """
+    builds the identifier table from the expression space, only definitions that were never evaluated get evaluated (all of them with rebuild)
+    evaluation runs in a pool of workers processes (one per cpu core by default), hashes get stored with their definition as soon as they are in
+    """
+    time_start = perf_counter()
+    expressions = _expressions()
+    conn = sqlite3.connect(Paths.sqlite_path)
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {IDENTIFY_EXPRESSIONS_TABLE_NAME} (definition TEXT PRIMARY KEY, hash BLOB)")
+    if rebuild:
+        conn.execute(f"DELETE FROM {IDENTIFY_EXPRESSIONS_TABLE_NAME}")
+    hashes:dict[str,bytes|None] = dict(conn.execute(f"SELECT definition, hash FROM {IDENTIFY_EXPRESSIONS_TABLE_NAME}"))
+    missing = [expression for expression in expressions if _definition(expression) not in hashes]
     if verbose:
-        print(f"\niterating multi argument fucntions")
-    functions = [
-        (root, "root"),
-        (mpmath.beta, "beta"),
-        (mpmath.agm, "agm"),
-        (mpmath.power, "pow"),
-    ]
-
-    for fval,fname in functions:
-        for i1val,i1name in inputs:
-            for i2val,i2name in inputs:
-                name = f"{fname}({i1name},{i2name})"
-                try:
-                    num = fval(i1val,i2val)
-                except:
-                    continue
-                if not is_valid(num):
-                    continue
-                blob = md5(str(num)[:100].encode()).digest()
-                if blob in hash_set:
-                    continue
-                hash_set.add(blob)
-                hash_name_pairs.append((blob,name))
+        print(f"evaluating {len(missing)} of {len(expressions)} expressions")
+
+    if missing:
+        workers = min(workers or os.cpu_count() or 1, len(missing))
+        with ProcessPoolExecutor(workers) if workers > 1 else nullcontext() as pool: # a single worker is not worth a process
+            results = pool.map(_evaluate, missing, chunksize=max(1, len(missing) // (workers*16))) if pool else map(_evaluate, missing)
+            pending = []
+            for i, (expression, blob) in enumerate(zip(missing, results), 1):
+                hashes[_definition(expression)] = blob
+                pending.append((_definition(expression), blob))
+                if len(pending) == 256 or i == len(missing): # stored in batches, an interrupted build keeps what it did
+                    conn.executemany(f"INSERT OR REPLACE INTO {IDENTIFY_EXPRESSIONS_TABLE_NAME} VALUES (?, ?)", pending)
+                    conn.commit()
+                    pending.clear()
                 if verbose:
-                    print(f"{name}:{blob}", end=" "*20+"\r")
-
-    # put all aggregated hash and name pairs into the database
-    conn = sqlite3.connect(Paths.sqlite_path)
-    cursor = conn.cursor()
-    cursor.execute(f"CREATE TABLE IF NOT EXISTS {IDENTIFY_TABLE_NAME} (hash BLOB PRIMARY KEY, name TEXT)")
-    cursor.executemany(f"""INSERT OR IGNORE INTO {IDENTIFY_TABLE_NAME} VALUES (?, ?)""", hash_name_pairs)
+                    print(f"{i}/{len(missing)} {_definition(expression)}", end=" "*20+"\r")
+
+    # the first expression with a hash names it
+    hash_name_pairs:dict[bytes,str] = {}
+    for expression in expressions:
+        definition = _definition(expression)
+        blob = hashes[definition]
+        if blob is not None and blob not in hash_name_pairs:
+            hash_name_pairs[blob] = definition
+
+    # put all aggregated hash and name pairs into the database, expressions that are gone dont name anything anymore
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {IDENTIFY_TABLE_NAME} (hash BLOB PRIMARY KEY, name TEXT)")
+    conn.execute(f"DELETE FROM {IDENTIFY_TABLE_NAME}")
+    conn.executemany(f"""INSERT INTO {IDENTIFY_TABLE_NAME} VALUES (?, ?)""", hash_name_pairs.items())
+    Catalog.clear(conn) # files identified with the old table might have another name now, in the same transaction so no catalog outlives its table
     conn.commit()
     conn.close()
 
     if verbose:
-        print("\ndone building identifier table")
-
-def get_patterns(chunk:str|bytes, max_length:int=10, offset:int=0):
-    positions = chain.from_iterable((x+offset,)*max_length for x in range(len(chunk)-max_length))
-    patterns = []
-    for start_idx in range(len(chunk)-max_length):
-        for length in range(1,max_length+1):
-            part = chunk[start_idx:start_idx+length]
-            patterns.append(part)
-    return zip(patterns, positions)
-
-def build_one(amount_digits:int, max_substring_len:int, num:BigNum):
+        print(f"\ndone building identifier table with {len(hash_name_pairs)} names in {format_time(perf_counter()-time_start)}")
+
+def first_occurrences(digits:np.ndarray, base:int, max_substring_len:int, offset:int=0, amount_starts:int|None=None) -> tuple[np.ndarray,np.ndarray]:
+    """
+    every distinct digit string of length 1 to max_substring_len inside an ascii digit array together with its first 0 based position (+offset)
+    only the first amount_starts positions are used as starts (defaults to all), the digits after that are only there to complete the strings
+    returns the strings as a fixed width bytes array sorted like sqlite sorts blobs and the matching positions as uint64
+    each length is one pass of rolling codes, the first position per code comes from a dense array for short lengths and from a sort for longer ones
+    """
+    if max_substring_len > (19 if base == 10 else 16):
+        raise ValueError("a substring has to fit into an uint64 code, use the suffix index for longer ones")
+    values = digit_values(digits).astype(np.uint64)
+    amount_starts = len(digits) if amount_starts is None else amount_starts
+    code = np.zeros(amount_starts, dtype=np.uint64)
+    keys = []
+    positions = []
+    for length in range(1, max_substring_len+1):
+        complete = max(0, min(amount_starts, len(digits)-length+1)) # strings running past the digits dont count
+        code *= np.uint64(base)
+        code[:complete] += values[length-1:length-1+complete]
+        if not complete:
+            continue
+        if base ** length <= BULK_DENSE_LIMIT:
+            table = np.full(base ** length, complete, dtype=np.int64) # complete is past every start, so it marks strings that dont occur
+            table[code[:complete][::-1]] = np.arange(complete, dtype=np.int64)[::-1] # with repeated codes the last write wins, backwards thats the first position
+            first = table[table != complete]
+        else:
+            _, first = np.unique(code[:complete], return_index=True)
+        strings = sliding_window_view(digits, length)[first]
+        keys.append(np.ascontiguousarray(strings).view(f"S{length}").ravel().astype(f"S{max_substring_len}"))
+        positions.append(first.astype(np.uint64) + np.uint64(offset))
+    keys = np.concatenate(keys)
+    positions = np.concatenate(positions)
+    order = np.argsort(keys, kind="stable") # shorter strings sort first since padding is b"\0"
+    return keys[order], positions[order]
+
+def write_table(table_name:str, keys:np.ndarray, positions:np.ndarray, verbose:bool=True) -> int:
+    """
+    writes sorted pattern:position pairs into a WITHOUT ROWID table in one transaction, patterns that are already recorded keep the smaller position (a recorded -1 gets replaced)
+    the db stays in WAL mode so a crash only loses the rows of this call, just this connection skips syncing and the connections of Cache stay open
+    positions are 0 based and stored that way, the indexing only gets applied to search results
+    returns the amount of rows handed to sqlite
+    """
     time_start = perf_counter()
-    patterns_done = 0
-    patterns_total = amount_digits * max_substring_len
-    mv = memoryview(num)
-
-    conn = sqlite3.connect(Paths.sqlite_path)
-    cursor = conn.cursor()
-
-    print(f"creating table {num.info.table_name}"+" "*50)
-    cursor.execute(f"""CREATE TABLE IF NOT EXISTS "{num.info.table_name}" (string BLOB PRIMARY KEY, position INTEGER)""")
-
-    for startpos in range(num.info.radix_pos+1, amount_digits, PAIRS_PER_INSERT):
-        chunk = mv[startpos : startpos + PAIRS_PER_INSERT].tobytes()
-        patterns = get_patterns(chunk, max_substring_len, startpos+1)
-        cursor.executemany(f"""INSERT OR IGNORE INTO "{num.info.table_name}" VALUES (?, ?)""", patterns)
-        conn.commit()
-        patterns_done += PAIRS_PER_INSERT * max_substring_len
-
-        # progress printing
+    conn = sqlite3.connect(Paths.sqlite_path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    _migrate(conn) # old positions have to be 0 based before new ones get compared against them
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+    conn.execute(f"""CREATE TABLE IF NOT EXISTS "{table_name}" (string BLOB PRIMARY KEY, position INTEGER) WITHOUT ROWID""")
+    conn.execute("BEGIN")
+    for start in range(0, len(keys), Sizes.pairs_per_insert):
+        stop = start + Sizes.pairs_per_insert
+        conn.executemany(f"""INSERT INTO "{table_name}" VALUES (?, ?) ON CONFLICT(string) DO UPDATE SET position = excluded.position WHERE position = -1 OR excluded.position < position""", zip(keys[start:stop].tolist(), positions[start:stop].tolist()))
+        if verbose:
+            time_elapsed = perf_counter() - time_start
+            rows_done = min(stop, len(keys))
+            speed = rows_done / time_elapsed
+            print(" "*120+"\r"+f"elapsed:{format_time(time_elapsed)}\t eta:{format_time((len(keys)-rows_done)/speed)}\t rows:{format_size(speed, '/s')}", end="\r")
+    conn.execute("COMMIT")
+    conn.close()
+    if verbose:
+        total_time = perf_counter() - time_start
+        print(f"wrote {format_size(len(keys))} rows to {table_name} in {format_time(total_time)} ({format_size(len(keys)/max(total_time, 1e-9), ' rows/s')})")
+    return len(keys)
+
+def build_one(amount_digits:int, max_substring_len:int, num:BigNum, verbose:bool=True) -> int:
+    """
+    precalculates the first position of every string up to max_substring_len inside the first amount_digits digits into the search table of num
+    duplicates get dropped in memory first, so sqlite only sees every pattern once and in sorted order, returns the amount of rows written
+    """
+    time_start = perf_counter()
+    amount_digits = min(amount_digits, num.info.digit_count)
+    if verbose:
+        print(f"creating table {num.info.table_name}"+" "*50)
+    digits = num.read_digits(amount_digits)
+    keys, positions = first_occurrences(digits, num.info.base, max_substring_len)
+    del digits
+    if verbose:
         time_elapsed = perf_counter() - time_start
-        time_elapsed_f = format_time(time_elapsed)
-        speed_pattern = patterns_done / time_elapsed
-        speed_pattern_f = format_size(speed_pattern, "/s")
-        eta = format_time(patterns_total / speed_pattern - time_elapsed)
-        print(" "*120+"\r"+f"elapsed:{time_elapsed_f}\t eta:{eta}\t patterns:{speed_pattern_f}", end="\r")
+        print(f"found {format_size(len(keys))} distinct patterns in {format_size(amount_digits)} digits in {format_time(time_elapsed)} ({format_size(amount_digits*max_substring_len/time_elapsed, ' patterns/s')})")
+    rows = write_table(num.info.table_name, keys, positions, verbose)
+    if verbose:
+        print(f"done building search string table {num.info.table_name} in {format_time(perf_counter()-time_start)}")
+    return rows
 
-    conn.close()
-    mv.release()
-    total_time = perf_counter()-time_start
-    print(f"done building search string table {num.info.table_name} in {format_time(total_time)}")
-
-class SharedMem:
-    nums_queue:Queue[BigNum] = Queue()
-    amount_digits:int
-    max_substring_len:int
-    files_total:int
-    files_done:int = 0
-    patterns_total:int
-    patterns_done:int = 0
-    time_start:float
-    finished:bool = False
-    tmp_tables:Queue[Path] = Queue()
-    tmp_tables_dir:Path
-
-def progress_mt(mem:SharedMem):
-    while not mem.finished:
-        sleep(0.3)
-        try:
-            time_elapsed = perf_counter() - mem.time_start
-            time_elapsed_f = format_time(time_elapsed)
-            speed_pattern = mem.patterns_done / time_elapsed
-            speed_pattern_f = format_size(speed_pattern, "/s")
-            eta = format_time(mem.patterns_total / speed_pattern - time_elapsed)
-            print(" "*120+"\r"+f"elapsed:{time_elapsed_f}\t eta:{eta}\t patterns:{speed_pattern_f}", end="\r")
-        except:
-            ...
-
-def build_mt(mem:SharedMem):
-    while not mem.nums_queue.empty():
-        num = mem.nums_queue.get()
-        mv = memoryview(num)
-        db_path = mem.tmp_tables_dir/Path(num.info.table_name)
-
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute(f"""CREATE TABLE IF NOT EXISTS "{num.info.table_name}" (string BLOB PRIMARY KEY, position INTEGER)""")
-
-        for startpos in range(num.info.radix_pos+1, mem.amount_digits, Sizes.pairs_per_insert):
-            chunk = mv[startpos : startpos + Sizes.pairs_per_insert].tobytes()
-            patterns = get_patterns(chunk, mem.max_substring_len, startpos+1)
-            cursor.executemany(f"""INSERT OR IGNORE INTO "{num.info.table_name}" VALUES (?, ?)""", patterns)
-            conn.commit()
-            mem.patterns_done += Sizes.pairs_per_insert * mem.max_substring_len
-
-        conn.close()
-        mv.release()
-        mem.files_done += 1
-        mem.tmp_tables.put(db_path)
-
-def build_many(amount_digits:int, max_substring_len:int, nums:list[BigNum]):
-    mem = SharedMem()
-    mem.amount_digits = amount_digits
-    mem.max_substring_len = max_substring_len
-    mem.time_start = perf_counter()
-    mem.files_total = len(nums)
-    mem.patterns_total = amount_digits * max_substring_len * len(nums)
-    mem.tmp_tables_dir = Path("tmp_part_tables")
-    mem.tmp_tables_dir.mkdir()
-
-    for n in nums:
-        mem.nums_queue.put(n)
-
-    progress_thread = Thread(target=progress_mt, args=(mem,))
-    progress_thread.start()
-
-    threads = []
-    for id in range(len(nums)):
-        t = Thread(target=build_mt, args=(mem,))
-        threads.append(t)
-        t.start()
-
-    for t in threads:
-        t.join()
-
-    mem.finished = True
-    progress_thread.join()
-
-    print("\nDone creating tables, now merging them")
-    conn = sqlite3.connect(Paths.sqlite_path)
-    cursor = conn.cursor()
-    while not mem.tmp_tables.empty():
-        tmp_db_path = mem.tmp_tables.get()
-        cursor.execute(f"""ATTACH DATABASE "{str(tmp_db_path)}" AS tmp_db""")
-        cursor.execute("SELECT name FROM tmp_db.sqlite_master WHERE type='table'")
-        table_name = cursor.fetchone()[0]
-        cursor.execute(f"""
-CREATE TABLE IF NOT EXISTS "{table_name}" AS SELECT * FROM tmp_db."{table_name}"
-""")
-        cursor.execute(f"DETACH DATABASE tmp_db")
-        tmp_db_path.unlink()
-    conn.commit()
-    conn.close()
+@lru_cache(maxsize=None)
+def _open(path:Path) -> BigNum:
+    """ every worker opens each file once """
+    return BigNum(path)
 
-    for file in mem.tmp_tables_dir.iterdir():
-        file.unlink()
-    mem.tmp_tables_dir.rmdir()
+def _build_chunk(path:Path, start:int, stop:int, max_substring_len:int) -> tuple[np.ndarray,np.ndarray,int,int,float]:
+    """ first occurrences of all strings starting in the digits [start:stop] of a file, runs inside a worker """
+    time_start = perf_counter()
+    num = _open(path)
+    digits = num.read_digits(min(stop + max_substring_len - 1, num.info.digit_count) - start, start) # reaches into the next chunk so the strings starting at the end are complete
+    keys, positions = first_occurrences(digits, num.info.base, max_substring_len, start, stop - start)
+    return keys, positions, stop - start, os.getpid(), perf_counter() - time_start
+
+def merge_first_occurrences(parts:list[tuple[np.ndarray,np.ndarray]]) -> tuple[np.ndarray,np.ndarray]:
+    """ merges results of first_occurrences into one, keeping the smallest position per string, the result is sorted again """
+    keys = np.concatenate([k for k,_ in parts])
+    positions = np.concatenate([p for _,p in parts])
+    order = np.lexsort((positions, keys)) # by string, then by position, so the first of each string is its smallest position
+    keys = keys[order]
+    positions = positions[order]
+    first = np.concatenate(([True], keys[1:] != keys[:-1]))
+    return keys[first], positions[first]
+
+def build_many(amount_digits:int, max_substring_len:int, nums:list[BigNum], workers:int|None=None, verbose:bool=True) -> dict[str,int]:
+    """
+    builds the search tables of many files at once, every file gets split into chunks of BUILD_CHUNK digits which are spread across a pool of workers
+    processes on regular cpython, threads on free threaded builds, partial results of the same table get merged keeping the smallest position and written once with write_table
+    returns the amount of rows written per table
+    """
+    time_start = perf_counter()
+    workers = workers or Sizes.scan_workers or os.cpu_count() or 1
+    free_threaded = not getattr(sys, "_is_gil_enabled", lambda: True)()
+    pool = ThreadPoolExecutor(workers) if free_threaded else ProcessPoolExecutor(workers)
+
+    # one task per chunk, tables of the same constant get merged even if they come from different files
+    tasks = {}
+    digits_total = 0
+    for num in nums:
+        digits = min(amount_digits, num.info.digit_count)
+        digits_total += digits
+        for start in range(0, digits, BUILD_CHUNK):
+            future = pool.submit(_build_chunk, num.path, start, min(start+BUILD_CHUNK, digits), max_substring_len)
+            tasks[future] = num.info.table_name
+    if verbose:
+        print(f"building {len({*tasks.values()})} table(s) from {len(nums)} file(s) in {len(tasks)} chunks on {workers} {'threads' if free_threaded else 'processes'}")
+
+    parts:dict[str,list[tuple[np.ndarray,np.ndarray]]] = {}
+    worker_stats:dict[int,list[float]] = {}
+    digits_done = 0
+    for future in as_completed(tasks):
+        keys, positions, chunk_digits, pid, time_taken = future.result()
+        parts.setdefault(tasks[future], []).append((keys, positions))
+        stats = worker_stats.setdefault(pid, [0, 0.0])
+        stats[0] += chunk_digits
+        stats[1] += time_taken
+        digits_done += chunk_digits
+        if verbose:
+            time_elapsed = perf_counter() - time_start
+            speed = digits_done / time_elapsed
+            print(" "*120+"\r"+f"elapsed:{format_time(time_elapsed)}\t eta:{format_time(max(0, digits_total-digits_done)/speed)}\t digits:{format_size(speed, '/s')}", end="\r")
+    pool.shutdown()
 
-    print("Done!")
+    if verbose:
+        print()
+        for pid, (digits, time_taken) in sorted(worker_stats.items()):
+            print(f"worker {pid}: {format_size(digits)} digits in {format_time(time_taken)} ({format_size(digits/max(time_taken, 1e-9), ' digits/s')})")
+        print("Done creating tables, now merging them")
+
+    rows = {}
+    for table_name, table_parts in parts.items():
+        keys, positions = merge_first_occurrences(table_parts)
+        del table_parts[:]
+        rows[table_name] = write_table(table_name, keys, positions, verbose)
 
+    if verbose:
+        print(f"Done! ({format_time(perf_counter()-time_start)})")
+    return rows
@@ -0,0 +1,182 @@
+# cache.py - long lived sqlite connections for the search cache
+
+import atexit
+import os
+import sqlite3
+import threading
+import weakref
+
+from .var import Paths, Switches
+from .const import SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE, SQLITE_STATEMENT_CACHE, SQLITE_BATCH_SIZE, CACHE_SCHEMA_VERSION
+
+def _migrate(conn:sqlite3.Connection):
+    """
+    brings a db written by an older version up to CACHE_SCHEMA_VERSION, the version is kept in PRAGMA user_version
+    before version 1 positions were stored with the indexing of the time, since the db had to be deleted when switching that is the stored Switches.one_indexed
+    before version 2 .ycd files were searched in the packed words, so their search tables hold byte offsets and get dropped
+    """
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= CACHE_SCHEMA_VERSION:
+        return
+    conn.execute("BEGIN IMMEDIATE") # another process might be migrating the same db right now
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= CACHE_SCHEMA_VERSION:
+        conn.rollback()
+        return
+    for (table,) in conn.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall():
+        columns = [row[1] for row in conn.execute(f"""PRAGMA table_info("{table}")""")]
+        if columns != ["string", "position"]: # only search tables, not identify or catalog
+            continue
+        if version < 2 and table.endswith("_ycd"): # table names are name_base_format
+            conn.execute(f'DROP TABLE "{table}"')
+        elif version < 1 and Switches.stored("one_indexed"):
+            conn.execute(f"""UPDATE "{table}" SET position = position - 1 WHERE position > 0""")
+    conn.execute(f"PRAGMA user_version={CACHE_SCHEMA_VERSION}")
+    conn.commit()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+class _Connection:
+    """ a sqlite connection and what the cache remembers about it, closed when the thread holding it ends and its thread local goes away """
+    def __init__(self, path, generation:int) -> None:
+        self.pid = os.getpid()
+        self.path = path
+        self.generation = generation
+        self.conn = sqlite3.connect(path, cached_statements=SQLITE_STATEMENT_CACHE, check_same_thread=False) # the last reference might be dropped by another thread
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        self.conn.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        _migrate(self.conn)
+        self.tables = {name for (name,) in self.conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+
+    def close(self):
+        if self.pid == os.getpid(): # connections inherited from a fork belong to the parent, dont touch them
+            self.conn.close()
+
+    def __del__(self):
+        if hasattr(self, "conn"): # connecting might have failed
+            self.close()
+
+class _Cache:
+    """
+    owns one sqlite connection per thread and process, so a lookup doesnt have to connect, check sqlite_master and close every time
+    the connection runs in WAL mode, remembers which tables exist and keeps the sql text of each query stable so the prepared statements get reused
+    if Paths.sqlite_path changes, a read fails or close was called (like tests.reset_db does before replacing the file) the connection is reopened on next access
+    positions are stored 0 based (-1 for not in file), the search functions add Switches.one_indexed when returning them, so the indexing can change without touching the db
+    """
+    def __init__(self) -> None:
+        self._local = threading.local()
+        self._open:weakref.WeakSet[_Connection] = weakref.WeakSet() # the connections of all threads, for close
+        self._lock = threading.Lock()
+        self._generation = 0 # bumped by close, so the other threads know their connection is gone
+        atexit.register(self.close)
+
+    @property
+    def _connection(self) -> _Connection:
+        """ the connection of the current thread, opened on first access """
+        connection:_Connection|None = getattr(self._local, "connection", None)
+        path = Paths.sqlite_path
+        if connection is not None:
+            if connection.generation == self._generation and connection.pid == os.getpid() and connection.path == path:
+                return connection
+            connection.close()
+        connection = self._local.connection = _Connection(path, self._generation)
+        with self._lock:
+            self._open.add(connection)
+        return connection
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """ the sqlite connection of the current thread """
+        return self._connection.conn
+
+    @property
+    def tables(self) -> set[str]:
+        """ names of all known tables of the current connection """
+        return self._connection.tables
+
+    def has_table(self, table:str) -> bool:
+        """ checks the remembered tables first and only asks sqlite_master if the table is not known yet (someone else might have made it) """
+        tables = self.tables
+        if table in tables:
+            return True
+        if self.conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone():
+            tables.add(table)
+            return True
+        return False
+
+    def create_table(self, table:str):
+        """ creates a pattern:position table if it doesnt exist """
+        if table in self.tables:
+            return
+        self.conn.execute(f"""CREATE TABLE IF NOT EXISTS "{table}" (string BLOB PRIMARY KEY, position INTEGER)""")
+        self.tables.add(table)
+
+    def lookup(self, table:str, pattern:bytes) -> int|None:
+        """ position of a single pattern, None if not recorded """
+        if not self.has_table(table):
+            return None
+        try:
+            result = self.conn.execute(f"""SELECT position FROM "{table}" WHERE string = ? ORDER BY position ASC LIMIT 1""", (pattern,)).fetchone()
+        except sqlite3.OperationalError: # table got dropped by another connection, or the file is gone
+            self._reconnect()
+            return None
+        return result[0] if result else None
+
+    def lookup_many(self, table:str, patterns:list[bytes]) -> dict[bytes,int|None]:
+        """ positions of many patterns, None for the ones not recorded """
+        positions:dict[bytes,int|None] = {p:None for p in patterns}
+        if not patterns or not self.has_table(table):
+            return positions
+        conn = self.conn
+        for i in range(0, len(patterns), SQLITE_BATCH_SIZE):
+            batch = patterns[i:i+SQLITE_BATCH_SIZE]
+            size = 1 << (len(batch)-1).bit_length() # pad to a power of two so there are only a handful of different statements
+            batch = batch + batch[-1:] * (size - len(batch))
+            query = f"""WITH search_list(pattern) AS (VALUES (?) {', (?)'*(size-1)}) SELECT s.pattern, MIN(t.position) FROM search_list s LEFT JOIN "{table}" t ON s.pattern = t.string GROUP BY s.pattern"""
+            try:
+                positions.update(conn.execute(query, batch).fetchall())
+            except sqlite3.OperationalError:
+                self._reconnect()
+                return {p:None for p in patterns}
+        return positions
+
+    def insert(self, table:str, pairs:list[tuple[bytes,int]]):
+        """ inserts pattern:position pairs, already recorded patterns are left as they are """
+        conn = self.conn
+        self.create_table(table)
+        conn.executemany(f"""INSERT OR IGNORE INTO "{table}" VALUES (?, ?)""", pairs)
+        self.commit()
+
+    def insert_many(self, pairs:dict[str,list[tuple[bytes,int]]]):
+        """ like insert for several tables at once, all in a single transaction """
+        if not pairs:
+            return
+        conn = self.conn
+        for table, table_pairs in pairs.items():
+            self.create_table(table)
+            conn.executemany(f"""INSERT OR IGNORE INTO "{table}" VALUES (?, ?)""", table_pairs)
+        self.commit()
+
+    def commit(self):
+        """ commits the current transaction """
+        connection:_Connection|None = getattr(self._local, "connection", None) # the connection the transaction is on, even if the path changed meanwhile
+        (connection.conn if connection is not None else self.conn).commit()
+
+    def _reconnect(self):
+        """ drops the connection of the current thread after a failed read, the next access connects again and rereads the tables """
+        connection:_Connection|None = self._local.__dict__.pop("connection", None)
+        if connection is not None:
+            connection.close()
+
+    def close(self):
+        """ closes the connections of all threads, only call it while no other thread is using the cache (like before replacing the db file) """
+        with self._lock:
+            self._generation += 1
+            connections = list(self._open)
+            self._open.clear()
+        for connection in connections:
+            connection.close()
+        self._local.__dict__.clear()
+
+Cache = _Cache()
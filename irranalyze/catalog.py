@@ -0,0 +1,143 @@
+# catalog.py - remembers what every number file is, so files only get identified again when they change
+
+import sqlite3
+from pathlib import Path
+from time import time_ns
+from typing import Iterable
+
+from .cache import Cache
+from .identify import BigNumInfo, identify, check_valid
+from .const import CATALOG_TABLE_NAME, CATALOG_SCANS_TABLE_NAME
+
+_COLUMNS = ("name", "base", "format", "int_part", "radix_pos", "digit_count", "file_size", "decimal_digits", "table_name")
+
+class _Catalog:
+    """
+    BigNumInfo of every seen number file in the sqlite db, keyed by the resolved path and only valid as long as size and mtime match
+    files that are not number files get remembered too (with name NULL), so they dont get checked again either
+    the last scan of every directory is kept as well, so find can answer from the db without listing the directory again
+    """
+    def _create(self):
+        if Cache.has_table(CATALOG_SCANS_TABLE_NAME):
+            return
+        conn = Cache.conn
+        conn.execute(f"""CREATE TABLE IF NOT EXISTS {CATALOG_TABLE_NAME} (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, {", ".join(_COLUMNS)})""")
+        conn.execute(f"""CREATE INDEX IF NOT EXISTS {CATALOG_TABLE_NAME}_lookup ON {CATALOG_TABLE_NAME} (name, base, format)""")
+        conn.execute(f"""CREATE TABLE IF NOT EXISTS {CATALOG_SCANS_TABLE_NAME} (root TEXT, recursive INTEGER, entry TEXT, path TEXT, mtime INTEGER, PRIMARY KEY (root, recursive, entry))""")
+        Cache.commit()
+        Cache.tables.update((CATALOG_TABLE_NAME, CATALOG_SCANS_TABLE_NAME))
+
+    def _rows(self, paths:list[str]) -> dict[str,tuple]:
+        """ stored rows of the given paths, in batches since sqlite limits the amount of parameters """
+        rows = {}
+        for i in range(0, len(paths), 512):
+            batch = paths[i:i+512]
+            rows.update((row[0], row) for row in Cache.conn.execute(f"""SELECT path, size, mtime, {", ".join(_COLUMNS)} FROM {CATALOG_TABLE_NAME} WHERE path IN ({", ".join("?"*len(batch))})""", batch))
+        return rows
+
+    def infos(self, paths:Iterable[Path]) -> dict[Path,BigNumInfo|None]:
+        """ BigNumInfo of each path, None for files that are not number files, only new or changed files get identified """
+        self._create()
+        stats = {}
+        for path in paths:
+            try:
+                stats[path] = path.stat()
+            except OSError:
+                continue
+        keys = {path:str(path.resolve()) for path in stats}
+        rows = self._rows(list(keys.values()))
+        infos:dict[Path,BigNumInfo|None] = {}
+        new_rows = []
+        for path, stat in stats.items():
+            row = rows.get(keys[path])
+            if row is not None and row[1:3] == (stat.st_size, stat.st_mtime_ns):
+                infos[path] = None if row[3] is None else BigNumInfo(path, *row[3:])
+                continue
+            info = identify(path) if path.is_file() and check_valid(path) else None
+            infos[path] = info
+            values = (None,)*len(_COLUMNS) if info is None else (info.name, info.base, info.format, info.int_part, info.radix_pos, info.digit_count, info.file_size, info.decimal_digits, info.table_name)
+            new_rows.append((keys[path], stat.st_size, stat.st_mtime_ns, *values))
+        if new_rows:
+            conn = Cache.conn
+            conn.executemany(f"""INSERT OR REPLACE INTO {CATALOG_TABLE_NAME} VALUES ({", ".join("?"*(3+len(_COLUMNS)))})""", new_rows)
+            Cache.commit()
+        return infos
+
+    def info(self, path:Path) -> BigNumInfo|None:
+        """ BigNumInfo of a single file, None if its not a number file """
+        return self.infos([path]).get(path)
+
+    def scan(self, num_dir:Path, recursive:bool=True) -> list[BigNumInfo]:
+        """
+        BigNumInfo of every number file inside num_dir, forgets files that are gone
+        what the scan saw goes into the scans table for find: every file (entry relative to num_dir, path as in the catalog) and every directory with its mtime
+        """
+        def mtime(directory:Path) -> int:
+            mtime = directory.stat().st_mtime_ns # taken before listing, so a file added meanwhile changes it afterwards
+            return -1 if mtime > scan_time - 10**9 else mtime # the clock of file times is coarse, a change right after could keep the mtime, so recent ones never count as unchanged
+        scan_time = time_ns()
+        entries = [(".", None, mtime(num_dir))]
+        files = []
+        for p in (num_dir.rglob("*") if recursive else num_dir.iterdir()):
+            if p.is_dir() and recursive:
+                entries.append((str(p.relative_to(num_dir)), None, mtime(p)))
+            elif p.is_file():
+                files.append(p)
+        infos = self.infos(files)
+        entries += [(str(p.relative_to(num_dir)), str(p.resolve()), None) for p in infos]
+        self._forget_missing(num_dir)
+        root = str(num_dir.resolve())
+        conn = Cache.conn
+        conn.execute(f"""DELETE FROM {CATALOG_SCANS_TABLE_NAME} WHERE root = ? AND recursive = ?""", (root, recursive))
+        conn.executemany(f"""INSERT INTO {CATALOG_SCANS_TABLE_NAME} VALUES (?, ?, ?, ?, ?)""", [(root, recursive, *entry) for entry in entries])
+        Cache.commit()
+        return [info for info in infos.values() if info is not None]
+
+    def _scanned(self, num_dir:Path, recursive:bool) -> bool:
+        """ wether num_dir was scanned before and no file got added, removed or renamed since, those change the mtime of the directory they are in """
+        directories = Cache.conn.execute(f"""SELECT entry, mtime FROM {CATALOG_SCANS_TABLE_NAME} WHERE root = ? AND recursive = ? AND path IS NULL""", (str(num_dir.resolve()), recursive)).fetchall()
+        if not directories:
+            return False
+        for entry, mtime in directories:
+            try:
+                if (num_dir / entry).stat().st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def _forget_missing(self, num_dir:Path):
+        prefix = str(num_dir.resolve()).rstrip("/") + "/"
+        conn = Cache.conn
+        gone = [(path,) for (path,) in conn.execute(f"""SELECT path FROM {CATALOG_TABLE_NAME} WHERE substr(path, 1, ?) = ?""", (len(prefix), prefix)) if not Path(path).exists()]
+        if gone:
+            conn.executemany(f"""DELETE FROM {CATALOG_TABLE_NAME} WHERE path = ?""", gone)
+            Cache.commit()
+
+    def find(self, num_dir:Path, name:str|None=None, base:int|None=None, format:str|None=None, size:int|None=None, recursive:bool=True, rescan:bool=False) -> list[BigNumInfo]:
+        """
+        BigNumInfo of the number files in num_dir with the given attributes, straight from the catalog and the files its last scan saw
+        num_dir only gets scanned again with rescan, or if a file got added, removed or renamed in one of its directories since, files rewritten in place need rescan
+        """
+        self._create()
+        if rescan or not self._scanned(num_dir, recursive):
+            self.scan(num_dir, recursive)
+        query = f"""SELECT s.entry, {", ".join("c."+column for column in _COLUMNS)} FROM {CATALOG_SCANS_TABLE_NAME} s JOIN {CATALOG_TABLE_NAME} c ON c.path = s.path WHERE s.root = ? AND s.recursive = ? AND c.name IS NOT NULL"""
+        params:list = [str(num_dir.resolve()), recursive]
+        for column, value in (("name", name), ("base", base), ("format", format), ("file_size", size)):
+            if value:
+                query += f" AND c.{column} = ?"
+                params.append(value)
+        query += " ORDER BY s.entry"
+        return [BigNumInfo(num_dir / row[0], *row[1:]) for row in Cache.conn.execute(query, params)]
+
+    def clear(self, conn:sqlite3.Connection|None = None):
+        """ forgets every file, for example after the identifier table changed, with conn that happens inside its transaction and the caller commits """
+        commit = conn is None
+        conn = conn or Cache.conn
+        for (table,) in conn.execute("""SELECT name FROM sqlite_master WHERE type='table' AND name IN (?, ?)""", (CATALOG_TABLE_NAME, CATALOG_SCANS_TABLE_NAME)).fetchall():
+            conn.execute(f"DELETE FROM {table}")
+        if commit:
+            Cache.commit()
+
+Catalog = _Catalog()
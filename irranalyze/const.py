@@ -6,6 +6,8 @@ from pathlib import Path
 SETTINGS_PATH = Path("settings.json")
 PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
 IDENTIFY_TABLE_NAME = "identify"
+IDENTIFY_EXPRESSIONS_TABLE_NAME = "identify_expressions" # every evaluated expression of the identifier with its hash, so rebuilds only evaluate new ones
+IDENTIFY_DPS = 120 # decimal digits the identifier expressions get evaluated with
 PAIRS_PER_INSERT = 100000
 CONST_TABLE = {
     "1.41421":"sqrt(2)",
@@ -18,3 +20,35 @@ CONST_TABLE = {
     "0.91596":"catalan",
     "0.57721":"euler mascheroni",
 }
+SQLITE_MMAP_SIZE = 2**30 # bytes of the database file sqlite may memory map
+SQLITE_CACHE_SIZE = -2**16 # negative means KiB, so 64MiB page cache per connection
+SQLITE_STATEMENT_CACHE = 512 # amount of prepared statements kept per connection
+SQLITE_BATCH_SIZE = 512 # max amount of patterns per multi lookup query
+SCAN_WINDOW = 2**26 # bytes scanned at once when streaming all occurrences of a pattern
+POSITIONS_CHUNK = 2**20 # max amount of positions per yielded array
+MIN_SHARD_SIZE = 2**24 # ranges smaller than this are not worth splitting across threads
+HS_CACHE_SIZE = 32 # amount of compiled hyperscan databases kept in memory
+HS_STORE_MIN_TIME = 0.01 # seconds a hyperscan compile has to take to be worth serializing to disk
+HS_DISK_CACHE_SIZE = 256 # amount of serialized hyperscan databases kept on disk, the least recently used ones get deleted
+YCD_CODEC_BLOCK = 2**20 # ycd words de/encoded at once, 19MiB of decimal digits
+YCD_ACCESS_BLOCK = 2**12 # ycd words decoded at once when subscripting, 77824 decimal digits
+YCD_CACHE_BLOCKS = 16 # decoded blocks every ycd BigNum keeps around
+KMER_LENGTH = {10:8, 16:6} # longest digit strings a kmer table holds per base, 10**8 and 16**6 entries
+KMER_CHUNK = 2**24 # digits processed at once while building a kmer table
+KMER_NOT_FOUND = 2**32-1 # kmer table entry of strings that dont occur in the covered digits
+INDEX_RMQ_BLOCK = 2**10 # suffixes per block of the range minimum table of a suffix index, a lookup scans at most two partial blocks
+BULK_DENSE_LIMIT = 2**24 # substring lengths with up to this many possible strings get deduplicated with a dense array instead of a sort
+BUILD_CHUNK = 2**23 # digits per task when building search tables in parallel
+CATALOG_TABLE_NAME = "catalog" # table of the file catalog, next to the identify table
+CATALOG_SCANS_TABLE_NAME = "catalog_scans" # mtimes of the scanned directories, find only scans again when one changed
+QUERY_TYPES = ("literal", "wildcard", "regex") # what search patterns can be, each type gets its own cache table
+REGEX_MAX_MATCH = 2**12 # overlap of shards / windows for regex queries, longer matches might be missed at those borders
+STREAK_CHUNK = 2**24 # digits read at once when looking for streaks and streets
+RUNS_TABLE_NAME = "runs" # table of the streak and street records of every constant
+STATS_BLOCK = 10**7 # digits per stored histogram block
+STATS_MAX_N = 4 # longest n-grams that get counted, 16**4 entries per histogram
+STATS_TABLE_NAME = "stats" # table of the stored histogram blocks of every constant
+CACHE_SCHEMA_VERSION = 2 # PRAGMA user_version of the sqlite db, 1 means positions are stored 0 based no matter the indexing, 2 that .ycd tables hold digit positions
+CONVERT_SEGMENT = 2**18 # digits parsed / printed at once by the segmented base conversion, no string gets bigger than this
+CONVERT_GUARD = 20 # extra input digits a base conversion reads so the last output digits dont suffer from the cut
+YCD_FIRST_DIGITS = 50 # digits after the radix point in the FirstDigits line of a ycd header
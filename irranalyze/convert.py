@@ -1,12 +1,18 @@
 # converst.py - housing various conversion methods
 
+import os
 import string
+from concurrent.futures import ThreadPoolExecutor
 from itertools import product
-from typing import Generator, overload
+from typing import Callable, Generator, overload
 from functools import lru_cache
 
 import mpmath
 import gmpy2
+import numpy as np
+
+from .var import Sizes
+from .const import YCD_CODEC_BLOCK, CONVERT_SEGMENT
 
 @overload
 def txt_to_num(txt:str) -> str: ...
@@ -31,6 +37,8 @@ def txt_to_num(txt:str|bytes) -> str|bytes:
     else:
         return "".join(f"{c-97:02d}" for c in map(ord,txt))
 
+_LETTER_NUMS = {c:[f"{(ord(c)-97)+n*26:02d}" for n in range(4) if (ord(c)-97)+n*26<=99] for c in string.ascii_lowercase} # every two digit number that means c
+
 @overload
 def txt_to_num_all(txt:str) -> Generator[str]: ...
 @overload
@@ -47,8 +55,7 @@ def txt_to_num_all(txt:str|bytes) -> Generator[str|bytes]:
     if isinstance(txt,bytes):
         txt = txt.decode()
         isbytes = True
-    table = {c:[f"{(ord(c)-97)+n*26:02d}" for n in range(4) if (ord(c)-97)+n*26<=99] for c in string.ascii_lowercase}
-    chars = product(*[table[c] for c in txt.lower()])
+    chars = product(*[_LETTER_NUMS[c] for c in txt.lower()])
     if isbytes:
         for nums in chars:
             yield "".join(nums).encode()
@@ -56,6 +63,18 @@ def txt_to_num_all(txt:str|bytes) -> Generator[str|bytes]:
         for nums in chars:
             yield "".join(nums)
 
+def txt_to_num_regex(txt:str|bytes) -> bytes:
+    """
+    a single expression that matches every conversion txt_to_num_all would yield, a group of alternatives per character
+    txt_to_num_regex("az") -> b"(00|26|52|78)(25|51|77)"
+    every match is 2*len(txt) digits long
+    """
+    if isinstance(txt,bytes):
+        txt = txt.decode()
+    if not (txt.isalpha() and txt.isascii()):
+        raise ValueError("input must be alphabetic")
+    return "".join(f"({'|'.join(_LETTER_NUMS[c])})" for c in txt.lower()).encode()
+
 @overload
 def num_to_txt(num:int) -> str: ...
 @overload
@@ -112,17 +131,77 @@ def ycd_to_str_gen(mv:memoryview, base:int) -> Generator[str]:
     else:
         raise ValueError(f"Base can only be 10 or 16, not {base}")
 
+_DEC5 = np.zeros((10**5, 8), dtype=np.uint8) # ascii of 00000 to 99999, padded to 8 bytes so a lookup is a single uint64 gather
+_DEC5[:, :5] = np.arange(10**5)[:,None] // 10**np.arange(4,-1,-1) % 10 + 48
+_DEC5 = _DEC5.view("<u8").reshape(-1)
+_HEX2 = np.frombuffer(b"".join(f"{i:02x}".encode() for i in range(256)), dtype="<u2") # ascii of 00 to ff, one uint16 each
+_DIGIT_VALUE = np.full(256, 255, dtype=np.uint8) # ascii -> digit value, 255 for anything thats not a digit
+_DIGIT_VALUE[np.frombuffer(b"0123456789abcdef", dtype=np.uint8)] = np.arange(16)
+_DIGIT_VALUE[np.frombuffer(b"ABCDEF", dtype=np.uint8)] = np.arange(10,16)
+_POW10 = 10 ** np.arange(9, -1, -1, dtype=np.uint64) # place values of a 10 digit group
+
+def ycd_words_to_digits(words:np.ndarray, base:int) -> np.ndarray:
+    """ vectorized ycd decoding, turns an array of uint64 words into a flat uint8 array of ascii digits, 19 per word for base 10 and 16 for base 16 """
+    if base == 10:
+        hi, lo = np.divmod(words, np.uint64(10**10)) # 9 and 10 digits, small enough to be split into 5 digit parts
+        parts = np.empty((len(words), 4), dtype=np.uint64)
+        np.divmod(hi, np.uint64(10**5), out=(parts[:, 0], parts[:, 1]))
+        np.divmod(lo, np.uint64(10**5), out=(parts[:, 2], parts[:, 3]))
+        out = _DEC5[parts].view(np.uint8).reshape(len(words), 4, 8)[:, :, :5].reshape(len(words), 20)[:, 1:] # the first part only has 4 digits
+    elif base == 16:
+        out = _HEX2[words.astype(">u8").view(np.uint8)].view(np.uint8) # big endian bytes, each one is two hex digits
+    else:
+        raise ValueError(f"Base can only be 10 or 16, not {base}")
+    return out.reshape(-1)
+
+def digits_to_ycd_words(digits:np.ndarray, base:int) -> np.ndarray:
+    """ vectorized ycd encoding, inverse of ycd_words_to_digits, a partial last word gets padded with zeros on the right like y-cruncher does at the end of a file """
+    if base not in (10,16):
+        raise ValueError(f"Base can only be 10 or 16, not {base}")
+    digits_per_word = 19 if base == 10 else 16
+    values = _DIGIT_VALUE[digits]
+    if len(values) % digits_per_word:
+        values = np.concatenate((values, np.zeros(digits_per_word - len(values) % digits_per_word, dtype=np.uint8)))
+    if values.size and values.max() >= base:
+        raise ValueError(f"found a character thats not a base {base} digit")
+    if base == 10:
+        values = values.reshape(-1, 19).astype(np.uint64)
+        words = values[:, :9] @ _POW10[1:] * np.uint64(10**10) + values[:, 9:] @ _POW10 # 19 digits fit a uint64, 10**19 doesnt overflow
+    else:
+        values = values.reshape(-1, 2)
+        words = (values[:, 0] << 4 | values[:, 1]).view(">u8").astype("<u8") # two hex digits per byte, big endian inside the word
+    return words
+
+def ycd_to_digits_gen(mv:memoryview|bytes, base:int, block_words:int=YCD_CODEC_BLOCK) -> Generator[np.ndarray]:
+    """ vectorized ycd_to_str_gen, decodes block_words words at once into uint8 ascii arrays, trailing bytes that dont make up a full word are ignored """
+    amount_words = len(mv) // 8
+    for i in range(0, amount_words, block_words):
+        words = np.frombuffer(mv, dtype="<u8", count=min(block_words, amount_words-i), offset=i*8)
+        digits = ycd_words_to_digits(words, base)
+        del words # frombuffer holds an export of mv, the caller might want to release it
+        yield digits
+
+def digits_to_ycd_gen(digits:memoryview|bytes, base:int, block_words:int=YCD_CODEC_BLOCK) -> Generator[bytes]:
+    """ vectorized str_to_ycd_gen, encodes block_words words at once, a partial last word gets padded with zeros """
+    digits_per_word = 19 if base == 10 else 16
+    block_digits = block_words * digits_per_word
+    for i in range(0, len(digits), block_digits):
+        chunk = np.frombuffer(digits, dtype=np.uint8, count=min(block_digits, len(digits)-i), offset=i)
+        words = digits_to_ycd_words(chunk, base)
+        del chunk
+        yield words.tobytes()
+
 def ycd_to_str(in_bytes:bytes|memoryview, base:int, amount_digits:int=-1) -> str:
-    """ wrapper for ycd_to_str_gen that can also take bytes and only returns as many digits as needed """
+    """ decodes ycd data (int + radix part cut off) to a digit string, can also take bytes and only decodes as many words as needed """
     if base not in (10,16):
         raise ValueError(f"Base can only be 10 or 16, not {base}")
     digits_per_8byte = 19 if base == 10 else 16
     if amount_digits == -1:
         bytes_needed = len(in_bytes)
     else:
-        bytes_needed = int(mpmath.ceil(amount_digits / digits_per_8byte)) * 8 + 8
+        bytes_needed = -(-amount_digits // digits_per_8byte) * 8
     mv = memoryview(in_bytes)[:bytes_needed]
-    out_string = "".join(ycd_to_str_gen(mv,base))
+    out_string = b"".join(d.tobytes() for d in ycd_to_digits_gen(mv,base)).decode()
     mv.release()
     if amount_digits>0:
         return out_string[:amount_digits]
@@ -137,11 +216,11 @@ def str_to_ycd_gen(mv:memoryview, base:int) -> Generator[bytes]:
         yield int(mv[i:i+chunksize].tobytes(), base).to_bytes(8, "little")
 
 def str_to_ycd(in_string:str|memoryview, amount_digits:int=-1) -> bytes:
-    """ wrapper for str_to_ycd_gen that can also take a string and only returns as many digits as needed """
+    """ encodes a digit string to ycd data, can also take a memoryview and only encodes as many digits as needed """
     chunk = in_string[:300]
     if isinstance(chunk,memoryview):
         try:
-            chunk.tobytes().decode()
+            chunk = chunk.tobytes().decode()
         except UnicodeDecodeError:
             #print("str_to_ycd was given a memoryview, but that memoryview contained non utf8 bytes. str_to_ycd must always be decodeable")
             raise
@@ -161,7 +240,7 @@ def str_to_ycd(in_string:str|memoryview, amount_digits:int=-1) -> bytes:
         mv = memoryview(in_string.encode())
     else:
         mv = in_string
-    out_bytes = b"".join(str_to_ycd_gen(mv[:bytes_needed], base))
+    out_bytes = b"".join(digits_to_ycd_gen(mv[:bytes_needed], base))
     mv.release()
     if amount_digits>0:
         return out_bytes[:amount_digits]
@@ -391,3 +470,92 @@ def make_extractor(base:int, notation:str|tuple[bytes]):
 
     return extract
 
+
+def _powers(base:int):
+    """ cached base**k as mpz """
+    @lru_cache(maxsize=None)
+    def power(k:int):
+        return gmpy2.mpz(base) ** k # type:ignore mpz not a known attribute, no biggie
+    return power
+
+def _release_gil(func):
+    """ runs func with a gmpy2 context that lets other threads run during big mpz operations, the context is per thread """
+    def wrapped(*args):
+        with gmpy2.context(allow_release_gil=True):
+            return func(*args)
+    return wrapped
+
+def digits_to_mpz(read:Callable[[int,int],bytes], amount_digits:int, base:int, segment:int = CONVERT_SEGMENT, pool:ThreadPoolExecutor|None = None):
+    """
+    the integer of the amount_digits digits that read(start, stop) returns piece by piece
+    segments get parsed on their own and then combined pairwise (product tree), so no string is bigger than a segment
+    """
+    power = _powers(base)
+    mapper = pool.map if pool else map
+    bounds = [(start, min(start+segment, amount_digits)) for start in range(0, amount_digits, segment)]
+    parts = list(mapper(_release_gil(lambda b: (gmpy2.mpz(read(*b), base), b[1]-b[0])), bounds)) # type:ignore mpz not a known attribute, no biggie
+    combine = _release_gil(lambda pair: (pair[0][0] * power(pair[1][1]) + pair[1][0], pair[0][1] + pair[1][1]))
+    while len(parts) > 1:
+        odd = parts[-1:] if len(parts) % 2 else []
+        parts = list(mapper(combine, zip(parts[::2], parts[1::2]))) + odd
+    return parts[0][0] if parts else gmpy2.mpz(0) # type:ignore mpz not a known attribute, no biggie
+
+def mpz_to_digits_gen(n, amount_digits:int, base_output:int|str|bytes, segment:int = CONVERT_SEGMENT, pool:ThreadPoolExecutor|None = None, workers:int = 1) -> Generator[str]:
+    """
+    the amount_digits digits of n (zero padded in front) in base_output, one segment after the other starting at the most significant one
+    n gets split by powers of the base depth first, the lower part waits on a stack while the upper part gets printed
+    once a part is at most 2*workers segments it gets split into segments and printed on the pool (which should have workers threads) and then dropped
+    besides the part being split only the waiting lower parts (at most one per level, each half the size of the one before) and the cached powers of the base stay alive,
+    so memory peaks at about 3 times the binary size of n during the first split and only goes down from there
+    """
+    base_notation, trans_table = resolve_notation(base_output)
+    base = len(base_notation)
+    power = _powers(base)
+    if base <= 62:
+        to_str = lambda value, width: value.digits(base).rjust(width, "0").translate(trans_table)
+    else:
+        to_str = make_extractor(base, base_notation)
+    mapper = pool.map if pool else map
+    chunk = segment * 2 * workers if pool else segment # digits printed at once
+
+    def split(piece):
+        value, width = piece
+        if width <= segment:
+            return [piece]
+        low = -(-width // segment) // 2 * segment # the lower half stays a multiple of segment
+        high, rest = divmod(value, power(low))
+        return [(high, width - low), (rest, low)]
+
+    stack = [(n, amount_digits)] if amount_digits > 0 else []
+    del n # only the stack holds on to the number, so the parts that got printed can be freed
+    split = _release_gil(split)
+    while stack:
+        pieces = [stack.pop()]
+        if pieces[0][1] > chunk:
+            stack += reversed(split(pieces.pop())) # upper part on top
+            continue
+        while any(width > segment for _, width in pieces):
+            pieces = [part for parts in mapper(split, pieces) for part in parts]
+        yield from mapper(_release_gil(lambda piece: to_str(*piece)), pieces) # type:ignore
+        del pieces
+
+def frac_convert_gen(read:Callable[[int,int],bytes], amount_digits:int, base_input:int, base_output:int|str|bytes, amount_output:int, segment:int = CONVERT_SEGMENT, workers:int|None = None) -> Generator[str]:
+    """
+    first amount_output digits (truncated) of the fraction 0.xxx in base_output, where xxx are the amount_digits digits in base_input that read(start, stop) returns
+    yields the output in segments from the front, parsing and printing run on a pool of workers threads (defaults to Sizes.scan_workers or the cpu count)
+    memory peaks at about 3 times the binary size of the bigger of input and output: while the input gets combined a level of the product tree and the next one exist at once,
+    the division needs the scaled numerator and the power of base_input, and printing starts with the result, the power of base_output it gets split by and both parts (see mpz_to_digits_gen)
+    """
+    workers = workers or Sizes.scan_workers or os.cpu_count() or 1
+    base_output_int = len(resolve_notation(base_output)[0])
+
+    @_release_gil
+    def fraction(pool:ThreadPoolExecutor):
+        """ floor(numerator * base_output**amount_output / base_input**amount_digits) """
+        scaled = digits_to_mpz(read, amount_digits, base_input, segment, pool) * _powers(base_output_int)(amount_output)
+        if base_input & (base_input - 1) == 0: # the denominator is a power of 2, dividing is a shift
+            return scaled >> (amount_digits * (base_input.bit_length() - 1))
+        return scaled // _powers(base_input)(amount_digits)
+
+    with ThreadPoolExecutor(workers) as pool:
+        yield from mpz_to_digits_gen(fraction(pool), amount_output, base_output, segment, pool, workers)
@@ -0,0 +1,93 @@
+# fileconvert.py - whole number files from txt to ycd and back, read in aligned blocks that get de/encoded by a pool of threads and written in order
+
+from __future__ import annotations
+
+import os
+from collections import deque
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterator
+
+from .var import Sizes
+from .identify import BLOCK_NAME
+from .convert import digits_to_ycd_words
+from .const import YCD_CODEC_BLOCK, YCD_FIRST_DIGITS
+
+if TYPE_CHECKING:
+    from .bignum import BigNum
+
+def _in_order(func:Callable[[int,int],bytes], bounds:list[tuple[int,int]], workers:int) -> Iterator[bytes]:
+    """ func of every bound in order, at most 2*workers blocks are in flight so nothing piles up while the output gets written """
+    with ThreadPoolExecutor(workers) as pool:
+        pending = deque()
+        for bound in bounds:
+            pending.append(pool.submit(func, *bound))
+            if len(pending) >= 2*workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def _write(path:Path, pieces:Iterator[bytes]) -> int:
+    """ writes the pieces to a tmp file that replaces path once its complete, returns the amount of bytes written """
+    tmp = path.with_name(path.name + ".tmp")
+    written = 0
+    with tmp.open("wb") as f:
+        for piece in pieces:
+            written += f.write(piece)
+    tmp.replace(path) # readers never see a half written file
+    return written
+
+def _int_str(bignum:BigNum) -> str:
+    return format(bignum.info.int_part, "x" if bignum.info.base == 16 else "d")
+
+def ycd_header(base:int, first_digits:str, total_digits:int, block_digits:int, block_id:int) -> bytes:
+    """ header of a y-cruncher ycd file up to and including the byte before the first word, first_digits is like 3.1415... """
+    return (
+        f"#Compressed Digit File\r\n\r\nFileVersion:\t1.1.0\r\n\r\nBase:\t{base}\r\n\r\nFirstDigits:\t{first_digits}\r\n\r\n"
+        f"TotalDigits:\t{total_digits}\r\n\r\nBlocksize:\t{block_digits}\r\nBlockID:\t{block_id}\r\n\r\nEndHeader\r\n\r\n"
+    ).encode() + b"\x00"
+
+def to_ycd(bignum:BigNum, path:str|Path, block_digits:int|None = None, amount_digits:int|None = None, workers:int|None = None) -> list[Path]:
+    """
+    writes the first amount_digits digits (all by default) of any number file as y-cruncher ycd file(s), returns the paths
+    with block_digits the digits get split into files of that many digits like y-cruncher does, path then has to be named like block 0 ("pi - 0.ycd")
+    every block is encoded YCD_CODEC_BLOCK words at a time on a pool of threads
+    """
+    if bignum.info.base not in (10, 16):
+        raise ValueError(f"Base can only be 10 or 16, not {bignum.info.base}")
+    path = Path(path)
+    base = bignum.info.base
+    digits_per_word = 19 if base == 10 else 16
+    total = min(amount_digits or bignum.info.digit_count, bignum.info.digit_count)
+    block_digits = block_digits or total
+    block_count = max(1, -(-total // block_digits))
+    match = BLOCK_NAME.match(path.name)
+    if block_count > 1 and (not match or match[2] != "0"):
+        raise ValueError(f"{path.name} has to be named like the first block, like 'pi - 0.ycd'")
+    workers = workers or Sizes.scan_workers or os.cpu_count() or 1
+    first_digits = f"{_int_str(bignum)}.{bignum.read_digits(min(YCD_FIRST_DIGITS, total)).tobytes().decode()}"
+    encode = lambda start, stop: digits_to_ycd_words(bignum.read_digits(stop - start, start), base).tobytes()
+
+    paths = []
+    for block_id in range(block_count):
+        block_path = path if block_count == 1 else path.with_name(f"{match[1]} - {block_id}.ycd") # type:ignore match is set for more than one block
+        block_start, block_stop = block_id * block_digits, min((block_id+1) * block_digits, total)
+        chunk = YCD_CODEC_BLOCK * digits_per_word # aligned to words, so only the last chunk of a block gets padded
+        bounds = [(start, min(start + chunk, block_stop)) for start in range(block_start, block_stop, chunk)]
+        header = ycd_header(base, first_digits, total, block_digits, block_id)
+        _write(block_path, chain((header,), _in_order(encode, bounds, workers)))
+        paths.append(block_path)
+    return paths
+
+def to_txt(bignum:BigNum, path:str|Path, amount_digits:int|None = None, workers:int|None = None) -> Path:
+    """ writes the first amount_digits digits (all by default) of any number file as y-cruncher txt file, ycd words are decoded YCD_CODEC_BLOCK at a time on a pool of threads """
+    path = Path(path)
+    total = min(amount_digits or bignum.info.digit_count, bignum.info.digit_count)
+    workers = workers or Sizes.scan_workers or os.cpu_count() or 1
+    chunk = YCD_CODEC_BLOCK * (19 if bignum.info.base == 10 else 16)
+    bounds = [(start, min(start + chunk, total)) for start in range(0, total, chunk)]
+    decode = lambda start, stop: bignum.read_digits(stop - start, start).tobytes()
+    head = f"{_int_str(bignum)}.".encode()
+    _write(path, chain((head,), _in_order(decode, bounds, workers)))
+    return path
@@ -0,0 +1,111 @@
+# hscache.py - cache for compiled hyperscan databases and their scratch space
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from hashlib import sha256
+from threading import Lock
+from time import perf_counter
+from typing import Generator
+
+import hyperscan
+
+from .var import Paths
+from .const import HS_CACHE_SIZE, HS_STORE_MIN_TIME, HS_DISK_CACHE_SIZE
+
+class _Entry:
+    """ a compiled database together with the scratch spaces that are currently not in use """
+    def __init__(self, db:hyperscan.Database) -> None:
+        self.db = db
+        self.scratches = [hyperscan.Scratch(db)]
+
+_entries:OrderedDict[str,_Entry] = OrderedDict()
+_lock = Lock()
+
+def _key(expressions:list[bytes], flags:int|list[int], mode:int, literal:bool) -> str:
+    """ hash of everything that goes into a compile, used as lru key and as file name """
+    h = sha256(f"{mode}|{int(literal)}|{flags}|{len(expressions)}|".encode())
+    for e in expressions:
+        h.update(len(e).to_bytes(8, "little"))
+        h.update(e)
+    return h.hexdigest()
+
+def _load(path, mode:int) -> hyperscan.Database|None:
+    """ deserializes a database from disk, None if missing or made by a different hyperscan version / cpu, a hit counts as use for _prune """
+    try:
+        db = hyperscan.loadb(path.read_bytes(), mode)
+        path.touch()
+        return db
+    except (OSError, hyperscan.error):
+        return None
+
+def _store(path, db:hyperscan.Database):
+    """ serializes a database to disk, written to a temporary file first so a half written file never gets loaded """
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(hyperscan.dumpb(db))
+        tmp.replace(path)
+    except OSError as e:
+        print(f"WARN: could not store hyperscan database {path}: {e}")
+    _prune(path.parent)
+
+def _prune(directory):
+    """ deletes the least recently used databases on disk until there are HS_DISK_CACHE_SIZE left, like the lru in memory """
+    files = []
+    for file in directory.glob("*.hsdb"):
+        try:
+            files.append((file.stat().st_mtime_ns, file))
+        except OSError: # pruned by someone else meanwhile
+            continue
+    files.sort()
+    for _, file in files[:max(0, len(files) - HS_DISK_CACHE_SIZE)]:
+        file.unlink(missing_ok=True)
+
+def get_database(expressions:list[bytes], flags:int|list[int], mode:int, literal:bool=False) -> hyperscan.Database:
+    """
+    compiled hyperscan database for the given expressions, flags and mode
+    looks in memory first (lru of HS_CACHE_SIZE databases), then in Paths.hs_cache_dir and only compiles if both miss
+    databases that took longer than HS_STORE_MIN_TIME to compile get written to Paths.hs_cache_dir, which keeps the HS_DISK_CACHE_SIZE most recently used
+    """
+    key = _key(expressions, flags, mode, literal)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            _entries.move_to_end(key)
+            return entry.db
+
+    path = Paths.hs_cache_dir / f"{key}.hsdb"
+    db = _load(path, mode)
+    if db is None:
+        time_start = perf_counter()
+        db = hyperscan.Database(mode=mode)
+        db.compile(expressions=expressions, ids=list(range(len(expressions))), elements=len(expressions), flags=flags, literal=literal)
+        if perf_counter() - time_start > HS_STORE_MIN_TIME: # tiny databases compile faster than they load
+            _store(path, db)
+
+    with _lock:
+        entry = _entries.setdefault(key, _Entry(db)) # another thread might have been quicker
+        _entries.move_to_end(key)
+        while len(_entries) > HS_CACHE_SIZE:
+            _entries.popitem(last=False)
+    return entry.db
+
+@contextmanager
+def scratch(db:hyperscan.Database) -> Generator[hyperscan.Scratch]:
+    """ borrows a scratch space for db, every thread scanning at the same time needs its own, afterwards it goes back to be reused """
+    with _lock:
+        entry = next((e for e in _entries.values() if e.db is db), None) # None if evicted or never cached, still works just without reuse
+        s = entry.scratches.pop() if entry is not None and entry.scratches else None
+    if s is None:
+        s = hyperscan.Scratch(db)
+    try:
+        yield s
+    finally:
+        if entry is not None:
+            with _lock:
+                entry.scratches.append(s)
+
+def clear():
+    """ drops all databases held in memory, the ones on disk stay """
+    with _lock:
+        _entries.clear()
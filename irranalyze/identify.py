@@ -1,6 +1,6 @@
 # identify.py - used for identifying number files
 
-import sqlite3
+import re
 from pathlib import Path
 from hashlib import md5
 from dataclasses import dataclass
@@ -8,7 +8,8 @@ from math import log
 
 from .const import CONST_TABLE, IDENTIFY_TABLE_NAME
 from .var import Paths
-from .convert import hex_to_dec, ycd_to_str_gen
+from .cache import Cache
+from .convert import hex_to_dec, ycd_to_str
 
 @dataclass
 class BigNumInfo:
@@ -62,12 +63,17 @@ def identify(file_path:Path) -> BigNumInfo:
         base = int(chunk.split(b"Base:\t")[1].split(b"\r\n\r\n")[0].decode())
         first_digits = chunk.split(b"FirstDigits:\t")[1].split(b"\r\n\r\n")[0]
         int_part = int(first_digits.split(b".")[0],base)
-        frac_part = "".join(ycd_to_str_gen(memoryview(chunk)[radix_pos+1:], base))
+        frac_part = ycd_to_str(chunk[radix_pos+1:], base)
         num = f"{int_part}.{frac_part}"
         decimal_digits = int(chunk.split(b"Blocksize:\t")[1].split(b"\r\n")[0])
 
     digit_count = file_size - radix_pos - 1
-    
+    if format == "ycd": # every 8 bytes hold 19 decimal or 16 hex digits, the block might end earlier than the last word
+        digit_count = min(digit_count // 8 * (19 if base == 10 else 16), decimal_digits)
+        total_digits = int(chunk.split(b"TotalDigits:\t")[1].split(b"\r\n")[0]) if b"TotalDigits:\t" in chunk else 0
+        if total_digits: # 0 means unknown, otherwise the last block of a computation ends there
+            digit_count = max(0, min(digit_count, total_digits - (ycd_block_id(file_path) or 0) * decimal_digits))
+
     # y-cruncher only outputs hex and dec
     if base!=10 and base!=16:
         raise ValueError("illegal base")
@@ -75,24 +81,14 @@ def identify(file_path:Path) -> BigNumInfo:
     if base == 16:
         decimal_digits = int(log(16,10) * decimal_digits)
         num = hex_to_dec(num)
-    # check if db exists
-    if Paths.sqlite_path.exists():
-        conn = sqlite3.connect(Paths.sqlite_path)
-        cursor = conn.cursor()
-        table_exists = bool(cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name=?;", (IDENTIFY_TABLE_NAME, )).fetchone())
-        # check if identify table exists 
-        if table_exists:
-            blob = md5(num[:100].encode()).digest()
-            cursor.execute(f"SELECT name FROM {IDENTIFY_TABLE_NAME} WHERE hash = ?", (blob,))
-            name = cursor.fetchone()
-            if name:
-                name = str(name[0])
-            else:
-                name = "unknown"
+    # check if db exists and if identify table exists
+    if Paths.sqlite_path.exists() and Cache.has_table(IDENTIFY_TABLE_NAME):
+        blob = md5(num[:100].encode()).digest()
+        name = Cache.conn.execute(f"SELECT name FROM {IDENTIFY_TABLE_NAME} WHERE hash = ?", (blob,)).fetchone()
+        if name:
+            name = str(name[0])
         else:
-            print("WARN: identify table not created yet, using fallback")
-            name = CONST_TABLE.get(num[:7],"unknown")
-        conn.close()
+            name = "unknown"
     else:
         print("WARN: identify table not created yet, using fallback")
         name = CONST_TABLE.get(num[:7],"unknown")
@@ -108,6 +104,26 @@ def get_table_name(file_path:Path) -> str|None:
         return
     return "_".join(map(str, (info.name,info.base,info.format)))
 
+BLOCK_NAME = re.compile(r"^(.*) - (\d+)\.ycd$") # y-cruncher names the blocks of a computation "Pi - Dec - Chudnovsky - 0.ycd", "... - 1.ycd" and so on
+
+def ycd_block_id(file_path:Path) -> int|None:
+    """ BlockID from the header of a ycd file, None if there is none """
+    with file_path.open("rb") as f:
+        chunk = f.read(500)
+    if b"BlockID:\t" not in chunk:
+        return None
+    return int(chunk.split(b"BlockID:\t")[1].split(b"\r\n")[0])
+
+def block_paths(file_path:Path) -> list[Path]:
+    """ paths of all blocks of the ycd computation file_path is part of, in order, up to the first missing one, just [file_path] if its not named like a block """
+    match = BLOCK_NAME.match(file_path.name)
+    if not match:
+        return [file_path]
+    paths = []
+    while (path := file_path.with_name(f"{match[1]} - {len(paths)}.ycd")).is_file() and ycd_block_id(path) == len(paths):
+        paths.append(path)
+    return paths or [file_path]
+
 def check_valid(file_path:Path) -> bool:
     """ check wether a given file is a usable number file """
     if file_path.suffix not in (".txt", ".ycd"):
@@ -0,0 +1,151 @@
+# index.py - suffix array over the first digits of a number, first occurrences of any length without scanning the file
+
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right
+from threading import Lock
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from .var import Sizes, Paths
+from .helper import format_size, format_time
+from .const import INDEX_RMQ_BLOCK
+
+if TYPE_CHECKING:
+    from .bignum import BigNum
+
+class SuffixIndex:
+    """
+    the first size digits of a number together with the start of every suffix in sorted order, both memory mapped
+    all suffixes starting with a pattern are next to each other, so two binary searches find them and the smallest start among them is the first occurrence
+    that smallest start comes from a sparse table over block minima (see range_minima), so short patterns with millions of occurrences dont need a scan over all of them
+    """
+    def __init__(self, digits:np.ndarray, suffixes:np.ndarray, minima:np.ndarray|None = None) -> None:
+        self.digits = digits
+        self.suffixes = suffixes
+        self.minima = range_minima(suffixes) if minima is None else minima # indexes stored before the table existed get it on load
+
+    @property
+    def size(self) -> int:
+        """ amount of digits covered """
+        return len(self.digits)
+
+    def find(self, pattern:bytes) -> int|None:
+        """ 0 based digit index of the first occurrence of pattern, None if it doesnt lie completely inside the covered digits """
+        digits = self.digits
+        def prefix(start:int) -> bytes:
+            return digits[start:start+len(pattern)].tobytes()
+        lo = bisect_left(self.suffixes, pattern, key=prefix)
+        hi = bisect_right(self.suffixes, pattern, lo=lo, key=prefix)
+        if lo == hi:
+            return None
+        first_block, last_block = -(-lo // INDEX_RMQ_BLOCK), hi // INDEX_RMQ_BLOCK # blocks completely inside lo:hi
+        if first_block >= last_block:
+            return int(self.suffixes[lo:hi].min())
+        level = (last_block - first_block).bit_length() - 1 # two overlapping runs of 2**level blocks cover them all
+        return int(min(
+            self.suffixes[lo:first_block*INDEX_RMQ_BLOCK].min(initial=_NO_SUFFIX),
+            self.suffixes[last_block*INDEX_RMQ_BLOCK:hi].min(initial=_NO_SUFFIX),
+            self.minima[level, first_block],
+            self.minima[level, last_block - (1 << level)],
+        ))
+
+_NO_SUFFIX = 2**32-1 # bigger than any suffix start
+
+def range_minima(suffixes:np.ndarray) -> np.ndarray:
+    """
+    sparse table over the minima of blocks of INDEX_RMQ_BLOCK suffixes, row k holds the smallest start within the 2**k blocks beginning at each block
+    thats 4*log2(blocks) bytes per block, for the default block size less than 0.1 bytes per digit
+    """
+    minima = np.minimum.reduceat(suffixes, np.arange(0, len(suffixes), INDEX_RMQ_BLOCK)) if len(suffixes) else np.empty(0, dtype=np.uint32)
+    blocks = len(minima)
+    table = np.full((max(1, blocks.bit_length()), blocks), _NO_SUFFIX, dtype=np.uint32)
+    table[0] = minima
+    for level in range(1, len(table)):
+        half, count = 1 << (level-1), blocks - (1 << level) + 1
+        np.minimum(table[level-1, :count], table[level-1, half:half+count], out=table[level, :count])
+    return table
+
+def _paths(table_name:str):
+    return Paths.index_dir / f"{table_name}.digits.npy", Paths.index_dir / f"{table_name}.sa.npy", Paths.index_dir / f"{table_name}.rmq.npy"
+
+def suffix_array(digits:np.ndarray, base:int) -> np.ndarray:
+    """
+    sorted suffix starts of an ascii digit array with less than 2**32 digits
+    starts by sorting on the first 18 (dec) or 15 (hex) digits packed into one uint64 (digit+1 so the end of the array sorts first), then doubles the sorted length by pairing up ranks until every rank is unique
+    for random digits like the ones of irrational numbers that takes one or two rounds
+    """
+    n = len(digits)
+    if n >= 2**32:
+        raise ValueError("a suffix index can cover at most 2**32-1 digits")
+    packed_base = base + 1
+    length = 18 if base == 10 else 15 # biggest amount of digits that fits an uint64 with packed_base
+    values = np.zeros(n + length, dtype=np.uint64)
+    values[:n] = digits.astype(np.uint64) - 47
+    values[:n][digits >= ord("a")] -= 39
+    key = np.zeros(n, dtype=np.uint64)
+    for i in range(length):
+        key *= np.uint64(packed_base)
+        key += values[i:i+n]
+    del values
+
+    while True:
+        order = np.argsort(key)
+        key = key[order]
+        rank = np.empty(n, dtype=np.uint64)
+        rank[order] = np.cumsum(np.concatenate(([True], key[1:] != key[:-1])), dtype=np.uint64) # equal keys get equal ranks, starting at 1
+        if n == 0 or rank.max() == n or length >= n: # every suffix is told apart
+            return order.astype(np.uint32)
+        del key, order
+        key = rank << np.uint64(32) # rank of the suffix and of the one length digits later, 0 past the end
+        key[:n-length] |= rank[length:]
+        del rank
+        length *= 2
+
+def build_index(bignum:BigNum, amount_digits:int|None = None, verbose:bool = False) -> SuffixIndex:
+    """
+    builds and stores the suffix index of the first amount_digits digits (defaults to Sizes.index_digits), replaces the old one of that constant
+    needs around 30 bytes of memory per digit while building, on disk its 5 bytes per digit
+    """
+    if bignum.info.name == "unknown":
+        raise ValueError("cant build an index for an unknown constant")
+    amount_digits = min(amount_digits or Sizes.index_digits, bignum.info.digit_count)
+    time_start = perf_counter()
+    digits = bignum.read_digits(amount_digits)
+    suffixes = suffix_array(digits, bignum.info.base)
+    minima = range_minima(suffixes)
+    if verbose:
+        print(f"sorted {format_size(amount_digits)} suffixes of {bignum} in {format_time(perf_counter()-time_start)}")
+
+    Paths.index_dir.mkdir(parents=True, exist_ok=True)
+    for path, array in zip(_paths(bignum.info.table_name), (digits, suffixes, minima)):
+        tmp = path.with_suffix(".tmp")
+        with tmp.open("wb") as f:
+            np.save(f, array)
+        tmp.replace(path)
+    with _lock:
+        _indexes.pop(bignum.info.table_name, None)
+    return get_index(bignum) # type:ignore
+
+_indexes:dict[str,SuffixIndex|None] = {}
+_lock = Lock()
+
+def get_index(bignum:BigNum) -> SuffixIndex|None:
+    """ the stored suffix index of the constant, memory mapped on first use, None if there is none """
+    table_name = bignum.info.table_name
+    with _lock:
+        if table_name not in _indexes:
+            digits_path, suffixes_path, minima_path = _paths(table_name)
+            if bignum.info.name == "unknown" or not (digits_path.exists() and suffixes_path.exists()):
+                _indexes[table_name] = None
+            else:
+                minima = np.load(minima_path) if minima_path.exists() else None
+                _indexes[table_name] = SuffixIndex(np.load(digits_path, mmap_mode="r"), np.load(suffixes_path, mmap_mode="r"), minima)
+        return _indexes[table_name]
+
+def clear():
+    """ forgets all opened indexes, the next get_index looks on disk again """
+    with _lock:
+        _indexes.clear()
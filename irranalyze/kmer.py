@@ -0,0 +1,112 @@
+# kmer.py - dense first occurrence tables of every short digit string, a lookup is a single array read
+
+from __future__ import annotations
+
+from threading import Lock
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from .var import Sizes, Paths
+from .helper import format_size, format_time
+from .const import KMER_LENGTH, KMER_CHUNK, KMER_NOT_FOUND
+
+if TYPE_CHECKING:
+    from .bignum import BigNum
+
+class KmerTable:
+    """
+    first occurrence of every digit string of length 1 to k inside the first size digits, memory mapped
+    the strings of one length are numbered by their value, so "0420" is entry 420 of the length 4 table, the tables of all lengths are stored one after another
+    element 0 holds the amount of covered digits, KMER_NOT_FOUND marks strings that dont occur there
+    """
+    def __init__(self, table:np.ndarray, base:int) -> None:
+        self.table = table
+        self.base = base
+        self.size = int(table[0])
+        self.offsets = [1] # where the table of each length starts
+        while self.offsets[-1] < len(table):
+            self.offsets.append(self.offsets[-1] + base ** len(self.offsets))
+        self.k = len(self.offsets) - 1
+
+    def find(self, pattern:bytes) -> int|None:
+        """ 0 based digit index of the first occurrence of pattern, None if its too long for the table, not a digit string or doesnt lie completely inside the covered digits """
+        if not 0 < len(pattern) <= self.k or pattern.translate(None, b"0123456789abcdef"[:self.base]):
+            return None
+        code = int(pattern, self.base)
+        position = int(self.table[self.offsets[len(pattern)-1] + code])
+        return None if position == KMER_NOT_FOUND else position
+
+def _path(table_name:str):
+    return Paths.index_dir / f"{table_name}.kmer.npy"
+
+def digit_values(digits:np.ndarray) -> np.ndarray:
+    """ ascii digits to their values, 0-15 """
+    values = digits - np.uint8(48)
+    values[digits >= ord("a")] -= 39
+    return values
+
+def build_kmer_table(bignum:BigNum, k:int|None = None, amount_digits:int|None = None, verbose:bool = False) -> KmerTable:
+    """
+    builds and stores the first occurrence table of all digit strings up to length k (defaults to KMER_LENGTH of the base) inside the first amount_digits digits (defaults to Sizes.index_digits)
+    takes base**k * 4 bytes (k=8 is 400MB for decimal), one vectorized pass per length over chunks of KMER_CHUNK digits that only writes strings not seen in an earlier chunk, the code of each string is rolled from the one a digit shorter
+    """
+    if bignum.info.name == "unknown":
+        raise ValueError("cant build a kmer table for an unknown constant")
+    base = bignum.info.base
+    k = k or KMER_LENGTH[base]
+    amount_digits = min(amount_digits or Sizes.index_digits, bignum.info.digit_count, KMER_NOT_FOUND - 1)
+    time_start = perf_counter()
+
+    offsets = [1]
+    for length in range(1, k+1):
+        offsets.append(offsets[-1] + base ** length)
+    table = np.full(offsets[-1], KMER_NOT_FOUND, dtype=np.uint32)
+    table[0] = amount_digits
+
+    values = digit_values(bignum.read_digits(amount_digits))
+    for chunk_start in range(0, amount_digits, KMER_CHUNK):
+        chunk = values[chunk_start:chunk_start+KMER_CHUNK+k-1].astype(np.uint64) # k-1 more so strings starting at the end of the chunk are complete
+        chunk_size = min(KMER_CHUNK, amount_digits-chunk_start)
+        positions = np.arange(chunk_start, chunk_start+chunk_size, dtype=np.uint32)
+        code = np.zeros(chunk_size, dtype=np.uint64)
+        for length in range(1, k+1):
+            complete = min(chunk_size, len(chunk)-length+1) # strings running past the covered digits dont count
+            code *= np.uint64(base)
+            code[:complete] += chunk[length-1:length-1+complete]
+            slots = table[offsets[length-1]:offsets[length]]
+            unset = slots[code[:complete]] == KMER_NOT_FOUND # set slots hold a position of an earlier chunk, thats smaller
+            slots[code[:complete][unset][::-1]] = positions[:complete][unset][::-1] # with repeated codes the last write wins, backwards thats the first position
+    if verbose:
+        print(f"found first occurrences of {format_size(offsets[-1]-1)} strings in {format_size(amount_digits)} digits of {bignum} in {format_time(perf_counter()-time_start)}")
+
+    path = _path(bignum.info.table_name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with tmp.open("wb") as f:
+        np.save(f, table)
+    tmp.replace(path)
+    with _lock:
+        _tables.pop(bignum.info.table_name, None)
+    return get_kmer_table(bignum) # type:ignore
+
+_tables:dict[str,KmerTable|None] = {}
+_lock = Lock()
+
+def get_kmer_table(bignum:BigNum) -> KmerTable|None:
+    """ the stored kmer table of the constant, memory mapped on first use, None if there is none """
+    table_name = bignum.info.table_name
+    with _lock:
+        if table_name not in _tables:
+            path = _path(table_name)
+            if bignum.info.name == "unknown" or not path.exists():
+                _tables[table_name] = None
+            else:
+                _tables[table_name] = KmerTable(np.load(path, mmap_mode="r"), bignum.info.base)
+        return _tables[table_name]
+
+def clear():
+    """ forgets all opened tables, the next get_kmer_table looks on disk again """
+    with _lock:
+        _tables.clear()
@@ -1,156 +1,479 @@
 # search.py - various search methods
 from __future__ import annotations
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Callable, Generator, Iterable
 if TYPE_CHECKING:
     from .bignum import BigNum
 
-import sqlite3
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from queue import Queue
+from threading import Thread
+
 import hyperscan
+import numpy as np
 
-from .var import Paths, Switches
+from .var import Sizes, Switches
+from .cache import Cache
+from .hscache import get_database, scratch
+from .index import get_index
+from .kmer import get_kmer_table
+from .convert import txt_to_num_regex
+from .const import SCAN_WINDOW, POSITIONS_CHUNK, MIN_SHARD_SIZE, QUERY_TYPES, REGEX_MAX_MATCH
 
-def search_file(bignum:BigNum, patterns:list[bytes], lower_bound:int|None = None, upper_bound:int|None = None) -> dict[bytes,int]:
-    def match_handler(id:int, start:int, stop:int, flags:int, context=None):
-        pat = id_pattern_map[id]
-        positions[id_pattern_map[id]] = stop - len(pat) + Switches.one_indexed - 1 + offset_bounds
+def _windows(lower_bound:int, upper_bound:int, overlap:int) -> Generator[tuple[int,int]]:
+    """ splits the bounds into windows of SCAN_WINDOW bytes, each one reaching overlap bytes into the next so every match starts in exactly one window """
+    for window_start in range(lower_bound, upper_bound, SCAN_WINDOW):
+        yield window_start, min(window_start + SCAN_WINDOW + overlap, upper_bound)
+
+def _has_border(pattern:bytes) -> bool:
+    """ wether a pattern can overlap with itself, like b"11" in b"111" or b"121" in b"12121" """
+    return any(pattern[:n] == pattern[-n:] for n in range(1, len(pattern)))
+
+def _ycd_digits(bignum:BigNum, lower_bound:int, upper_bound:int) -> np.ndarray:
+    """ decodes only the words of a ycd file needed for the digits between the bounds, bounds are offsets as if the file was a txt file """
+    first = lower_bound - bignum.info.radix_pos - 1 # bound -> digit index
+    return bignum.read_digits(upper_bound - lower_bound, first)
+
+def _digit_windows(bignum:BigNum, lower_bound:int, upper_bound:int, overlap:int) -> Generator[tuple[int,memoryview|np.ndarray]]:
+    """ windows of ascii digits between the bounds, zero copy slices of the mmap for txt files and decoded chunks for ycd files """
+    if bignum.info.format == "ycd":
+        for window_start, window_stop in _windows(lower_bound, upper_bound, overlap):
+            yield window_start, _ycd_digits(bignum, window_start, window_stop)
+        return
+    mv = memoryview(bignum)
+    try:
+        for window_start, window_stop in _windows(lower_bound, upper_bound, overlap):
+            yield window_start, mv[window_start:window_stop]
+    finally:
+        mv.release()
+
+def _wildcard_to_regex(pattern:bytes, base:int) -> bytes:
+    """ ? -> any digit of the base, everything else gets escaped so it stays literal """
+    any_digit = b"[0-9]" if base == 10 else b"[0-9a-f]"
+    return b"".join(any_digit if c == b"?" else re.escape(c) for c in (pattern[i:i+1] for i in range(len(pattern))))
+
+def _query_table(bignum:BigNum, query:str) -> str:
+    """ table that caches positions of the query type, literal ones live in the regular table """
+    return bignum.info.table_name if query == "literal" else f"{bignum.info.table_name}_{query}"
+
+def _digits_end(bignum:BigNum) -> int:
+    """ upper bound of all digits, for ycd files this is where the last digit would be in a txt file """
+    return bignum.info.radix_pos + 1 + bignum.info.digit_count
+
+def search_file(bignum:BigNum, patterns:list[bytes], lower_bound:int|None = None, upper_bound:int|None = None, shards:int|None = None, workers:int|None = None, on_match:Callable[[bytes,int],None]|None = None, query:str = "literal", lengths:list[int]|None = None) -> dict[bytes,int]:
+    """
+    first position of each pattern between the bounds
+    the range is split into shards that overlap by the longest pattern - 1 bytes, those get scanned by a pool of threads (hyperscan releases the gil while scanning) and the smallest position per pattern wins
+    a shard stops scanning as soon as it found every pattern, or once an earlier shard did so
+    ycd files get decoded to digits window by window, so the positions are digit positions just like for txt files
+    shards and workers default to Sizes.scan_shards and Sizes.scan_workers
+    on_match(pattern, position) gets called as soon as a position is final (possibly from a worker thread), not found patterns get reported with -1 at the end
+    query says what the patterns are (see QUERY_TYPES):
+     - "literal": plain strings, compiled with the pure literal api, "3.14" really means a dot
+     - "wildcard": literal except that ? stands for any digit of the base
+     - "regex": hyperscan expressions, the position is where the leftmost match starts, if lengths gives the (fixed) length of each match thats cheaper to find
+       without lengths only matches up to REGEX_MAX_MATCH long are sure to be seen, longer ones can get missed where two shards or ycd windows meet
+    """
+    def scan_shard(shard_id:int) -> dict[int,int]:
+        def match_handler(id:int, start:int, stop:int, flags:int, context=None):
+            start = (start if som else stop - id_length_map[id]) + window_offset
+            if id not in final and start < starts.get(id, start+1):
+                starts[id] = start
+                if not som: # windows are scanned in order, so the first one is the smallest
+                    final.add(id)
+                    if shard_id == 0 and on_match is not None: # nothing comes before the first shard, so its positions are final right away
+                        on_match(id_pattern_map[id], to_position(start))
+            if som: # a match starting earlier but ending later gets reported later, only once it would be longer than REGEX_MAX_MATCH nothing can come before a start anymore
+                final.update(i for i,i_start in starts.items() if stop + window_offset - i_start >= REGEX_MAX_MATCH)
+            if len(final) == len(patterns):
+                if not som or max(starts.values()) < shard_start + shard_size: # a regex match starting in the overlap could have an earlier one in the next shard
+                    done_shard[0] = min(done_shard[0], shard_id)
+                return True # everything found, terminate the scan
+            return done_shard[0] < shard_id # an earlier shard found everything, nothing here can be smaller
+        starts:dict[int,int] = {}
+        final:set[int] = set()
+        shard_start = shard_id * shard_size
+        shard_stop = min(shard_start+shard_size+overlap, bounds_size)
+        if bignum.info.format == "ycd":
+            windows = ((window_start-lower_bound, window) for window_start, window in _digit_windows(bignum, lower_bound+shard_start, lower_bound+shard_stop, overlap))
+        elif block_mode:
+            windows = [(shard_start, mv[shard_start:shard_stop])]
+        else:
+            shard = mv[shard_start:shard_stop]
+            windows = [(shard_start, [shard[i:i+block_size] for i in range(0,len(shard),block_size)])]
+        with scratch(db) as s: # scratch space cant be shared between threads
+            try:
+                for window_offset, window in windows:
+                    db.scan(window, match_handler, scratch=s)
+            except hyperscan.ScanTerminated:
+                pass
+        return starts
+
+    def to_position(start:int) -> int:
+        return start + one_indexed - 1 + offset_bounds
 
     # bounds and sizes
+    if query not in QUERY_TYPES:
+        raise ValueError(f"query has to be one of {', '.join(QUERY_TYPES)}, not {query}")
+    som = query == "regex" and lengths is None # only then the length of a match is unknown
+    pattern_lengths = dict(zip(patterns, lengths or (REGEX_MAX_MATCH if som else len(p) for p in patterns)))
+    patterns = list(dict.fromkeys(patterns)) # no need to look for the same thing twice
     lower_bound = lower_bound if lower_bound is not None else bignum.info.radix_pos
-    upper_bound = upper_bound if upper_bound is not None else bignum.info.file_size
+    upper_bound = upper_bound if upper_bound is not None else _digits_end(bignum)
+    if bignum.info.format == "ycd": # theres no radix point to decode, start at the first digit instead
+        lower_bound = max(lower_bound, bignum.info.radix_pos+1)
+        upper_bound = min(upper_bound, _digits_end(bignum))
     offset_bounds = lower_bound - bignum.info.radix_pos
-    bounds_size = upper_bound - lower_bound
+    bounds_size = max(0, upper_bound - lower_bound)
+    overlap = max(pattern_lengths.values()) - 1
     block_size = 2**32-1
-    block_mode = bounds_size <= block_size
+    one_indexed = Switches.one_indexed
+
+    # shards
+    workers = workers or Sizes.scan_workers or os.cpu_count() or 1
+    if not shards: # small ranges are not worth splitting unless explicitly asked for
+        shards = min(Sizes.scan_shards or workers, bounds_size // MIN_SHARD_SIZE)
+    shards = max(1, min(shards, bounds_size))
+    shard_size = max(1, -(-bounds_size // shards))
+    shards = len(range(0, bounds_size, shard_size)) or 1
+    block_mode = bignum.info.format == "ycd" or shard_size + overlap <= block_size # ycd windows are always small
+    done_shard = [shards] # smallest shard that found every pattern
 
-    # hyperscan db setup
+    # hyperscan db setup, compiled once per pattern set and then cached
     id_pattern_map = {id:pat for id,pat in enumerate(patterns)}
+    id_length_map = {id:pattern_lengths[pat] for id,pat in enumerate(patterns)}
     positions = {p:-1 for p in patterns}
-    if block_mode:
-        db = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
-    else:
-        db = hyperscan.Database(mode=hyperscan.HS_MODE_VECTORED)
-    ids = list(range(len(patterns)))
-    flags = [hyperscan.HS_FLAG_SINGLEMATCH] * len(patterns)
-    db.compile(expressions=patterns, ids=ids, elements=len(patterns), flags=flags)
+    mode = hyperscan.HS_MODE_BLOCK if block_mode else hyperscan.HS_MODE_VECTORED
+    if query == "literal":
+        db = get_database(patterns, hyperscan.HS_FLAG_SINGLEMATCH, mode, literal=True)
+    elif query == "wildcard":
+        db = get_database([_wildcard_to_regex(p, bignum.info.base) for p in patterns], hyperscan.HS_FLAG_SINGLEMATCH, mode)
+    else: # hyperscan only knows where a match starts if asked to, and then it cant stop at the first match per pattern
+        db = get_database(patterns, hyperscan.HS_FLAG_SOM_LEFTMOST if som else hyperscan.HS_FLAG_SINGLEMATCH, mode)
 
     mv = memoryview(bignum)[lower_bound:upper_bound]
-    if block_mode:
-        db.scan(mv, match_handler)
-    else:
-        blocks = [mv[i:i+block_size] for i in range(0,bounds_size,block_size)]
-        db.scan(blocks, match_handler)
-        for b in blocks:
-            b.release()
+    pool = ThreadPoolExecutor(min(workers, shards)) if shards > 1 else None
+    shard_results = pool.map(scan_shard, range(shards)) if pool else map(scan_shard, range(1))
+    best:dict[int,int] = {}
+    reported:set[int] = set()
+    for shard_id, starts in enumerate(shard_results): # comes in shard order
+        for id, start in starts.items():
+            best[id] = min(start, best.get(id, start))
+        if shard_id == 0 and not som: # reported by the shard itself
+            reported.update(starts)
+        for id, start in best.items():
+            if id not in reported and (start < (shard_id+1) * shard_size or shard_id == shards-1): # nothing a later shard finds can start before it
+                reported.add(id)
+                if on_match is not None:
+                    on_match(id_pattern_map[id], to_position(start))
+    for id, start in best.items():
+        positions[id_pattern_map[id]] = to_position(start)
+    if pool:
+        pool.shutdown()
     mv.release()
 
+    if on_match is not None:
+        for pat, pos in positions.items():
+            if pos == -1:
+                on_match(pat, pos)
+
     return positions
 
+def search_file_all(bignum:BigNum, pattern:bytes, lower_bound:int|None = None, upper_bound:int|None = None) -> Generator[np.ndarray]:
+    """ streams every position of pattern (overlapping ones included) as sorted uint64 arrays of up to POSITIONS_CHUNK positions """
+    def match_handler(id:int, start:int, stop:int, flags:int, context=None):
+        found.append(stop)
+
+    lower_bound = lower_bound if lower_bound is not None else bignum.info.radix_pos + 1
+    upper_bound = upper_bound if upper_bound is not None else _digits_end(bignum)
+    shift = Switches.one_indexed - bignum.info.radix_pos - 1 - len(pattern) # match end in file -> position
+
+    db = get_database([pattern], 0, hyperscan.HS_MODE_BLOCK, literal=True)
+
+    for window_start, window in _digit_windows(bignum, lower_bound, upper_bound, len(pattern)-1):
+        found:list[int] = []
+        with scratch(db) as s:
+            db.scan(window, match_handler, scratch=s)
+        del window
+        if not found:
+            continue
+        positions = (np.array(found, dtype=np.int64) + (window_start + shift)).astype(np.uint64)
+        del found
+        for i in range(0, len(positions), POSITIONS_CHUNK):
+            yield positions[i:i+POSITIONS_CHUNK]
+
+def count_file(bignum:BigNum, pattern:bytes, lower_bound:int|None = None, upper_bound:int|None = None) -> int:
+    """ amount of occurrences of pattern (overlapping ones included) without ever holding the positions """
+    def match_handler(id:int, start:int, stop:int, flags:int, context=None):
+        nonlocal count
+        count += 1
+
+    lower_bound = lower_bound if lower_bound is not None else bignum.info.radix_pos + 1
+    upper_bound = upper_bound if upper_bound is not None else _digits_end(bignum)
+    count = 0
+
+    # plain digit strings that cant overlap themselves are counted the same by bytes.count, which is a lot faster than a callback per match
+    if pattern.isalnum() and not _has_border(pattern):
+        for _, window in _digit_windows(bignum, lower_bound, upper_bound, len(pattern)-1):
+            count += bytes(window).count(pattern)
+        return count
+
+    db = get_database([pattern], 0, hyperscan.HS_MODE_BLOCK, literal=True)
+    with scratch(db) as s:
+        for _, window in _digit_windows(bignum, lower_bound, upper_bound, len(pattern)-1):
+            db.scan(window, match_handler, scratch=s)
+    return count
+
+def _shown(position:int|None, one_indexed:int) -> int|None:
+    """ stored 0 based position -> position with the indexing of the results, -1 and None stay """
+    return position + one_indexed if position is not None and position > -1 else position
+
 def search_db_single(bignum:BigNum, pattern:bytes) -> int|None:
     """ very quick but limited search, only returns whats stored in the db """
-    conn = sqlite3.connect(Paths.sqlite_path)
-    cursor = conn.cursor()
-    table_exists = bool(cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name=?;", (bignum.info.table_name, )).fetchone())
-    if not table_exists:
-        conn.close()
-        return None
-    cursor.execute(f"""SELECT position FROM "{bignum.info.table_name}" WHERE string = ? ORDER BY position ASC LIMIT 1""", (pattern,))
-    result = cursor.fetchone()
-    conn.close()
-    if isinstance(result,tuple|list):
-        result = result[0]
-    return result
+    return _shown(Cache.lookup(bignum.info.table_name, pattern), Switches.one_indexed)
 
 def search_db_multi(bignum:BigNum, patterns:list[bytes]) -> dict[bytes,int|None]:
-    conn = sqlite3.connect(Paths.sqlite_path)
-    cursor = conn.cursor()
-    table_exists = bool(cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name=?;", (bignum.info.table_name, )).fetchone())
-    if not table_exists:
-        conn.close()
-        return {p:None for p in patterns}
-    query = f"""WITH search_list(pattern) AS (VALUES (?) {', (?)'*(len(patterns)-1)}) SELECT s.pattern, MIN(t.position) FROM search_list s LEFT JOIN "{bignum.info.table_name}" t ON s.pattern = t.string GROUP BY s.pattern"""
-    result = cursor.execute(query,patterns).fetchall()
-    conn.close()
-    return {pat:pos for pat,pos in result}
-
-def search_single(bignum:BigNum, pattern:bytes):
-    position = search_db_single(bignum, pattern)
+    one_indexed = Switches.one_indexed
+    return {pat:_shown(pos, one_indexed) for pat,pos in Cache.lookup_many(bignum.info.table_name, patterns).items()}
+
+def search_kmer(bignum:BigNum, patterns:list[bytes]) -> dict[bytes,int]:
+    """ positions of the patterns found in the kmer table, if there is one """
+    table = get_kmer_table(bignum)
+    if table is None:
+        return {}
+    positions = {}
+    for pattern in patterns:
+        found = table.find(pattern)
+        if found is not None:
+            positions[pattern] = found + Switches.one_indexed
+    return positions
+
+def search_index(bignum:BigNum, patterns:list[bytes]) -> tuple[dict[bytes,int],int|None]:
+    """
+    positions of the patterns found in the suffix index, if there is one
+    also returns the lower bound for a file scan of the rest, since those cant start before the end of the indexed digits
+    """
+    index = get_index(bignum)
+    if index is None or not patterns:
+        return {}, None
+    positions = {}
+    for pattern in patterns:
+        found = index.find(pattern)
+        if found is not None:
+            positions[pattern] = found + Switches.one_indexed
+    lower_bound = bignum.info.radix_pos + 1 + max(0, index.size - max(map(len, patterns)) + 1)
+    return positions, lower_bound
+
+def search_single(bignum:BigNum, pattern:bytes, on_match:Callable[[bytes,int],None]|None = None):
+    position = search_kmer(bignum, [pattern]).get(pattern) # a single array read, cheaper than asking sqlite
+    if position is None:
+        position = search_db_single(bignum, pattern)
+    if position is None:
+        positions_index, index_bound = search_index(bignum, [pattern])
+        position = positions_index.get(pattern)
 
     if position is not None:
+        if on_match is not None:
+            on_match(pattern, position)
         return position
 
-    lower_bound = None
+    lower_bound = index_bound
     upper_bound = None
+    first_digit = bignum.info.radix_pos + 1 # file offset of the stored position 0
 
     if len(pattern) > 1:
-        part_found = search_db_multi(bignum, [pattern[:n] for n in range(1,len(pattern))]) # check all patterns smaller than wanted pattern
-        part_found = filter(lambda x:x[1], part_found.items()) # filter out all None, we care about found and not presnt only
+        part_found = Cache.lookup_many(bignum.info.table_name, [pattern[:n] for n in range(1,len(pattern))]) # check all patterns smaller than wanted pattern, the stored positions are 0 based
+        part_found = filter(lambda x:x[1] is not None, part_found.items()) # filter out all None, we care about found and not presnt only
         part_found = sorted(part_found, key=lambda x:len(x[0])) # exctract the last known position, we sort to get the closest sub pattern to our current pattern
         if part_found:
             canidate = part_found[-1][1]
             if canidate == -1: # if the pattern with the last char missing is not in file, then current pattern cant be in file either
                 add_to_db(bignum, {pattern:-1})
+                if on_match is not None:
+                    on_match(pattern, -1)
                 return -1
 
-            lower_bound = canidate # if we do have a position from sub pattern, than we can use that as lower bound
+            lower_bound = max(first_digit + canidate, lower_bound or 0) # if we do have a position from sub pattern, than we can use that as lower bound
 
         # upper bound
-        if bignum.info.format == "ycd":
-            possible_chars = [bytes((i,)) for i in range(256)]
+        if bignum.info.base == 10:
+            possible_chars = [b"0",b"1",b"2",b"3",b"4",b"5",b"6",b"7",b"8",b"9"]
         else:
-            if bignum.info.base == 10:
-                possible_chars = [b"0",b"1",b"2",b"3",b"4",b"5",b"6",b"7",b"8",b"9"]
-            else:
-                possible_chars = [b"0",b"1",b"2",b"3",b"4",b"5",b"6",b"7",b"8",b"9",b"a",b"b",b"c",b"d",b"e",b"f"]
+            possible_chars = [b"0",b"1",b"2",b"3",b"4",b"5",b"6",b"7",b"8",b"9",b"a",b"b",b"c",b"d",b"e",b"f"]
 
         super_patterns = [pattern+c for c in possible_chars] + [c+pattern for c in possible_chars]
-        part_found = search_db_multi(bignum, super_patterns)
+        part_found = Cache.lookup_many(bignum.info.table_name, super_patterns)
         part_found = filter(lambda x:x[1] is not None and x[1] != -1, part_found.items()) # filter out the ones that are not recorded or not present
         part_found = sorted(part_found, key=lambda x:x[1]) # pyright has some issues here again since it thinks that there still None in there which you cant compare against ints, but i just filtered the omg... # type:ignore
         if part_found:
-            upper_bound = part_found[0][1]
+            upper_bound = first_digit + part_found[0][1] + len(pattern) + 1 # the super pattern contains this one, so it ends there at the latest
 
-    position_dict = search_file(bignum,[pattern], lower_bound, upper_bound)
+    position_dict = search_file(bignum,[pattern], lower_bound, upper_bound, on_match=on_match)
     add_to_db(bignum, position_dict)
     return position_dict[pattern]
 
-def search_multi(bignum:BigNum, patterns:list[bytes]) -> dict[bytes,int]:
-    positions_db = search_db_multi(bignum, patterns) # first search db, will return {pattern:pos} where pos can be int or None, if pos is None it means its not recorded at all, -1 means reported not in file and anything >-1 is regular position
+def search_multi(bignum:BigNum, patterns:list[bytes], on_match:Callable[[bytes,int],None]|None = None) -> dict[bytes,int]:
+    positions_kmer = search_kmer(bignum, patterns) # short ones might be in the kmer table
+    positions_db = search_db_multi(bignum, [pat for pat in patterns if pat not in positions_kmer]) # then search db, will return {pattern:pos} where pos can be int or None, if pos is None it means its not recorded at all, -1 means reported not in file and anything >-1 is regular position
+    positions_db.update(positions_kmer)
+    if on_match is not None: # whats already in the db is known right away
+        for pat,pos in positions_db.items():
+            if pos is not None:
+                on_match(pat, pos)
     missing_db = [pat for pat,pos in positions_db.items() if pos is None] # make a set of the patterns that return None / are not recorded
     if not missing_db: # if there arent any missing then we found everything
         return positions_db # return {pat:pos}, pyright says error here since it thinks we try to return {bytes:int|None} while its only {bytes:int} since we calculated missing_db which hosts all None, but that was empty so there are no None -> all int # type:ignore
     positions_db_safe = {pat:pos for pat,pos in positions_db.items() if pos is not None}
-    positions_file = search_file(bignum, missing_db) # some are missing, so we first do a quick search
+    positions_index, lower_bound = search_index(bignum, missing_db) # the suffix index knows any length, but only within its digits
+    if on_match is not None:
+        for pat,pos in positions_index.items():
+            on_match(pat, pos)
+    positions_db_safe.update(positions_index)
+    missing_db = [pat for pat in missing_db if pat not in positions_index]
+    if not missing_db:
+        return positions_db_safe
+    positions_file = search_file(bignum, missing_db, lower_bound, on_match=on_match) # some are missing, so we first do a quick search
     add_to_db(bignum,positions_file)
     positions_db_safe.update(positions_file)
     return positions_db_safe
 
-def add_to_db(bignum:BigNum, patterns:dict[bytes,int]):
+def _db_pairs(bignum:BigNum, patterns:dict[bytes,int], one_indexed:int) -> list[tuple[bytes,int]]:
+    """ search results (indexed like one_indexed) -> the 0 based pattern:position pairs that should be stored """
     if bignum.info.name == "unknown": # if the file is unknown
-        return # dont do anything
+        return [] # dont do anything
 
-    # with sqlite3.connect(Paths.sqlite_path) as conn: # connection to the db
-    conn =sqlite3.connect(Paths.sqlite_path) # connection to the db
-    cursor = conn.cursor() # cursor db thingy
-    table_exists = bool(cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name=?;", (bignum.info.table_name, )).fetchone()) # bool wether table exists
+    patterns = {pat:pos - one_indexed if pos > -1 else pos for pat,pos in patterns.items() if not pos is None} # stored 0 based, so any indexing can use them
+    if Switches.report_not_found: # add -1 to table to signal thats not there?
+        return [(pat,pos) for pat,pos in patterns.items()] # convert patterns dict to list
+    # or leave it open, maybe user add bigger number file to find pattern
+    return [(pat,pos) for pat,pos in patterns.items() if pos != -1] # convert patterns dict to list, but only the ones that are found (!=-1)
 
-    if not table_exists: # is that table doesnt exist
-        cursor.execute(f"""CREATE TABLE "{bignum.info.table_name}" (string BLOB PRIMARY KEY, position INTEGER)""") # just make it lol
+def add_to_db(bignum:BigNum, patterns:dict[bytes,int]):
+    """ stores search results (indexed like Switches.one_indexed) in the db """
+    pairs = _db_pairs(bignum, patterns, Switches.one_indexed)
+    if pairs:
+        Cache.insert(bignum.info.table_name, pairs) # creates the table if needed and inserts all
 
-    patterns = {pat:pos for pat,pos in patterns.items() if not pos is None}
-    if Switches.report_not_found: # add -1 to table to signal thats not there?
-        patterns_new = [(pat,pos) for pat,pos in patterns.items()] # convert patterns dict to list
-    else: # or leave it open, maybe user add bigger number file to find pattern
-        patterns_new = [(pat,pos) for pat,pos in patterns.items() if pos != -1] # convert patterns dict to list, but only the ones that are found (!=-1)
+def search_many(nums:Iterable[BigNum], patterns:Iterable[bytes|str], workers:int|None = None) -> dict[BigNum,dict[bytes,int]]:
+    """
+    first position of every pattern in every number, like bignum[patterns] for each of them but in one go
+    kmer tables, suffix indexes and the db are asked for all numbers first, then the files that still miss patterns get scanned at the same time by up to workers threads (defaults to Sizes.scan_workers, else one per cpu core, never more than there are files to scan)
+    the threads split the workers between them so a file scan shards less the more files run at once, all new positions get written back in one transaction
+    equal numbers (same constant, base and format) are searched once
+    """
+    patterns = list(dict.fromkeys(p.encode() if isinstance(p, str) else bytes(p) for p in patterns))
+    nums = list(dict.fromkeys(nums))
+    one_indexed = Switches.one_indexed
+    results:dict[BigNum,dict[bytes,int]] = {}
+    scans:list[tuple[BigNum,list[bytes],int|None]] = []
+    if not patterns:
+        return {num:{} for num in nums}
+
+    # everything thats known without touching the files
+    for num in nums:
+        found:dict[bytes,int] = search_kmer(num, patterns)
+        stored = Cache.lookup_many(num.info.table_name, [pat for pat in patterns if pat not in found])
+        found.update((pat,pos) for pat,pos in ((pat,_shown(pos, one_indexed)) for pat,pos in stored.items()) if pos is not None)
+        missing = [pat for pat in patterns if pat not in found]
+        positions_index, lower_bound = search_index(num, missing)
+        found.update(positions_index)
+        missing = [pat for pat in missing if pat not in positions_index]
+        results[num] = found
+        if missing:
+            scans.append((num, missing, lower_bound))
+    if not scans:
+        return results
+
+    # the rest gets scanned concurrently
+    threads = workers or Sizes.scan_workers or os.cpu_count() or 1
+    workers = max(1, min(threads, len(scans)))
+    scan_workers = max(1, threads // workers) # threads left for the shards of each file scan
+    with ThreadPoolExecutor(workers) as pool:
+        futures = {pool.submit(copy_context().run, search_file, num, missing, lower_bound, workers=scan_workers):num for num, missing, lower_bound in scans} # copy_context takes the settings overrides along
+        new_pairs:dict[str,list[tuple[bytes,int]]] = {}
+        for future, num in futures.items():
+            positions_file = future.result()
+            results[num].update(positions_file)
+            new_pairs.setdefault(num.info.table_name, []).extend(_db_pairs(num, positions_file, one_indexed))
+    Cache.insert_many({table:pairs for table,pairs in new_pairs.items() if pairs})
+    return {num:{pat:results[num][pat] for pat in patterns} for num in nums}
 
-    cursor.executemany(f"""INSERT OR IGNORE INTO "{bignum.info.table_name}" VALUES (?, ?)""", patterns_new) # insert all
-    conn.commit() # yeah...
-    conn.close()
+def search_words(bignum:BigNum, words:Iterable[str|bytes]) -> dict[bytes,tuple[bytes,int]]:
+    """
+    earliest spelling of each word in bignum, spelled like txt_to_num_all does, returns word:(digits, position) and (b"", -1) for words that are nowhere
+    instead of up to 4**len(word) literals each word is a single expression (see txt_to_num_regex), so long words stay cheap to compile and the db only gets one row per word, in its own table
+    """
+    words = list(dict.fromkeys((w.encode() if isinstance(w, str) else bytes(w)).lower() for w in words))
+    table = f"{bignum.info.table_name}_words"
+    one_indexed = Switches.one_indexed
+    positions = {word:_shown(pos, one_indexed) for word,pos in Cache.lookup_many(table, words).items()}
+    missing = [word for word,pos in positions.items() if pos is None]
+    if missing:
+        expressions = [txt_to_num_regex(word) for word in missing]
+        found = search_file(bignum, expressions, query="regex", lengths=[2*len(word) for word in missing])
+        positions_file = {word:found[expression] for word,expression in zip(missing, expressions)}
+        pairs = _db_pairs(bignum, positions_file, one_indexed)
+        if pairs:
+            Cache.insert(table, pairs)
+        positions.update(positions_file)
 
-def search(bignum:BigNum, pattern:bytes|list[bytes]):
+    results:dict[bytes,tuple[bytes,int]] = {}
+    for word, pos in positions.items():
+        if pos is None or pos == -1:
+            results[word] = (b"", -1)
+        else:
+            results[word] = (bignum.read_digits(2*len(word), pos - one_indexed).tobytes(), pos)
+    return results
+
+def search_query(bignum:BigNum, patterns:list[bytes], query:str, on_match:Callable[[bytes,int],None]|None = None) -> dict[bytes,int]:
+    """ first positions of wildcard or regex patterns, those are cached in a table per query type so they never get mixed up with literals or each other """
+    table = _query_table(bignum, query)
+    one_indexed = Switches.one_indexed
+    positions = {pat:_shown(pos, one_indexed) for pat,pos in Cache.lookup_many(table, patterns).items()}
+    if on_match is not None:
+        for pat,pos in positions.items():
+            if pos is not None:
+                on_match(pat, pos)
+    missing = [pat for pat,pos in positions.items() if pos is None]
+    if missing:
+        positions_file = search_file(bignum, missing, on_match=on_match, query=query)
+        pairs = _db_pairs(bignum, positions_file, one_indexed)
+        if pairs:
+            Cache.insert(table, pairs)
+        positions.update(positions_file)
+    return positions # type:ignore
+
+def search(bignum:BigNum, pattern:bytes|list[bytes], on_match:Callable[[bytes,int],None]|None = None, query:str = "literal"):
+    if query not in QUERY_TYPES:
+        raise ValueError(f"query has to be one of {', '.join(QUERY_TYPES)}, not {query}")
+    if query != "literal":
+        patterns = [pattern] if isinstance(pattern,bytes) else list(map(bytes, pattern))
+        positions = search_query(bignum, patterns, query, on_match)
+        return positions[pattern] if isinstance(pattern,bytes) else positions
     if isinstance(pattern,bytes):
-        return search_single(bignum, pattern)
+        return search_single(bignum, pattern, on_match)
     elif isinstance(pattern,list):
         pattern = list(map(bytes, pattern))
-        return search_multi(bignum, pattern)
+        return search_multi(bignum, pattern, on_match)
     print("WARN: Search pattern must either be bytes or list of bytes")
 
+def search_stream(bignum:BigNum, patterns:list[bytes]) -> Generator[tuple[bytes,int]]:
+    """ yields (pattern, position) as soon as each position is known, the ones from the db first, then the ones from the file scan as they get found """
+    def run():
+        try:
+            search_multi(bignum, patterns, lambda pat,pos: results.put((pat,pos)))
+        except BaseException as e:
+            error.append(e)
+        finally:
+            results.put(None)
+
+    results:Queue[tuple[bytes,int]|None] = Queue()
+    error:list[BaseException] = []
+    Thread(target=copy_context().run, args=(run,), daemon=True).start() # takes the settings overrides along
+    while (result := results.get()) is not None:
+        yield result
+    if error:
+        raise error[0]
+
@@ -0,0 +1,102 @@
+# stats.py - digit and n-gram histograms over whole files, counted block by block and stored so every block is only ever counted once
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+import mpmath
+import numpy as np
+
+from .var import Sizes
+from .cache import Cache
+from .kmer import digit_values
+from .const import STATS_BLOCK, STATS_MAX_N, STATS_TABLE_NAME
+
+if TYPE_CHECKING:
+    from .bignum import BigNum
+
+def _count(bignum:BigNum, n:int, start:int, stop:int) -> np.ndarray:
+    """ how often every n-gram starts between the 0 based digit indexes start and stop, the n-gram with value v is entry v """
+    base = bignum.info.base
+    counts = np.zeros(base**n, dtype=np.uint64)
+    for chunk_start in range(start, stop, STATS_BLOCK):
+        chunk_stop = min(chunk_start + STATS_BLOCK, stop)
+        values = digit_values(bignum.read_digits(chunk_stop - chunk_start + n - 1, chunk_start)) # n-1 more to complete the last n-grams
+        code = np.zeros(chunk_stop - chunk_start, dtype=np.int64)
+        for i in range(n):
+            code *= base
+            code += values[i:i+len(code)]
+        counts += np.bincount(code, minlength=base**n).astype(np.uint64)
+    return counts
+
+def _aligned(start:int, stop:int, total:int) -> list[tuple[int,int]]:
+    """ the STATS_BLOCK aligned blocks that lie completely between start and stop, the last block of a file ends at total """
+    first = -(-start // STATS_BLOCK)
+    blocks = []
+    for block_start in range(first * STATS_BLOCK, stop, STATS_BLOCK):
+        block_stop = min(block_start + STATS_BLOCK, total)
+        if block_stop > stop:
+            break
+        blocks.append((block_start, block_stop))
+    return blocks
+
+def _blocks(bignum:BigNum, n:int, blocks:list[tuple[int,int]], workers:int|None) -> dict[tuple[int,int],np.ndarray]:
+    """ counts of aligned blocks, from the db if they are stored, the missing ones get counted by a pool of threads and stored in one go """
+    known = bignum.info.name != "unknown"
+    counts:dict[tuple[int,int],np.ndarray] = {}
+    if known and blocks and Cache.has_table(STATS_TABLE_NAME):
+        for block_start, block_stop, blob in Cache.conn.execute(f"""SELECT start, stop, counts FROM {STATS_TABLE_NAME} WHERE table_name = ? AND n = ? AND start >= ? AND start <= ?""", (bignum.info.table_name, n, blocks[0][0], blocks[-1][0])):
+            counts[(block_start, block_stop)] = np.frombuffer(blob, dtype="<u8").astype(np.uint64)
+    missing = [block for block in blocks if block not in counts]
+    if not missing:
+        return counts
+    workers = workers or Sizes.scan_workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(min(workers, len(missing))) as pool:
+        counts.update(zip(missing, pool.map(lambda block: _count(bignum, n, *block), missing)))
+    if known:
+        conn = Cache.conn
+        conn.execute(f"""CREATE TABLE IF NOT EXISTS {STATS_TABLE_NAME} (table_name TEXT, n INTEGER, start INTEGER, stop INTEGER, counts BLOB, PRIMARY KEY (table_name, n, start, stop)) WITHOUT ROWID""")
+        Cache.tables.add(STATS_TABLE_NAME)
+        conn.executemany(f"""INSERT OR REPLACE INTO {STATS_TABLE_NAME} VALUES (?, ?, ?, ?, ?)""", [(bignum.info.table_name, n, block_start, block_stop, counts[(block_start, block_stop)].astype("<u8").tobytes()) for block_start, block_stop in missing])
+        Cache.commit()
+    return counts
+
+def histogram(bignum:BigNum, n:int = 1, start:int = 0, stop:int|None = None, block:int|None = None, workers:int|None = None) -> np.ndarray:
+    """
+    how often every n-gram (n up to STATS_MAX_N) lies between the 0 based digit indexes start and stop, entry v is the n-gram with value v, so "07" is entry 7
+    with block the range gets split every block digits and there is one row per block (the last one can be shorter)
+    the file is counted in STATS_BLOCK aligned blocks that get stored, so only blocks that were never counted are read, the ends of the range that dont fill a block are counted right away
+    """
+    if not 1 <= n <= STATS_MAX_N:
+        raise ValueError(f"n has to be between 1 and {STATS_MAX_N}, not {n}")
+    total = max(0, bignum.info.digit_count - n + 1) # amount of n-grams in the file
+    start = max(0, start)
+    stop = total if stop is None else max(start, min(stop - n + 1, total)) # from here on start and stop are bounds of where n-grams start
+    edges = list(range(start, stop, block)) + [stop] if block else [start, stop]
+    ranges = list(zip(edges, edges[1:])) or [(start, stop)]
+
+    aligned = {r:_aligned(*r, total) for r in ranges}
+    counts = _blocks(bignum, n, sorted({b for blocks in aligned.values() for b in blocks}), workers)
+    rows = []
+    for (range_start, range_stop), blocks in aligned.items():
+        row = np.zeros(bignum.info.base**n, dtype=np.uint64)
+        if not blocks:
+            row += _count(bignum, n, range_start, range_stop)
+        else:
+            row += _count(bignum, n, range_start, blocks[0][0]) + _count(bignum, n, blocks[-1][1], range_stop) # the ends that dont fill a block
+            for b in blocks:
+                row += counts[b]
+        rows.append(row)
+    return np.stack(rows) if block else rows[0]
+
+def chi_square(counts:np.ndarray) -> tuple[float|np.ndarray,float|np.ndarray]:
+    """ chi-square statistic of counts against all entries being equally likely and the probability of one at least that big, for a histogram with blocks its one of each per block """
+    counts = np.asarray(counts, dtype=np.float64)
+    expected = counts.sum(axis=-1, keepdims=True) / counts.shape[-1]
+    statistic = ((counts - expected)**2 / np.where(expected > 0, expected, 1)).sum(axis=-1)
+    freedom = counts.shape[-1] - 1
+    if np.ndim(statistic):
+        return statistic, np.array([float(mpmath.gammainc(freedom/2, x/2, mpmath.inf, regularized=True)) for x in statistic]) # type:ignore
+    return float(statistic), float(mpmath.gammainc(freedom/2, float(statistic)/2, mpmath.inf, regularized=True))
@@ -0,0 +1,153 @@
+# streaks.py - longest runs of one digit (streaks) and of consecutive digits (streets) and where they first show up
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from .var import Sizes, Switches
+from .cache import Cache
+from .kmer import digit_values
+from .const import STREAK_CHUNK, MIN_SHARD_SIZE, RUNS_TABLE_NAME
+
+if TYPE_CHECKING:
+    from .bignum import BigNum
+
+"""
+A streak is one digit repeated, like 999999, a street is a run of consecutive digits, like 3456789 (up) or 8765 (down)
+All three are runs of equal keys: digit - step*index stays the same along a run, with step 0 for streaks, 1 for up streets and -1 for down streets
+Records are the first 0 based position of a run of at least length digits per digit and length, for streets the digit is the one the street starts with
+"""
+
+_STEPS = {"streak":0, "up":1, "down":-1}
+
+def _update(records:dict[int,dict[int,int]], digits:np.ndarray, positions:np.ndarray, lengths:np.ndarray):
+    """ adds runs (in order of position) to the records, only runs longer than everything before of their digit set a record """
+    for digit in np.unique(digits).tolist():
+        mask = digits == digit
+        positions_digit, lengths_digit = positions[mask], lengths[mask]
+        best = records.setdefault(digit, {})
+        longest = max(best, default=0)
+        peak = np.maximum.accumulate(lengths_digit)
+        before = np.maximum(np.concatenate(([longest], peak[:-1])), longest)
+        for i in np.flatnonzero(peak > before).tolist():
+            for length in range(int(before[i])+1, int(peak[i])+1):
+                best[length] = int(positions_digit[i])
+
+def _scan(bignum:BigNum, step:int, start:int, stop:int, end:int) -> dict[int,dict[int,int]]:
+    """
+    records of the runs that start between the digit indexes start and stop, digits up to end get read to complete the last ones
+    reads STREAK_CHUNK digits at once, the run at the end of a chunk might go on so the next chunk starts where it started
+    """
+    records:dict[int,dict[int,int]] = {}
+    chunk_start = max(start - 1, 0) # one digit before to tell if the run at start began earlier
+    chunk_size = STREAK_CHUNK
+    while chunk_start < stop:
+        chunk_stop = min(chunk_start + chunk_size, end)
+        values = digit_values(bignum.read_digits(chunk_stop - chunk_start, chunk_start)).astype(np.int64)
+        key = values - step * np.arange(chunk_start, chunk_stop, dtype=np.int64)
+        run_starts = np.flatnonzero(np.concatenate(([True], key[1:] != key[:-1])))
+        lengths = np.diff(np.append(run_starts, len(key)))
+        if chunk_stop < end: # the last run might go on in the next chunk
+            if len(run_starts) == 1: # one run over the whole chunk, needs a bigger one
+                chunk_size *= 2
+                continue
+            last = run_starts[-1]
+            run_starts, lengths = run_starts[:-1], lengths[:-1]
+        positions = run_starts + chunk_start
+        owned = (positions >= start) & (positions < stop)
+        digits = values[run_starts][owned]
+        positions, lengths = positions[owned], lengths[owned]
+        if step and len(positions): # a street holds shorter streets of other start digits, 3456 holds 456 and 56
+            tails = np.repeat(np.arange(len(positions)), lengths-1)
+            offsets = np.arange(len(tails)) - np.repeat(np.cumsum(lengths-1) - (lengths-1), lengths-1)
+            digits = np.concatenate((digits, digits[tails] + step * (offsets+1))) # the whole runs go in front, the tails after, then all get sorted by position
+            positions = np.concatenate((positions, positions[tails] + offsets + 1))
+            lengths = np.concatenate((lengths, lengths[tails] - offsets - 1))
+            order = np.argsort(positions, kind="stable")
+            digits, positions, lengths = digits[order], positions[order], lengths[order]
+        _update(records, digits, positions, lengths)
+        if chunk_stop >= end:
+            break
+        chunk_start = chunk_start + int(last)
+        chunk_size = STREAK_CHUNK
+    return records
+
+def _merge(parts:list[dict[int,dict[int,int]]]) -> dict[int,dict[int,int]]:
+    """ records of several shards, the smallest position per digit and length wins """
+    records:dict[int,dict[int,int]] = {}
+    for part in parts:
+        for digit, best in part.items():
+            merged = records.setdefault(digit, {})
+            for length, position in best.items():
+                if position < merged.get(length, position+1):
+                    merged[length] = position
+    return records
+
+def _load(bignum:BigNum, kind:str) -> dict[int,dict[int,int]]|None:
+    """ stored records, None if there are none or they cover fewer digits than the file has """
+    if bignum.info.name == "unknown" or not Cache.has_table(RUNS_TABLE_NAME):
+        return None
+    rows = Cache.conn.execute(f"""SELECT digit, length, position, covered FROM {RUNS_TABLE_NAME} WHERE table_name = ? AND kind = ?""", (bignum.info.table_name, kind)).fetchall()
+    digit_count = bignum.info.digit_count
+    if not rows or rows[0][3] < digit_count:
+        return None
+    records:dict[int,dict[int,int]] = {}
+    for digit, length, position, _ in rows:
+        if position + length <= digit_count: # records of a longer file that also lie completely in this one are the same
+            records.setdefault(digit, {})[length] = position
+    return records
+
+def _store(bignum:BigNum, kind:str, records:dict[int,dict[int,int]]):
+    if bignum.info.name == "unknown":
+        return
+    conn = Cache.conn
+    conn.execute(f"""CREATE TABLE IF NOT EXISTS {RUNS_TABLE_NAME} (table_name TEXT, kind TEXT, digit INTEGER, length INTEGER, position INTEGER, covered INTEGER, PRIMARY KEY (table_name, kind, digit, length)) WITHOUT ROWID""")
+    Cache.tables.add(RUNS_TABLE_NAME)
+    conn.execute(f"""DELETE FROM {RUNS_TABLE_NAME} WHERE table_name = ? AND kind = ?""", (bignum.info.table_name, kind))
+    conn.executemany(f"""INSERT INTO {RUNS_TABLE_NAME} VALUES (?, ?, ?, ?, ?, ?)""", [(bignum.info.table_name, kind, digit, length, position, bignum.info.digit_count) for digit, best in records.items() for length, position in best.items()])
+    Cache.commit()
+
+def find_runs(bignum:BigNum, kind:str, shards:int|None = None, workers:int|None = None) -> dict[int,dict[int,int]]:
+    """
+    0 based records of a kind of run ("streak", "up" or "down") as digit value:{length:position}
+    looks in the db first, otherwise the digits get split into shards that are scanned by a pool of threads and the result gets stored
+    shards and workers default like they do for search_file
+    """
+    if kind not in _STEPS:
+        raise ValueError(f"kind has to be one of {', '.join(_STEPS)}, not {kind}")
+    records = _load(bignum, kind)
+    if records is not None:
+        return records
+    end = bignum.info.digit_count
+    workers = workers or Sizes.scan_workers or os.cpu_count() or 1
+    if not shards:
+        shards = min(Sizes.scan_shards or workers, end // MIN_SHARD_SIZE)
+    shards = max(1, min(shards, end))
+    shard_size = max(1, -(-end // shards))
+    bounds = [(start, min(start+shard_size, end)) for start in range(0, end, shard_size)]
+    if len(bounds) > 1:
+        with ThreadPoolExecutor(min(workers, len(bounds))) as pool:
+            parts = list(pool.map(lambda b: _scan(bignum, _STEPS[kind], b[0], b[1], end), bounds))
+    else:
+        parts = [_scan(bignum, _STEPS[kind], 0, end, end)]
+    records = _merge(parts)
+    _store(bignum, kind, records)
+    return records
+
+def _results(bignum:BigNum, records:dict[int,dict[int,int]]) -> dict[bytes,dict[int,int]]:
+    """ digit values -> digits as bytes, positions with the indexing of the search results """
+    one_indexed = Switches.one_indexed
+    notation = b"0123456789abcdef"
+    return {notation[digit:digit+1]:{length:position+one_indexed for length,position in sorted(best.items())} for digit,best in sorted(records.items())}
+
+def find_streaks(bignum:BigNum, shards:int|None = None, workers:int|None = None) -> dict[bytes,dict[int,int]]:
+    """ for every digit the first position of it repeated 1, 2, 3... times up to the longest streak, like {b"9":{1:5, 2:44, ... 6:762}} """
+    return _results(bignum, find_runs(bignum, "streak", shards, workers))
+
+def find_streets(bignum:BigNum, descending:bool = False, shards:int|None = None, workers:int|None = None) -> dict[bytes,dict[int,int]]:
+    """ for every digit the first position of an ascending (or descending) street of 1, 2, 3... digits starting with it, like {b"3":{... 4:position of 3456}} """
+    return _results(bignum, find_runs(bignum, "down" if descending else "up", shards, workers))
@@ -1,7 +1,11 @@
 # var.py - various variables that can change troughout
 
 import json
+from collections import namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
+from typing import Any, Callable, Generator, Generic, TypeVar, overload
 
 from .const import SETTINGS_PATH
 
@@ -10,70 +14,97 @@ This has to be the most fucky-wucky thing i ever did, but it works wonderfully
 This also assuems that the json is strictly only key:val pairs and also fixed keys, however changing attributes in the classes also writes to the json
 In another module you 'from var import Sizes' and then access all attributes while pyright knows the contents since theyre hard coded
 When changing a value in a class, say Sizes.chunk_size=100 it immediatly updates the json aswell
+The json is only read once on import, reading an attribute never touches the disk
+For temporary changes use 'with Switches.override(one_indexed=False):', that only affects the current thread / asyncio task and never writes the json
+Hot paths should take a 'Switches.snapshot()' (or read the attribute once) at the start instead of reading attributes over and over
 """
 
-class _Sizes:
-    first_digits_amount: int
-    pairs_per_insert: int
-
+T = TypeVar("T")
+_REQUIRED = object() # marks settings without default, those have to be in the json
+
+class _Setting(Generic[T]):
+    """ a single setting, reads look at the overrides of the current context first """
+    def __init__(self, cast:Callable[[Any],T], default:Any = _REQUIRED) -> None:
+        self.cast = cast
+        self.default = default
+
+    def __set_name__(self, owner:type, name:str):
+        self.name = name
+
+    @overload
+    def __get__(self, obj:None, objtype:type) -> "_Setting[T]": ...
+    @overload
+    def __get__(self, obj:"_Settings", objtype:type) -> T: ...
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        overrides = obj._overrides.get()
+        if self.name in overrides:
+            return overrides[self.name]
+        return obj._values[self.name]
+
+    def __set__(self, obj:"_Settings", value:T):
+        obj._values[self.name] = self.cast(value)
+        obj.save()
+
+class _Settings:
+    """ common base of the settings groups, values live in memory and assigning one writes the json """
     def __init__(self) -> None:
+        self._settings:dict[str,_Setting] = {name:s for name,s in vars(type(self)).items() if isinstance(s, _Setting)}
         raw = json.loads(SETTINGS_PATH.read_text())
-        object.__setattr__(self, "first_digits_amount", int(raw["first_digits_amount"]))
-        object.__setattr__(self, "pairs_per_insert", int(raw["pairs_per_insert"]))
-
-    def __setattr__(self, name: str, value: object) -> None:
-        object.__setattr__(self, name, value)
-        self._save()
-
-    def _save(self):
-        raw = json.loads(SETTINGS_PATH.read_text())
-        raw.update({
-            "first_digits_amount":self.first_digits_amount,
-            "pairs_per_insert":self.pairs_per_insert,
-        })
-        SETTINGS_PATH.write_text(json.dumps(raw, indent=2))
-
-class _Switches:
-    report_not_found: bool
-    one_indexed: bool
-
-    def __init__(self) -> None:
-        raw = json.loads(SETTINGS_PATH.read_text())
-        object.__setattr__(self, "report_not_found", bool(raw["report_not_found"]))
-        object.__setattr__(self, "one_indexed", bool(raw["one_indexed"]))
-
-    def __setattr__(self, name: str, value: object) -> None:
-        object.__setattr__(self, name, value)
-        self._save()
-
-    def _save(self):
-        raw = json.loads(SETTINGS_PATH.read_text())
-        raw.update({
-            "report_not_found":self.report_not_found,
-            "one_indexed":self.one_indexed,
-        })
-        SETTINGS_PATH.write_text(json.dumps(raw, indent=2))
-
-class _Paths:
-    num_dir: Path
-    sqlite_path: Path
-
-    def __init__(self) -> None:
-        raw = json.loads(SETTINGS_PATH.read_text())
-        object.__setattr__(self, "num_dir", Path(raw["num_dir"]))
-        object.__setattr__(self, "sqlite_path", Path(raw["sqlite_path"]))
-
-    def __setattr__(self, name: str, value: object) -> None:
-        object.__setattr__(self, name, value)
-        self._save()
-
-    def _save(self):
+        self._values:dict[str,Any] = {}
+        for name, setting in self._settings.items():
+            value = raw[name] if setting.default is _REQUIRED else raw.get(name, setting.default)
+            self._values[name] = setting.cast(value)
+        self._overrides:ContextVar[dict[str,Any]] = ContextVar(f"{type(self).__name__}_overrides", default={})
+        self._snapshot = namedtuple(f"{type(self).__name__.strip('_')}Snapshot", self._settings) # type:ignore
+
+    def save(self):
+        """ writes the current values (without overrides) to the json, the other groups in there stay as they are """
         raw = json.loads(SETTINGS_PATH.read_text())
-        raw.update({
-            "num_dir":str(self.num_dir),
-            "sqlite_path":str(self.sqlite_path),
-        })
-        SETTINGS_PATH.write_text(json.dumps(raw, indent=2))
+        raw.update({name:str(value) if isinstance(value, Path) else value for name,value in self._values.items()})
+        tmp = SETTINGS_PATH.with_suffix(".tmp")
+        tmp.write_text(json.dumps(raw, indent=2))
+        tmp.replace(SETTINGS_PATH) # readers never see a half written file
+
+    def stored(self, name:str) -> Any:
+        """ value of a setting as it is in the json, ignoring overrides """
+        return self._values[name]
+
+    def snapshot(self):
+        """ immutable copy of all current values with overrides applied """
+        return self._snapshot(**{**self._values, **self._overrides.get()})
+
+    @contextmanager
+    def override(self, **values) -> Generator[None]:
+        """ temporarily changes settings for the current thread / asyncio task only, nothing gets written """
+        unknown = values.keys() - self._settings.keys()
+        if unknown:
+            raise AttributeError(f"{type(self).__name__.strip('_')} has no setting {', '.join(unknown)}")
+        token = self._overrides.set({**self._overrides.get(), **{name:self._settings[name].cast(value) for name,value in values.items()}})
+        try:
+            yield
+        finally:
+            self._overrides.reset(token)
+
+class _Sizes(_Settings):
+    first_digits_amount = _Setting(int)
+    pairs_per_insert = _Setting(int)
+    scan_shards = _Setting(int, 0) # amount of shards a file scan is split into, 0 means one per worker
+    scan_workers = _Setting(int, 0) # amount of threads scanning shards, 0 means one per cpu core
+    index_digits = _Setting(int, 10**8) # amount of digits a suffix index covers by default
+    async_file_scans = _Setting(int, 1) # file scans of asearch that run at once per file
+    async_disk_scans = _Setting(int, 2) # file scans of asearch that run at once per disk
+
+class _Switches(_Settings):
+    report_not_found = _Setting(bool)
+    one_indexed = _Setting(bool)
+
+class _Paths(_Settings):
+    num_dir = _Setting(Path)
+    sqlite_path = _Setting(Path)
+    hs_cache_dir = _Setting(Path, "hyperscan_cache") # where compiled hyperscan databases get serialized to
+    index_dir = _Setting(Path, "suffix_index") # where suffix indexes get stored
 
 Sizes = _Sizes()
 Switches = _Switches()
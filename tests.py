@@ -1,11 +1,27 @@
 # tests.py - various unittests
 
+import asyncio
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
 import unittest
+from itertools import product
 from pathlib import Path
 
-from irranalyze import BigNum, build_db
+import numpy as np
+
+from irranalyze import BigNum, BlockedBigNum, build_db, get_all, get_one, search_many
 from irranalyze.var import Paths, Sizes, Switches
-from irranalyze.convert import hex_to_dec, ycd_to_str, str_to_ycd
+from irranalyze.cache import Cache
+from irranalyze.search import search_file
+from irranalyze import hscache, index, kmer, catalog, streaks, stats, bignum, fileconvert, asearch
+from irranalyze.const import STATS_TABLE_NAME, IDENTIFY_TABLE_NAME
+from irranalyze.identify import identify
+from irranalyze.convert import base_convert, frac_convert_gen, txt_to_num_regex, hex_to_dec, ycd_to_str, str_to_ycd, txt_to_num_all, ycd_to_str_gen, digits_to_ycd_gen
 
 """
 To run these tests you need to have 4 number files ready, all pi, 2 hex, 2 dec, of which 2 are txt and 2 are ydc, all must be 1b decimal digits exactly
@@ -90,6 +106,9 @@ TRUTHS_PI_DEC_TXT = TRUTHS_PI_DEC_TXT_ALL if REAL_FILES else TRUTHS_PI_DEC_TXT_S
 
 
 def reset_db():
+    Cache.close() # the last connection checkpoints the -wal, it must not be replayed onto the replacement
+    for suffix in ("-wal", "-shm"):
+        Paths.sqlite_path.with_name(Paths.sqlite_path.name + suffix).unlink(missing_ok=True)
     Paths.sqlite_path.unlink()
     IDENTIFY_DB_PATH.copy(Paths.sqlite_path)
 
@@ -173,6 +192,111 @@ class TestSubsript(unittest.TestCase):
         self.assertEqual(pi[40_000_000:40_000_005], b"79147")
 
 
+class TestSubscriptYcd(unittest.TestCase):
+    """ SUBSCRIPT YCD """
+    def setUp(self) -> None:
+        reset_db()
+        self.addCleanup(setattr, Switches, "one_indexed", Switches.one_indexed)
+
+    def test_digits(self):
+        for path_txt, path_ycd in ((PATH_PI_DEC_TXT, PATH_PI_DEC_YCD), (PATH_PI_HEX_TXT, PATH_PI_HEX_YCD)):
+            pi_txt, pi_ycd = BigNum(path_txt), BigNum(path_ycd)
+            size = pi_txt.info.digit_count # the ycd files hold a few more
+            for one_indexed in (False, True):
+                Switches.one_indexed = one_indexed
+                for i in (0, 1, 18, 19, 20, 333, size-1):
+                    self.assertEqual(pi_ycd[i], pi_txt[i])
+                for s in (slice(None, 10), slice(5, 40, 3), slice(17, size), slice(size-30, size-2), slice(40, 2, -3), slice(0, 1)):
+                    self.assertEqual(pi_ycd[s], pi_txt[s])
+            self.assertEqual(pi_ycd[-1], pi_ycd[pi_ycd.info.digit_count - 1 + Switches.one_indexed])
+            self.assertEqual(b"".join(pi_ycd)[:size], b"".join(pi_txt))
+            with self.assertRaises(IndexError):
+                pi_ycd[pi_ycd.info.digit_count + 1]
+
+    def test_blocks(self):
+        pi = BigNum(PATH_PI_DEC_YCD)
+        self.addCleanup(setattr, bignum, "YCD_ACCESS_BLOCK", bignum.YCD_ACCESS_BLOCK)
+        bignum.YCD_ACCESS_BLOCK = 2 # 38 digits per block
+        digits = pi._ycd_digits(0, pi.info.digit_count)
+        for start in range(0, 200, 7):
+            self.assertEqual(pi._ycd_digits(start, start+50), digits[start:start+50])
+        self.assertLessEqual(len(pi._blocks), bignum.YCD_CACHE_BLOCKS)
+        self.assertEqual(pi._ycd_digits(0, 38*20), digits[:38*20]) # more than the lru holds
+
+
+class TestBlockedYcd(unittest.TestCase):
+    """ MULTI BLOCK YCD """
+    def setUp(self) -> None:
+        reset_db()
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+        header, data = PI_DEC_YCD.split(b"EndHeader\r\n\r\n\x00")
+        header = header.replace(b"Blocksize:\t1000000000", b"Blocksize:\t152")
+        self.block_count = -(-len(data) // 64) # 8 words = 152 digits per block
+        for block in range(self.block_count):
+            block_header = header.replace(b"BlockID:\t0", f"BlockID:\t{block}".encode())
+            (self.tmp / f"Pi - Dec - Chudnovsky - {block}.ycd").write_bytes(block_header + b"EndHeader\r\n\r\n\x00" + data[block*64:(block+1)*64])
+        self.pi = BigNum(PATH_PI_DEC_YCD)
+
+    def test_digits(self):
+        pi_blocks = BlockedBigNum(self.tmp / "Pi - Dec - Chudnovsky - 0.ycd")
+        self.assertEqual(len(pi_blocks.blocks), self.block_count)
+        self.assertEqual(pi_blocks.info.digit_count, self.pi.info.digit_count)
+        for i in (0, 1, 151, 152, 153, 500, -1):
+            self.assertEqual(pi_blocks[i], self.pi[i])
+        for s in (slice(None, 10), slice(140, 170), slice(100, 900, 7), slice(300, 140, -1)):
+            self.assertEqual(pi_blocks[s], self.pi[s])
+        self.assertEqual(b"".join(pi_blocks), b"".join(self.pi))
+
+    def test_search(self):
+        pi_blocks = BlockedBigNum(self.tmp / "Pi - Dec - Chudnovsky - 0.ycd")
+        digits = self.pi._ycd_digits(0, self.pi.info.digit_count)
+        patterns = [digits[148:156], digits[300:310], digits[600:612], b"999999"] # the first two cross a block border
+        self.assertEqual(search_file(pi_blocks, patterns), search_file(self.pi, patterns))
+        self.assertEqual(list(pi_blocks.find_all(b"26")), list(self.pi.find_all(b"26")))
+        self.assertEqual(pi_blocks.count(b"1"), self.pi.count(b"1"))
+
+    def test_get_all(self):
+        nums = get_all(num_dir=self.tmp)
+        self.assertEqual(len(nums), 1)
+        self.assertIsInstance(nums[0], BlockedBigNum)
+        self.assertEqual(nums[0].info.name, "pi")
+        (self.tmp / "Pi - Dec - Chudnovsky - 3.ycd").unlink() # the set ends at the first missing block
+        self.assertEqual(len(BlockedBigNum(self.tmp / "Pi - Dec - Chudnovsky - 0.ycd").blocks), 3)
+
+
+class TestFileConvert(unittest.TestCase):
+    """ TXT <-> YCD FILES """
+    def setUp(self) -> None:
+        reset_db()
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.addCleanup(setattr, fileconvert, "YCD_CODEC_BLOCK", fileconvert.YCD_CODEC_BLOCK)
+        fileconvert.YCD_CODEC_BLOCK = 3 # many small chunks, so the order of the pool results matters
+
+    def test_txt_to_ycd(self):
+        for path_txt in (PATH_PI_DEC_TXT, PATH_PI_HEX_TXT):
+            pi_txt = BigNum(path_txt)
+            digits = pi_txt.mmap[pi_txt.info.radix_pos+1:]
+            path, = pi_txt.to_ycd(self.tmp / "pi.ycd", workers=2)
+            pi_ycd = BigNum(path)
+            self.assertEqual((pi_ycd.info.name, pi_ycd.info.base, pi_ycd.info.digit_count), ("pi", pi_txt.info.base, pi_txt.info.digit_count))
+            self.assertEqual(b"".join(pi_ycd), digits)
+            paths = pi_txt.to_ycd(self.tmp / "pi - 0.ycd", block_digits=100)
+            self.assertEqual(len(paths), -(-len(digits) // 100))
+            pi_blocks = BlockedBigNum(paths[0])
+            self.assertEqual(pi_blocks.info.digit_count, len(digits))
+            self.assertEqual(b"".join(pi_blocks), digits)
+            with self.assertRaises(ValueError):
+                pi_txt.to_ycd(self.tmp / "pi.ycd", block_digits=100)
+
+    def test_ycd_to_txt(self):
+        for path_txt, path_ycd in ((PATH_PI_DEC_TXT, PATH_PI_DEC_YCD), (PATH_PI_HEX_TXT, PATH_PI_HEX_YCD)):
+            pi_txt, pi_ycd = BigNum(path_txt), BigNum(path_ycd)
+            path = pi_ycd.to_txt(self.tmp / "pi.txt", pi_txt.info.digit_count, workers=2)
+            self.assertEqual(path.read_bytes(), path_txt.read_bytes())
+
+
 class TestSearch(unittest.TestCase):
     """ SEARCH """
     def setUp(self) -> None:
@@ -209,6 +333,622 @@ class TestSearch(unittest.TestCase):
             self.assertEqual(pi[pat.encode()], pos)
 
 
+
+    # --- SHARDED FILE SCAN ---
+    def test_search_file_sharded(self):
+        pi = BigNum(PATH_PI_DEC_TXT)
+        patterns = [pat.encode() for pat in TRUTHS_PI_DEC_TXT]
+        single = search_file(pi, patterns, shards=1)
+        for shards in (2, 7, 64):
+            self.assertEqual(search_file(pi, patterns, shards=shards, workers=4), single)
+
+    # --- PARTIAL RESULTS ---
+    def test_search_on_match(self):
+        pi = BigNum(PATH_PI_DEC_TXT)
+        patterns = [pat.encode() for pat in TRUTHS_PI_DEC_TXT] + [b"0123456789"]
+        for shards in (1, 7):
+            reported = {}
+            positions = search_file(pi, patterns, shards=shards, on_match=reported.__setitem__)
+            self.assertEqual(reported, positions)
+            self.assertEqual(positions[b"0123456789"], -1)
+
+    def test_search_iter(self):
+        pi = BigNum(PATH_PI_DEC_TXT)
+        patterns = list(TRUTHS_PI_DEC_TXT)
+        pi[patterns[:3]] # some are in the db already
+        streamed = dict(pi.search_iter(patterns))
+        self.assertEqual(streamed, pi[patterns])
+
+    # --- YCD ---
+    def test_search_ycd(self):
+        for path_txt, path_ycd in ((PATH_PI_DEC_TXT, PATH_PI_DEC_YCD), (PATH_PI_HEX_TXT, PATH_PI_HEX_YCD)):
+            pi_txt, pi_ycd = BigNum(path_txt), BigNum(path_ycd)
+            digits = pi_txt.mmap[pi_txt.info.radix_pos+1:]
+            patterns = [digits[i:i+n] for i in (0, 1, 15, 16, 18, 19, 20, 37, 333) for n in (1, 3, 8)] + [b"999999"]
+            self.assertEqual(search_file(pi_ycd, patterns), search_file(pi_txt, patterns))
+            self.assertEqual(pi_ycd[patterns], pi_txt[patterns])
+            self.assertEqual(list(pi_ycd.find_all(b"26", 17, 900)), list(pi_txt.find_all(b"26", 17, 900)))
+            self.assertEqual(pi_ycd.count(b"1", 0, pi_txt.info.digit_count), pi_txt.count(b"1"))
+
+    # --- MANY FILES ---
+    def test_search_many(self):
+        nums = [BigNum(path) for path in (PATH_PI_DEC_TXT, PATH_PI_HEX_TXT, PATH_PI_DEC_YCD, PATH_PI_HEX_YCD)]
+        patterns = [b"14159", b"243f", b"999999", b"0", b"ffff"]
+        nums[0][patterns[:2]] # some are in the db already
+        expected = {num:search_file(num, patterns) for num in nums}
+        for _ in range(2): # scanned, then answered from the db
+            self.assertEqual(search_many(nums + nums[:1], patterns, workers=3), expected)
+        with Switches.override(one_indexed=not Switches.one_indexed):
+            shift = 1 if Switches.one_indexed else -1
+            self.assertEqual(search_many(nums, patterns)[nums[0]], {pat:pos+shift if pos > -1 else pos for pat,pos in expected[nums[0]].items()})
+
+    # --- QUERY TYPES ---
+    def test_search_query(self):
+        pi = BigNum(PATH_PI_DEC_TXT)
+        self.assertEqual(pi["3.14"], -1) # the dot is not a wildcard
+        self.assertEqual(pi.find("1?159", "wildcard"), pi["14159"])
+        self.assertEqual(pi.find(["?6535", "9?9?9?"], "wildcard"), {b"?6535":pi["26535"], b"9?9?9?":search_file(pi, [b"9[0-9]9[0-9]9[0-9]"], query="regex")[b"9[0-9]9[0-9]9[0-9]"]})
+        self.assertEqual(pi.find("1[0-9]159", "regex"), pi["14159"])
+        self.assertEqual(pi.find(b"(265|979)3", "regex"), min(pi["2653"], pi["9793"]))
+        self.assertEqual(pi.find(b"99+", "regex"), pi["99"]) # unknown match length
+        self.assertEqual(search_file(pi, [b"1415926|5"], query="regex")[b"1415926|5"], pi["1415926"]) # the leftmost match ends after a shorter one
+        for shards in (1, 3, 16):
+            self.assertEqual(search_file(pi, [b"1415926|5", b"9(9|8)+"], shards=shards, query="regex"), {b"1415926|5":pi["1415926"], b"9(9|8)+":min(pi["99"], pi["98"])})
+        self.assertEqual(Cache.lookup(pi.info.table_name, b"1?159"), None) # every query type has its own table
+        self.assertEqual(Cache.lookup(f"{pi.info.table_name}_wildcard", b"1?159"), 0)
+        self.assertEqual(pi.find("1?159", "wildcard"), pi["14159"]) # from the db
+        with self.assertRaises(ValueError):
+            pi.find("1", "glob")
+
+    # --- WORDS ---
+    def test_search_words(self):
+        pi = BigNum(PATH_PI_DEC_TXT)
+        words = ["pi", "cat", "zz", "Ok", "number"]
+        expected = {}
+        for word in words: # the slow way, every spelling on its own
+            variants = list(txt_to_num_all(word.lower().encode()))
+            found = sorted((pos, var) for var,pos in search_file(pi, variants).items() if pos > -1)
+            expected[word.lower().encode()] = (found[0][1], found[0][0]) if found else (b"", -1)
+        self.assertEqual(pi.find_words(words), expected)
+        self.assertEqual(pi.find_words(words), expected) # from the db now
+        self.assertLessEqual(Cache.conn.execute(f'SELECT COUNT(*) FROM "{pi.info.table_name}_words"').fetchone()[0], len(words))
+        self.assertEqual(txt_to_num_regex("az"), b"(00|26|52|78)(25|51|77)")
+        with self.assertRaises(ValueError):
+            pi.find_words(["n0pe"])
+
+
+class TestAsearch(unittest.TestCase):
+    """ ASYNC SEARCH """
+    def setUp(self) -> None:
+        reset_db()
+        self.scans = []
+        self.running = [0, 0] # now, most at once
+        self.addCleanup(setattr, asearch, "search", asearch.search)
+        search = asearch.search
+        def counting(*args):
+            self.scans.append(args[1])
+            self.running[0] += 1
+            self.running[1] = max(self.running)
+            try:
+                time.sleep(0.05) # long enough for the other requests to pile up
+                return search(*args)
+            finally:
+                self.running[0] -= 1
+        asearch.search = counting
+
+    def test_results(self):
+        pi = BigNum(PATH_PI_DEC_TXT)
+        patterns = list(TRUTHS_PI_DEC_TXT)
+        positions = asyncio.run(pi.asearch(patterns))
+        self.assertEqual(positions, {pat.encode():pos - 1 + Switches.one_indexed for pat,pos in TRUTHS_PI_DEC_TXT.items()})
+        self.assertEqual(asyncio.run(pi.asearch(patterns[0])), positions[patterns[0].encode()])
+        self.assertEqual(asyncio.run(pi.asearch(b"1?1", query="wildcard")), pi.find(b"1?1", query="wildcard"))
+        scans = len(self.scans)
+        asyncio.run(pi.asearch(patterns)) # all in the db now
+        self.assertEqual(len(self.scans), scans)
+
+    def test_coalescing(self):
+        pi = BigNum(PATH_PI_DEC_TXT)
+        async def requests():
+            return await asyncio.gather(pi.asearch(b"999999"), pi.asearch([b"999999", b"2384"]), pi.asearch(b"999999"))
+        single, multi, again = asyncio.run(requests())
+        self.assertEqual(single, again)
+        self.assertEqual(multi[b"999999"], single)
+        self.assertEqual(sorted(p for scan in self.scans for p in scan), [b"2384", b"999999"]) # every pattern scanned once
+
+    def test_limits(self):
+        pi = BigNum(PATH_PI_DEC_TXT)
+        async def requests(patterns:list[bytes], **limits):
+            with Sizes.override(**limits):
+                return await asyncio.gather(*(pi.asearch(pattern) for pattern in patterns))
+        asyncio.run(requests([b"3333", b"4444", b"5555", b"6666"], async_file_scans=1))
+        self.assertEqual((len(self.scans), self.running[1]), (4, 1))
+        self.running[1] = 0
+        positions = asyncio.run(requests([b"7777", b"8888", b"0000", b"1212"], async_file_scans=4, async_disk_scans=2)) # a new loop gets new limits
+        self.assertEqual((len(self.scans), self.running[1]), (8, 2))
+        self.assertEqual(positions, [pi.find(pattern) for pattern in (b"7777", b"8888", b"0000", b"1212")]) # stored by scans running side by side
+
+
+class TestFindAll(unittest.TestCase):
+    """ FIND ALL """
+    def setUp(self) -> None:
+        reset_db()
+        self.addCleanup(setattr, Switches, "one_indexed", Switches.one_indexed)
+
+    def truth(self, pi:BigNum, pattern:bytes) -> list[int]:
+        digits = pi.mmap[pi.info.radix_pos+1:]
+        return [i+Switches.one_indexed for i in range(len(digits)) if digits.startswith(pattern, i)]
+
+    def test_find_all(self):
+        for one_indexed in (False, True):
+            reset_db()
+            Switches.one_indexed = one_indexed
+            pi = BigNum(PATH_PI_DEC_TXT)
+            for pattern in (b"1", b"11", b"14159", b"999999"):
+                self.assertEqual(list(pi.find_all(pattern)), self.truth(pi, pattern))
+            self.assertEqual(next(pi.find_all("14159")), pi["14159"])
+
+    def test_find_all_bounds(self):
+        Switches.one_indexed = True
+        pi = BigNum(PATH_PI_DEC_TXT)
+        truth = [p for p in self.truth(pi, b"26") if 100 <= p and p+2 <= 600]
+        self.assertEqual(list(pi.find_all("26", 100, 600)), truth)
+
+    def test_find_all_chunked(self):
+        pi = BigNum(PATH_PI_DEC_TXT)
+        chunks = list(pi.find_all(b"5", chunked=True))
+        self.assertTrue(all(c.dtype == np.uint64 for c in chunks))
+        self.assertEqual(np.concatenate(chunks).tolist(), self.truth(pi, b"5"))
+
+    def test_count(self):
+        pi = BigNum(PATH_PI_DEC_TXT)
+        for pattern in (b"1", b"11", b"111", b"26", b"999999"):
+            self.assertEqual(pi.count(pattern), len(self.truth(pi, pattern)))
+        self.assertEqual(pi.count("26", 100, 600), len(list(pi.find_all("26", 100, 600))))
+
+
+class TestSuffixIndex(unittest.TestCase):
+    """ SUFFIX INDEX """
+    def setUp(self) -> None:
+        reset_db()
+        self.addCleanup(index.clear)
+        self.addCleanup(shutil.rmtree, Paths.index_dir, True)
+
+    def test_find(self):
+        self.addCleanup(setattr, index, "INDEX_RMQ_BLOCK", index.INDEX_RMQ_BLOCK)
+        index.INDEX_RMQ_BLOCK = 4 # so the range minimum table gets used for more than the single digits
+        for path in (PATH_PI_DEC_TXT, PATH_PI_HEX_TXT, PATH_PI_DEC_YCD):
+            pi = BigNum(path)
+            digits = ycd_to_str(pi.mmap[pi.info.radix_pos+1:], pi.info.base).encode() if pi.info.format == "ycd" else pi.mmap[pi.info.radix_pos+1:]
+            idx = index.build_index(pi)
+            self.assertEqual(idx.size, pi.info.digit_count)
+            self.assertEqual(idx.suffixes.tolist(), sorted(range(len(digits)), key=lambda i:digits[i:]))
+            for i in range(0, len(digits)-20, 37):
+                for n in (1, 4, 9, 20):
+                    self.assertEqual(idx.find(digits[i:i+n]), digits.find(digits[i:i+n]))
+            self.assertIsNone(idx.find(b"9"*30))
+            self.assertEqual(index.SuffixIndex(idx.digits, idx.suffixes).minima.tolist(), idx.minima.tolist()) # same as the stored one
+
+    def test_search(self):
+        pi = BigNum(PATH_PI_DEC_TXT)
+        index.build_index(pi, 500)
+        patterns = list(TRUTHS_PI_DEC_TXT)
+        positions = pi[patterns] # some in the index, the others are scanned for after it
+        for pat,pos in TRUTHS_PI_DEC_TXT.items():
+            self.assertEqual(positions[pat.encode()], pos - 1 + Switches.one_indexed)
+            reset_db()
+            self.assertEqual(pi[pat], pos - 1 + Switches.one_indexed)
+
+class TestKmerTable(unittest.TestCase):
+    """ KMER TABLE """
+    def setUp(self) -> None:
+        reset_db()
+        self.addCleanup(kmer.clear)
+        self.addCleanup(shutil.rmtree, Paths.index_dir, True)
+
+    def test_find(self):
+        self.addCleanup(setattr, kmer, "KMER_CHUNK", kmer.KMER_CHUNK)
+        kmer.KMER_CHUNK = 97 # earlier chunks have to win over later ones
+        for path in (PATH_PI_DEC_TXT, PATH_PI_HEX_TXT, PATH_PI_HEX_YCD):
+            pi = BigNum(path)
+            digits = ycd_to_str(pi.mmap[pi.info.radix_pos+1:], pi.info.base).encode() if pi.info.format == "ycd" else pi.mmap[pi.info.radix_pos+1:]
+            table = kmer.build_kmer_table(pi, 4)
+            self.assertEqual(table.size, len(digits))
+            for pattern in map(bytes, product(b"0123456789abcdef"[:pi.info.base], repeat=2)):
+                found = digits.find(pattern)
+                self.assertEqual(table.find(pattern), None if found == -1 else found)
+            for i in range(0, len(digits), 13):
+                self.assertEqual(table.find(digits[i:i+4]), digits.find(digits[i:i+4]))
+            self.assertIsNone(table.find(b"12345"))
+            self.assertIsNone(table.find(b"1_2"))
+
+    def test_search(self):
+        pi = BigNum(PATH_PI_DEC_TXT)
+        kmer.build_kmer_table(pi, 3, 500)
+        for pat,pos in TRUTHS_PI_DEC_TXT.items():
+            reset_db()
+            self.assertEqual(pi[pat], pos - 1 + Switches.one_indexed)
+        self.assertEqual(pi[list(TRUTHS_PI_DEC_TXT)], {pat.encode():pos - 1 + Switches.one_indexed for pat,pos in TRUTHS_PI_DEC_TXT.items()})
+
+class TestBuildDb(unittest.TestCase):
+    """ BUILD DB """
+    def setUp(self) -> None:
+        reset_db()
+
+    def test_build_one(self):
+        for path in (PATH_PI_DEC_TXT, PATH_PI_HEX_YCD):
+            pi = BigNum(path)
+            digits = ycd_to_str(pi.mmap[pi.info.radix_pos+1:], pi.info.base).encode() if pi.info.format == "ycd" else pi.mmap[pi.info.radix_pos+1:]
+            pi[b"14"] # table exists already, the rest gets added
+            conn = Cache.conn
+            rows = build_db.build_one(10**6, 4, pi, verbose=False)
+            self.assertIs(Cache.conn, conn) # the cache keeps its connection
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            patterns = {digits[i:i+n] for i in range(len(digits)) for n in range(1, 5) if i+n <= len(digits)}
+            self.assertEqual(rows, len(patterns))
+            self.assertEqual(Cache.lookup_many(pi.info.table_name, list(patterns)), {pat:digits.find(pat) for pat in patterns}) # stored 0 based
+
+    def test_build_many(self):
+        self.addCleanup(setattr, build_db, "BUILD_CHUNK", build_db.BUILD_CHUNK)
+        build_db.BUILD_CHUNK = 97 # lots of chunks with borders everywhere
+        nums = [BigNum(PATH_PI_DEC_TXT), BigNum(PATH_PI_HEX_YCD)]
+        nums[0][b"999999"] # already recorded, stays
+        Cache.insert(nums[0].info.table_name, [(b"2", -1), (b"77", 10**6)]) # reported as not found or too far, gets fixed
+        rows = build_db.build_many(10**6, 3, nums, workers=2, verbose=False)
+        for pi in nums:
+            digits = ycd_to_str(pi.mmap[pi.info.radix_pos+1:], pi.info.base).encode() if pi.info.format == "ycd" else pi.mmap[pi.info.radix_pos+1:]
+            patterns = {digits[i:i+n] for i in range(len(digits)) for n in range(1, 4) if i+n <= len(digits)}
+            self.assertEqual(rows[pi.info.table_name], len(patterns))
+            self.assertEqual(Cache.lookup_many(pi.info.table_name, list(patterns)), {pat:digits.find(pat) for pat in patterns}) # stored 0 based
+        self.assertEqual(Cache.lookup(nums[0].info.table_name, b"999999") + Switches.one_indexed, nums[0][b"999999"]) # type:ignore
+
+    def test_build_identifier_incremental(self):
+        tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, tmp)
+        for name in ("_CONSTANTS", "_INPUTS", "_FUNCTIONS", "_FUNCTIONS2", "_evaluate"):
+            self.addCleanup(setattr, build_db, name, getattr(build_db, name))
+        build_db._CONSTANTS = {name:build_db._CONSTANTS[name] for name in ("pi", "e", "tau")}
+        build_db._INPUTS = {name:build_db._INPUTS[name] for name in ("2", "1/3", "root2")}
+        build_db._FUNCTIONS = {"sqrt":build_db._FUNCTIONS["sqrt"]}
+        build_db._FUNCTIONS2 = {"pow":build_db._FUNCTIONS2["pow"]}
+        evaluated = []
+        evaluate = build_db._evaluate
+        build_db._evaluate = lambda expression: evaluated.append(expression) or evaluate(expression)
+        with Paths.override(sqlite_path=tmp / "identify.sqlite"):
+            build_db.build_identifier(workers=1)
+            self.assertEqual(len(evaluated), 3 + 3 + 9)
+            BigNum(PATH_PI_DEC_TXT) # goes into the catalog
+            build_db._INPUTS["3"] = lambda: 3
+            build_db.build_identifier(workers=1)
+            self.assertEqual(len(evaluated), 15 + 1 + 7) # sqrt(3), pow(3,x) and pow(x,3)
+            self.assertEqual(Cache.conn.execute("SELECT COUNT(*) FROM catalog").fetchone()[0], 0) # identified with the old table
+            conn = sqlite3.connect(tmp / "identify.sqlite")
+            names = dict(conn.execute(f"SELECT name, hash FROM {IDENTIFY_TABLE_NAME}").fetchall())
+            conn.close()
+        self.assertEqual(names["pi"], hashlib.md5(b"3.14159265358979323846264338327950288419716939937510582097494459230781640628620899862803482534211706").digest())
+        self.assertIn("sqrt(3)", names)
+        self.assertNotIn("pow(2,2)", names) # integers dont name anything
+        self.assertNotIn("pow(root2,2)", names)
+
+    def test_first_occurrences(self):
+        digits = np.frombuffer(b"31415926535897932384626433", dtype=np.uint8)
+        keys, positions = build_db.first_occurrences(digits, 10, 3, offset=100, amount_starts=20)
+        self.assertEqual(keys.tolist(), sorted(keys.tolist()))
+        truth = {digits[i:i+n].tobytes():i+100 for i in range(19, -1, -1) for n in range(1, 4)}
+        self.assertEqual(dict(zip(keys.tolist(), positions.tolist())), truth)
+
+class TestStreaks(unittest.TestCase):
+    """ STREAKS AND STREETS """
+    def setUp(self) -> None:
+        reset_db()
+
+    def expected(self, digits:bytes, step:int) -> dict[bytes,dict[int,int]]:
+        notation = b"0123456789abcdef"
+        records = {}
+        for d in range(16):
+            for length in range(1, 40):
+                values = [d + step*i for i in range(length)]
+                if not all(0 <= v < 16 for v in values):
+                    break
+                position = digits.find(bytes(notation[v] for v in values))
+                if position == -1:
+                    break
+                records.setdefault(notation[d:d+1], {})[length] = position + Switches.one_indexed
+        return records
+
+    def test_streaks_streets(self):
+        for path in (PATH_PI_DEC_TXT, PATH_PI_HEX_YCD):
+            num = BigNum(path)
+            digits = num.read_digits(num.info.digit_count).tobytes()
+            self.assertEqual(num.find_streaks(), self.expected(digits, 0))
+            self.assertEqual(num.find_streets(), self.expected(digits, 1))
+            self.assertEqual(num.find_streets(descending=True), self.expected(digits, -1))
+            self.assertEqual(streaks._merge([streaks._scan(num, 1, start, min(start+97, len(digits)), len(digits)) for start in range(0, len(digits), 97)]), streaks._scan(num, 1, 0, len(digits), len(digits)))
+
+    def test_stored(self):
+        pi = BigNum(PATH_PI_DEC_TXT)
+        records = pi.find_streaks()
+        self.addCleanup(setattr, streaks, "_scan", streaks._scan)
+        streaks._scan = None # type:ignore # has to come from the db now
+        self.assertEqual(pi.find_streaks(), records)
+
+
+class TestStats(unittest.TestCase):
+    """ STATISTICS """
+    def setUp(self) -> None:
+        reset_db()
+        self.addCleanup(setattr, stats, "STATS_BLOCK", stats.STATS_BLOCK)
+        stats.STATS_BLOCK = 97 # a few stored blocks even for the small files
+
+    def expected(self, digits:bytes, base:int, n:int) -> np.ndarray:
+        counts = np.zeros(base**n, dtype=np.uint64)
+        for i in range(len(digits)-n+1):
+            counts[int(digits[i:i+n], base)] += 1
+        return counts
+
+    def test_histogram(self):
+        for path in (PATH_PI_DEC_TXT, PATH_PI_HEX_YCD):
+            num = BigNum(path)
+            digits = num.read_digits(num.info.digit_count).tobytes()
+            for n in (1, 2, 3):
+                np.testing.assert_array_equal(stats.histogram(num, n), self.expected(digits, num.info.base, n))
+                np.testing.assert_array_equal(stats.histogram(num, n, 50, 333), self.expected(digits[50:333], num.info.base, n))
+            blocks = stats.histogram(num, 2, 10, 500, block=100)
+            self.assertEqual(blocks.shape, (5, num.info.base**2))
+            np.testing.assert_array_equal(blocks[-1], self.expected(digits[410:500], num.info.base, 2))
+            with self.assertRaises(ValueError):
+                stats.histogram(num, 5)
+
+    def test_stored(self):
+        pi = BigNum(PATH_PI_DEC_TXT)
+        counts = pi.histogram(2)
+        self.assertGreater(Cache.conn.execute(f"SELECT COUNT(*) FROM {STATS_TABLE_NAME}").fetchone()[0], 0)
+        calls = []
+        count = stats._count
+        self.addCleanup(setattr, stats, "_count", count)
+        stats._count = lambda *args: calls.append(args[2:]) or count(*args) # type:ignore
+        np.testing.assert_array_equal(pi.histogram(2), counts)
+        self.assertTrue(all(stop - start < stats.STATS_BLOCK for start, stop in calls)) # only the ends, the blocks come from the db
+        with Switches.override(one_indexed=True):
+            self.assertEqual(pi.histogram(1, 1, 11).tolist(), [0, 2, 1, 1, 1, 3, 1, 0, 0, 1]) # 1415926535
+        with Switches.override(one_indexed=False):
+            self.assertEqual(pi.histogram(1, 1, 11).tolist(), [0, 1, 1, 1, 1, 3, 1, 0, 1, 1]) # 4159265358
+
+    def test_chi_square(self):
+        statistic, p = stats.chi_square(np.array([10, 10, 10, 10]))
+        self.assertEqual((statistic, p), (0.0, 1.0))
+        statistic, p = stats.chi_square(np.array([[100, 0], [50, 50]]))
+        self.assertEqual(statistic.tolist(), [100.0, 0.0]) # type:ignore
+        self.assertLess(p[0], 1e-20) # type:ignore
+
+
+class TestCatalog(unittest.TestCase):
+    """ CATALOG """
+    def setUp(self) -> None:
+        reset_db()
+        self.identified = []
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.addCleanup(setattr, catalog, "identify", catalog.identify)
+        catalog.identify = lambda path: self.identified.append(path) or identify(path)
+
+    def test_identify_once(self):
+        BigNum(PATH_PI_DEC_TXT)
+        pi = BigNum(PATH_PI_DEC_TXT)
+        self.assertEqual(self.identified, [PATH_PI_DEC_TXT])
+        self.assertEqual(pi.info, identify(PATH_PI_DEC_TXT))
+        self.assertIsNone(pi._mmap) # nothing opened yet
+
+    def test_changed_file(self):
+        path = self.tmp_dir / "changed.txt"
+        pi = BigNum(PATH_PI_DEC_TXT)
+        path.write_bytes(pi.mmap[:500])
+        self.assertEqual(BigNum(path).info.file_size, 500)
+        path.write_bytes(pi.mmap[:600])
+        self.assertEqual(BigNum(path).info.file_size, 600)
+        self.assertEqual(self.identified, [PATH_PI_DEC_TXT, path, path])
+
+    def test_get_all(self):
+        num_dir = self.tmp_dir
+        for i, path in enumerate((PATH_PI_DEC_TXT, PATH_PI_HEX_TXT, PATH_PI_DEC_YCD, PATH_PI_HEX_YCD)):
+            shutil.copy(path, num_dir / f"{i}.{'ycd' if 'ycd' in path.name.lower() else 'txt'}")
+        (num_dir / "notes.txt").write_text("not a number")
+        self.assertEqual(len(get_all(num_dir=num_dir)), 4)
+        self.assertEqual([n.info.format for n in get_all(base=16, num_dir=num_dir)], ["txt", "ycd"])
+        self.assertEqual(get_one("pi", 10, "ycd", num_dir=num_dir).info.table_name, "pi_10_ycd")
+        self.identified.clear()
+        get_all(num_dir=num_dir)
+        self.assertEqual(self.identified, []) # nothing changed
+        (num_dir / "1.txt").unlink()
+        self.assertEqual(len(get_all(num_dir=num_dir)), 3)
+
+    def test_find_from_catalog(self):
+        num_dir = self.tmp_dir
+        shutil.copy(PATH_PI_DEC_TXT, num_dir / "pi.txt")
+        os.utime(num_dir, ns=(0, 0)) # old enough for the mtime to be trusted
+        self.assertEqual([info.path for info in catalog.Catalog.find(num_dir)], [num_dir / "pi.txt"])
+        calls = []
+        self.addCleanup(delattr, catalog.Catalog, "scan")
+        catalog.Catalog.scan = lambda *args: calls.append(args) or catalog._Catalog.scan(catalog.Catalog, *args) # type:ignore
+        self.assertEqual(len(catalog.Catalog.find(num_dir, "pi")), 1)
+        self.assertEqual(calls, []) # nothing changed, answered from the catalog
+        catalog.Catalog.find(num_dir, rescan=True)
+        self.assertEqual(len(calls), 1)
+        shutil.copy(PATH_PI_HEX_TXT, num_dir / "pi_hex.txt") # changes the mtime of num_dir
+        self.assertEqual(len(catalog.Catalog.find(num_dir, "pi")), 2)
+        self.assertEqual(len(calls), 2)
+
+class TestCache(unittest.TestCase):
+    """ CACHE """
+    def setUp(self) -> None:
+        reset_db()
+
+    def test_connection_reused(self):
+        self.assertIs(Cache.conn, Cache.conn)
+        self.assertEqual(Cache.conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+    def test_reopen_after_reset(self):
+        pi = BigNum(PATH_PI_DEC_TXT)
+        conn = Cache.conn
+        pi["14159"]
+        self.assertTrue(Cache.has_table(pi.info.table_name))
+        reset_db()
+        self.assertIsNot(Cache.conn, conn)
+        self.assertFalse(Cache.has_table(pi.info.table_name))
+
+    def test_thread_connection_closed(self):
+        conns = []
+        thread = threading.Thread(target=lambda: conns.append(Cache.conn))
+        thread.start()
+        thread.join()
+        del thread
+        with self.assertRaises(sqlite3.ProgrammingError): # closed with the thread local of the finished thread
+            conns[0].execute("SELECT 1")
+        conn = Cache.conn
+        Cache.close()
+        with self.assertRaises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+
+    def test_lookup_many(self):
+        self.addCleanup(setattr, Switches, "one_indexed", Switches.one_indexed)
+        Switches.one_indexed = True
+        pi = BigNum(PATH_PI_DEC_TXT)
+        patterns = [pat.encode() for pat in TRUTHS_PI_DEC_TXT]
+        pi[patterns]
+        found = Cache.lookup_many(pi.info.table_name, patterns + [b"not recorded"])
+        self.assertIsNone(found.pop(b"not recorded"))
+        self.assertEqual(found, {pat.encode():pos-1 for pat,pos in TRUTHS_PI_DEC_TXT.items()}) # stored 0 based
+
+    def test_shared_between_indexings(self):
+        self.addCleanup(setattr, Switches, "one_indexed", Switches.one_indexed)
+        Switches.one_indexed = True
+        pi = BigNum(PATH_PI_DEC_TXT)
+        self.assertEqual(pi["14159"], 1)
+        self.assertEqual(pi[[b"26535"]], {b"26535":6})
+        with Switches.override(one_indexed=False): # answered from the db, in the other indexing
+            self.assertEqual(pi["14159"], 0)
+            self.assertEqual(pi[[b"14159", b"26535"]], {b"14159":0, b"26535":5})
+        self.assertEqual(Cache.lookup(pi.info.table_name, b"26535"), 5)
+
+    def test_migrate(self):
+        from irranalyze.const import CACHE_SCHEMA_VERSION
+        self.addCleanup(setattr, Switches, "one_indexed", Switches.one_indexed)
+        Switches.one_indexed = True
+        Cache.close()
+        conn = sqlite3.connect(Paths.sqlite_path) # a db from before positions were stored 0 based
+        conn.execute("""CREATE TABLE "pi_dec" (string BLOB PRIMARY KEY, position INTEGER)""")
+        conn.executemany("""INSERT INTO "pi_dec" VALUES (?, ?)""", [(b"14159", 1), (b"26535", 6), (b"not there", -1)])
+        conn.execute("PRAGMA user_version=0")
+        conn.commit()
+        conn.close()
+        self.assertEqual(Cache.lookup_many("pi_dec", [b"14159", b"26535", b"not there"]), {b"14159":0, b"26535":5, b"not there":-1})
+        self.assertEqual(Cache.conn.execute("PRAGMA user_version").fetchone()[0], CACHE_SCHEMA_VERSION)
+        self.assertGreater(Cache.conn.execute("SELECT COUNT(*) FROM identify").fetchone()[0], 0) # other tables stay
+        Cache.close()
+        self.assertEqual(Cache.lookup("pi_dec", b"26535"), 5) # only migrated once
+
+    def test_migrate_ycd_tables(self):
+        self.addCleanup(setattr, Switches, "one_indexed", Switches.one_indexed)
+        Switches.one_indexed = False
+        txt, ycd = BigNum(PATH_PI_DEC_TXT), BigNum(PATH_PI_DEC_YCD)
+        Cache.close()
+        conn = sqlite3.connect(Paths.sqlite_path) # a db from when .ycd files were searched in the packed words
+        for table in (txt.info.table_name, ycd.info.table_name):
+            conn.execute(f"""CREATE TABLE "{table}" (string BLOB PRIMARY KEY, position INTEGER)""")
+            conn.execute(f"""INSERT INTO "{table}" VALUES (?, ?)""", (b"14159", 7))
+        conn.execute("PRAGMA user_version=1")
+        conn.commit()
+        conn.close()
+        self.assertFalse(Cache.has_table(ycd.info.table_name))
+        self.assertEqual(Cache.lookup(txt.info.table_name, b"14159"), 7) # txt tables stay
+        self.assertEqual(ycd["14159"], 0) # searched again instead of the stored byte offset
+
+
+
+class TestSettings(unittest.TestCase):
+    """ SETTINGS """
+    def setUp(self) -> None:
+        reset_db()
+        self.addCleanup(setattr, Switches, "one_indexed", Switches.one_indexed)
+        Switches.one_indexed = True
+
+    def test_override(self):
+        from irranalyze.const import SETTINGS_PATH
+        before = SETTINGS_PATH.read_bytes()
+        pi = BigNum(PATH_PI_DEC_TXT)
+        with Switches.override(one_indexed=False):
+            self.assertFalse(Switches.one_indexed)
+            self.assertEqual(pi[1], b"4")
+            self.assertEqual(pi[:3], b"141")
+            self.assertEqual(pi["14159"], 0)
+        self.assertTrue(Switches.one_indexed)
+        self.assertEqual(pi[1], b"1")
+        self.assertEqual(pi[:3], b".14")
+        self.assertEqual(SETTINGS_PATH.read_bytes(), before) # never written
+
+    def test_override_thread_local(self):
+        from threading import Thread
+        seen = []
+        with Switches.override(one_indexed=False):
+            thread = Thread(target=lambda: seen.append(Switches.one_indexed))
+            thread.start()
+            thread.join()
+        self.assertEqual(seen, [True])
+
+    def test_override_unknown(self):
+        with self.assertRaises(AttributeError):
+            with Switches.override(zero_indexed=True):
+                pass
+
+    def test_snapshot(self):
+        with Switches.override(one_indexed=False):
+            snapshot = Switches.snapshot()
+        self.assertFalse(snapshot.one_indexed)
+        with self.assertRaises(AttributeError):
+            snapshot.one_indexed = True # type:ignore
+
+
+class TestHyperscanCache(unittest.TestCase):
+    """ HYPERSCAN CACHE """
+    def test_memory(self):
+        import hyperscan
+        patterns = [b"14159", b"26535"]
+        db = hscache.get_database(patterns, hyperscan.HS_FLAG_SINGLEMATCH, hyperscan.HS_MODE_BLOCK)
+        self.assertIs(hscache.get_database(list(patterns), hyperscan.HS_FLAG_SINGLEMATCH, hyperscan.HS_MODE_BLOCK), db)
+        self.assertIsNot(hscache.get_database(patterns, 0, hyperscan.HS_MODE_BLOCK), db)
+
+    def test_disk(self):
+        pi = BigNum(PATH_PI_DEC_TXT)
+        patterns = list(txt_to_num_all(b"number")) # big enough to be worth storing
+        positions = search_file(pi, patterns)
+        hscache.clear()
+        self.assertTrue(any(Paths.hs_cache_dir.glob("*.hsdb")))
+        self.assertEqual(search_file(pi, patterns), positions)
+
+    def test_disk_pruned(self):
+        import hyperscan
+        cache_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, cache_dir)
+        self.addCleanup(setattr, hscache, "HS_DISK_CACHE_SIZE", hscache.HS_DISK_CACHE_SIZE)
+        self.addCleanup(setattr, hscache, "HS_STORE_MIN_TIME", hscache.HS_STORE_MIN_TIME)
+        hscache.HS_DISK_CACHE_SIZE = 2
+        hscache.HS_STORE_MIN_TIME = -1 # store everything
+        compile = lambda word: hscache.get_database(list(txt_to_num_all(word)), hyperscan.HS_FLAG_SINGLEMATCH, hyperscan.HS_MODE_BLOCK)
+        stored = lambda word: (cache_dir / f"{hscache._key(list(txt_to_num_all(word)), hyperscan.HS_FLAG_SINGLEMATCH, hyperscan.HS_MODE_BLOCK, False)}.hsdb").exists()
+        with Paths.override(hs_cache_dir=cache_dir):
+            compile(b"pi")
+            time.sleep(0.01)
+            compile(b"cat")
+            time.sleep(0.01)
+            hscache.clear()
+            compile(b"pi") # loaded from disk, now the most recently used
+            time.sleep(0.01)
+            compile(b"ok")
+        self.assertEqual(len(list(cache_dir.glob("*.hsdb"))), 2)
+        self.assertEqual([stored(word) for word in (b"pi", b"cat", b"ok")], [True, False, True])
+        hscache.clear()
+
+
 class TestAttributes(unittest.TestCase):
     """ ATTRIBUTES """
     def setUp(self) -> None:
@@ -254,6 +994,22 @@ class TestAttributes(unittest.TestCase):
         self.assertEqual(pi_dec_ycd.to_base("alnum",500), pi_hex_txt.to_base("alnum",500))
         self.assertEqual(pi_hex_txt.to_base("alnum",500), pi_hex_ycd.to_base("alnum",500))
 
+    def test_to_base_segmented(self):
+        pi = BigNum(PATH_PI_DEC_TXT)
+        digits = pi.mmap[pi.info.radix_pos+1:pi.info.radix_pos+901]
+        read = lambda start, stop: digits[start:stop]
+        for base in (2, 7, 16, "abc", 100):
+            whole = base_convert(b"3." + digits, 10, base).split(b".")[1].decode() if base != 100 else None
+            expected = "".join(frac_convert_gen(read, 900, 10, base, 400))
+            if whole is not None:
+                self.assertEqual(expected, whole[:400])
+            for segment, workers in ((1, 1), (7, 4), (64, 2)):
+                self.assertEqual("".join(frac_convert_gen(read, 900, 10, base, 400, segment, workers)), expected)
+        path = Path(tempfile.mkdtemp()) / "pi_7.txt"
+        self.addCleanup(shutil.rmtree, path.parent)
+        self.assertEqual(pi.to_base_file(path, 7, 300), 300)
+        self.assertEqual(path.read_text(), pi.to_base(7, 300))
+
     @unittest.skipUnless(REAL_FILES, "requires number files")
     def test_first_digits_zero_indexed_big(self):
         Switches.one_indexed = False
@@ -295,6 +1051,21 @@ class TestConverters(unittest.TestCase):
         self.assertEqual(len(string), 500)
         self.assertEqual(string, pi_dec_txt[:500].decode())
 
+    def test_ycd_codec(self):
+        for path, base in ((PATH_PI_DEC_YCD, 10), (PATH_PI_HEX_YCD, 16)):
+            pi = BigNum(path)
+            data = pi.mmap[pi.info.radix_pos+1:]
+            data = data[:len(data)//8*8]
+            string = ycd_to_str(data, base)
+            self.assertEqual(string, "".join(ycd_to_str_gen(data + bytes(8), base))) # the old generator skips the last word
+            self.assertEqual(str_to_ycd(string), data)
+            for size in (1, 7, 33):
+                self.assertEqual(b"".join(digits_to_ycd_gen(string.encode(), base, size)), data) # block borders
+            partial = string[:-5] # last word is missing some digits, those are padded with zeros
+            self.assertEqual(ycd_to_str(str_to_ycd(partial), base), partial + "0"*5)
+        with self.assertRaises(ValueError):
+            list(digits_to_ycd_gen(b"31415x", 10))
+
 
 if __name__ == "__main__":
     BACKUP_DB_PATH.unlink(True) # remove old backup